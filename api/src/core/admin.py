@@ -72,7 +72,14 @@ class TierAdmin(admin.ModelAdmin):
     fieldsets = (
         (
             None,
-            {"fields": ("name", "has_og_image_access", "can_generate_expire_link")},
+            {
+                "fields": (
+                    "name",
+                    "has_og_image_access",
+                    "can_generate_expire_link",
+                    "max_pixels",
+                )
+            },
         ),
     )
     add_fieldsets = (
@@ -84,6 +91,7 @@ class TierAdmin(admin.ModelAdmin):
                     "name",
                     "has_og_image_access",
                     "can_generate_expire_link",
+                    "max_pixels",
                 ),
             },
         ),
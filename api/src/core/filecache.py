@@ -0,0 +1,129 @@
+from dataclasses import dataclass
+from django.conf import settings
+from collections import OrderedDict
+from typing import Union
+import threading
+import time
+import os
+
+
+def get_stat_key(stat: os.stat_result) -> tuple[int, int, int]:
+    """Return key used to check if file changed since it was cached"""
+
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+@dataclass(frozen=True)
+class CachedFile:
+    """File body cached in memory with data needed to serve it"""
+
+    body: bytes
+    etag: str
+    last_modified: int
+    content_type: str
+    encoding: Union[str, None]
+    stat_key: tuple[int, int, int]
+
+
+class FileCache:
+    """
+    Byte-weighted LRU cache of file bodies shared by threads of the process.
+    Total size of cached bodies is limited to 'max_bytes' and files bigger
+    than 'max_item_bytes' aren't cached. Files may be replaced by other
+    processes (e.g. celery workers), so entry is checked against file stat
+    if it wasn't checked for 'revalidate_after' seconds
+    """
+
+    def __init__(self, max_bytes: int, max_item_bytes: int, revalidate_after: float):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self.revalidate_after = revalidate_after
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # path -> (checked_at, CachedFile)
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> Union[CachedFile, None]:
+        """Return cached file or None if it isn't cached or it changed"""
+
+        with self._lock:
+            checked_at, entry = self._entries.get(path, (0, None))
+            if entry is not None:
+                self._entries.move_to_end(path)
+
+        now = time.monotonic()
+        if entry is not None and now - checked_at > self.revalidate_after:
+            try:
+                changed = get_stat_key(os.stat(path)) != entry.stat_key
+            except OSError:
+                changed = True
+
+            if changed:
+                self.invalidate(path)
+                entry = None
+            else:
+                with self._lock:
+                    if path in self._entries:
+                        self._entries[path] = (now, entry)
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        return entry
+
+    def set(self, path: str, entry: CachedFile) -> bool:
+        """Cache file body, return False if file is too big to be cached"""
+
+        size = len(entry.body)
+        if size > self.max_item_bytes or size > self.max_bytes:
+            return False
+
+        with self._lock:
+            if (old := self._entries.pop(path, None)) is not None:
+                self.size -= len(old[1].body)
+
+            self._entries[path] = (time.monotonic(), entry)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size -= len(evicted.body)
+                self.evictions += 1
+
+        return True
+
+    def invalidate(self, path: str) -> None:
+        """Remove file from the cache"""
+
+        with self._lock:
+            if (old := self._entries.pop(path, None)) is not None:
+                self.size -= len(old[1].body)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def gauges(self) -> dict[str, Union[int, float]]:
+        """Return cache size and hit/miss counters"""
+
+        requests = self.hits + self.misses
+        return {
+            "bytes": self.size,
+            "files": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / requests if requests else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+THUMBNAIL_CACHE = FileCache(
+    max_bytes=settings.THUMBNAIL_CACHE_MAX_BYTES,
+    max_item_bytes=settings.THUMBNAIL_CACHE_MAX_ITEM_BYTES,
+    revalidate_after=settings.THUMBNAIL_CACHE_REVALIDATE_AFTER,
+)
@@ -0,0 +1,82 @@
+from django.core.management import BaseCommand
+from django.db.models import Q
+from core.models import Image
+from PIL import Image as PILImage
+from django.core.files import File
+import hashlib
+
+
+class Command(BaseCommand):
+    """
+    Fill width, height, format, bytes and content_hash of images uploaded
+    before these columns were added. Metadata is read from stored original
+    image (only its header is read, whole file is read only if content hash
+    is missing), images without stored original are skipped. Rows are
+    walked in primary key order and updated in batches
+    """
+
+    help = "Fill missing metadata of stored original images"
+    fields = ("width", "height", "format", "bytes", "content_hash")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options) -> None:
+        batch_size = options["batch_size"]
+        queryset = (
+            Image.objects.filter(
+                Q(width__isnull=True)
+                | Q(height__isnull=True)
+                | Q(format__isnull=True)
+                | Q(bytes__isnull=True)
+                | Q(content_hash__isnull=True)
+            )
+            .exclude(Q(og_file__isnull=True) | Q(og_file=""))
+            .only("uuid", "og_file", *self.fields)
+            .order_by("uuid")
+        )
+
+        updated = skipped = 0
+        page = queryset
+        while batch := list(page[:batch_size]):
+            # rows which can't be filled still match queryset filter
+            page = queryset.filter(uuid__gt=batch[-1].uuid)
+            images = [image for image in batch if self.fill_metadata(image)]
+            Image.objects.bulk_update(images, self.fields)
+            updated += len(images)
+            skipped += len(batch) - len(images)
+            self.stdout.write(f"Updated {updated} images")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Updated {updated} images, skipped {skipped}")
+        )
+
+    def fill_metadata(self, image: Image) -> bool:
+        """Set missing metadata of image, return False if original image
+        can't be read"""
+
+        storage = image.og_file.storage
+        try:
+            with storage.open(image.og_file.name) as f:
+                with PILImage.open(f) as pil_image:
+                    image.width, image.height = pil_image.size
+                    image.format = pil_image.format
+
+                if not image.content_hash:
+                    f.seek(0)
+                    image.content_hash = self.get_content_hash(f)
+
+            image.bytes = storage.size(image.og_file.name)
+        except (OSError, PILImage.DecompressionBombError) as e:
+            self.stderr.write(f"Skipped image {image.uuid}: {e}")
+            return False
+
+        return True
+
+    def get_content_hash(self, file: File) -> str:
+        """Return sha256 of file content"""
+
+        hasher = hashlib.sha256()
+        for chunk in file.chunks():
+            hasher.update(chunk)
+        return hasher.hexdigest()
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:59
+
+import core.models.image
+import core.storage
+import core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_image_content_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='image',
+            name='og_file',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.ContentAddressedStorage(), upload_to=core.models.image.get_upload_to, validators=[core.validators.img_extension_validator]),
+        ),
+    ]
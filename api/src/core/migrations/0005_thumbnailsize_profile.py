@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_image_og_file_content_addressed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='thumbnailsize',
+            name='profile',
+            field=models.CharField(choices=[('fast', 'Fast'), ('balanced', 'Balanced'), ('smallest', 'Smallest')], default='balanced', help_text='Encoder profile, trade-off between encode time and file size', max_length=16, verbose_name='profile'),
+        ),
+    ]
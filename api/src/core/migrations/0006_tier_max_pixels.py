@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_thumbnailsize_profile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tier',
+            name='max_pixels',
+            field=models.PositiveBigIntegerField(blank=True, help_text="Max number of pixels (width x height) of uploaded image, it can't exceed IMAGE_MAX_PIXELS setting (used if empty)", null=True, verbose_name='max_pixels'),
+        ),
+    ]
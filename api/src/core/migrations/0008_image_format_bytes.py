@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_image_width_height'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='bytes',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='format',
+            field=models.CharField(blank=True, editable=False, max_length=16, null=True),
+        ),
+    ]
@@ -1,7 +1,7 @@
 from django.db import models
 from django.conf import settings
 from django.http import HttpRequest
-from core.storage import OverwriteStorage
+from core.storage import OverwriteStorage, ContentAddressedStorage
 from core import validators
 from typing import Protocol
 import uuid
@@ -42,6 +42,8 @@ class Image(models.Model):
     og_file = models.ImageField(
         null=True,
         blank=True,
+        # originals are stored by content hash, identical files are stored once
+        storage=ContentAddressedStorage(),
         upload_to=get_upload_to,
         validators=[validators.img_extension_validator],
     )
@@ -55,10 +57,34 @@ class Image(models.Model):
     uploaded_at = models.DateTimeField(
         auto_now_add=True,
     )
+    # sha256 of uploaded file, used to find thumbnails of identical uploads
+    content_hash = models.CharField(
+        null=True,
+        blank=True,
+        editable=False,
+        max_length=64,
+        db_index=True,
+    )
+    # metadata of uploaded image (dimensions and format are read from image
+    # header), rows created before these columns were added are filled
+    # by backfill_image_metadata command
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    format = models.CharField(null=True, blank=True, editable=False, max_length=16)
+    bytes = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
 
     # class attributes
     folder_name = "original_images"
 
+    class Meta:
+        indexes = [
+            # used by keyset pagination of user images
+            models.Index(
+                fields=["uploaded_by", "-uploaded_at", "uuid"],
+                name="image_uploaded_by_keyset_idx",
+            ),
+        ]
+
     def get_upload_to(self, filename: str) -> str:
         """get path where images should be uploaded"""
 
@@ -110,6 +136,13 @@ class Thumbnail(models.Model):
 
         return os.path.join(cls.folder_name, image_uuid, filename)
 
+    @classmethod
+    def get_variant_name(cls, name: str, extension: str) -> str:
+        """Return name of thumbnail file encoded in variant format
+        (e.g. 'thumbnail-autox200.jpg.webp')"""
+
+        return f"{name}{extension}"
+
     def get_upload_to(self, filename: str) -> str:
         """get path where thumbnail should be uploaded"""
 
@@ -1,5 +1,6 @@
 from django.db import models
 from django.utils.translation import gettext_lazy as _
+from core import profiles
 
 
 class Tier(models.Model):
@@ -24,6 +25,15 @@ class Tier(models.Model):
         default=False,
         help_text="Specify whether user can generate expiring image links",
     )
+    max_pixels = models.PositiveBigIntegerField(
+        verbose_name=_("max_pixels"),
+        null=True,
+        blank=True,
+        help_text=(
+            "Max number of pixels (width x height) of uploaded image, "
+            "it can't exceed IMAGE_MAX_PIXELS setting (used if empty)"
+        ),
+    )
 
     class Meta:
         verbose_name = _("tier")
@@ -58,3 +68,10 @@ class ThumbnailSize(models.Model):
         null=True,
         blank=True,
     )
+    profile = models.CharField(
+        verbose_name=_("profile"),
+        max_length=16,
+        choices=profiles.PROFILE_CHOICES,
+        default=profiles.DEFAULT_PROFILE,
+        help_text="Encoder profile, trade-off between encode time and file size",
+    )
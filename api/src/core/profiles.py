@@ -0,0 +1,57 @@
+"""
+Encoder profiles used to save thumbnails. Profile is chosen per thumbnail
+size (ThumbnailSize.profile) and defines save options of every format
+"""
+
+FAST = "fast"
+BALANCED = "balanced"
+SMALLEST = "smallest"
+
+DEFAULT_PROFILE = BALANCED
+
+# JPEG subsampling 2 is 4:2:0, PNG 'optimize' is multi-pass compression
+# with the highest compress level (several times slower than default level)
+ENCODER_PROFILES = {
+    FAST: {
+        "JPEG": {"quality": 80},
+        "PNG": {"compress_level": 1},
+        "WEBP": {"quality": 80, "method": 0},
+        "AVIF": {"quality": 60, "speed": 10},
+    },
+    BALANCED: {
+        "JPEG": {
+            "quality": 80,
+            "optimize": True,
+            "progressive": True,
+            "subsampling": 2,
+        },
+        "PNG": {"compress_level": 6},
+        "WEBP": {"quality": 80, "method": 4},
+        "AVIF": {"quality": 60, "speed": 8},
+    },
+    SMALLEST: {
+        "JPEG": {
+            "quality": 75,
+            "optimize": True,
+            "progressive": True,
+            "subsampling": 2,
+        },
+        "PNG": {"optimize": True},
+        "WEBP": {"quality": 75, "method": 6},
+        "AVIF": {"quality": 55, "speed": 6},
+    },
+}
+
+PROFILE_CHOICES = [
+    (FAST, "Fast"),
+    (BALANCED, "Balanced"),
+    (SMALLEST, "Smallest"),
+]
+
+
+def get_save_options(profile: str, image_format: str) -> dict:
+    """Return options used to save image in given format with given profile
+    (default profile is used if profile doesn't exist)"""
+
+    options = ENCODER_PROFILES.get(profile, ENCODER_PROFILES[DEFAULT_PROFILE])
+    return options[image_format]
@@ -0,0 +1,31 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.db import transaction
+from core.models import Tier, ThumbnailSize
+from core.tiers import TIER_CACHE
+
+
+def invalidate_tier(tier_id: int) -> None:
+    """Invalidate tier snapshot now and once transaction is committed
+    (so snapshot cached by concurrent request before commit is dropped too)"""
+
+    TIER_CACHE.invalidate(tier_id)
+    transaction.on_commit(lambda: TIER_CACHE.invalidate(tier_id))
+
+
+@receiver(post_save, sender=Tier)
+@receiver(post_delete, sender=Tier)
+def invalidate_tier_snapshot(instance: Tier, **kwargs) -> None:
+    """Invalidate snapshot of changed tier"""
+
+    invalidate_tier(instance.pk)
+
+
+@receiver(post_save, sender=ThumbnailSize)
+@receiver(post_delete, sender=ThumbnailSize)
+def invalidate_thumbnail_size_tier_snapshot(
+    instance: ThumbnailSize, **kwargs
+) -> None:
+    """Invalidate snapshot of tier which thumbnail sizes changed"""
+
+    invalidate_tier(instance.tier_id)
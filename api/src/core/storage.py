@@ -1,19 +1,164 @@
 from django.core.files.storage import FileSystemStorage
-from django.conf import settings
+from core.filecache import THUMBNAIL_CACHE
+from django.core.files import File
+from django.core.files.move import file_move_safe
 from typing import Union
+import contextlib
+import hashlib
+import shutil
+import uuid
 import os
 
 
-class OverwriteStorage(FileSystemStorage):
-    """Overwrite FileSystemStorage class to overwrite
-    file with same path. This storage is used to save images thumbnails"""
+class AtomicFileSystemStorage(FileSystemStorage):
+    """
+    FileSystemStorage that writes files atomically. Content is written to
+    temporary file in target directory which is then renamed into place,
+    so readers never see partially written file and crashed write leaves
+    old file (if any) untouched. Existing file with the same name is
+    replaced, so name doesn't have to be checked for collisions
+    """
+
+    # compute sha256 of written content (passed to get_final_name)
+    hash_content = False
 
     def get_available_name(self, name: str, max_length: Union[None, int] = None) -> str:
-        """Returns a filename that's free on the target storage system, and
-        available for new content to be written to.
-        """
+        """Existing file is atomically replaced, there is nothing to check"""
+
+        return name
+
+    def get_final_name(self, name: str, content_hash: Union[str, None]) -> str:
+        """Return name under which written file is saved"""
+
+        return name
+
+    def get_temp_path(self, path: str) -> str:
+        """Return path of temporary file in the same directory (filesystem)
+        as 'path', so it can be atomically renamed"""
+
+        return os.path.join(os.path.dirname(path), f".{uuid.uuid4().hex}.tmp")
+
+    def makedirs(self, directory: str) -> None:
+        """Create directory (and its parents) with directory_permissions_mode"""
+
+        if self.directory_permissions_mode is None:
+            os.makedirs(directory, exist_ok=True)
+            return
+
+        # the same as FileSystemStorage, mode is applied regardless of umask
+        old_umask = os.umask(0o777 & ~self.directory_permissions_mode)
+        try:
+            os.makedirs(directory, self.directory_permissions_mode, exist_ok=True)
+        finally:
+            os.umask(old_umask)
+
+    def write_temp_file(self, temp_path: str, content: File) -> Union[str, None]:
+        """Write content to temporary file and return its sha256 (if content
+        should be hashed). Upload spilled to temporary file is moved instead
+        of copied, its hash computed by upload handler is reused"""
+
+        if hasattr(content, "temporary_file_path"):
+            file_move_safe(content.temporary_file_path(), temp_path)
+            if not self.hash_content:
+                return None
+
+            content_hash = getattr(content, "content_hash", None)
+            if isinstance(content_hash, str):
+                return content_hash
+
+            with open(temp_path, "rb") as f:
+                return hashlib.file_digest(f, "sha256").hexdigest()
+
+        hasher = hashlib.sha256() if self.hash_content else None
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        with os.fdopen(fd, "wb") as f:
+            for chunk in content.chunks():
+                if hasher is not None:
+                    hasher.update(chunk)
+                f.write(chunk)
+
+        return hasher and hasher.hexdigest()
+
+    def _save(self, name: str, content: File) -> str:
+        path = self.path(name)
+        self.makedirs(os.path.dirname(path))
 
-        # If the filename already exists, remove it
-        if self.exists(name):
-            os.remove(os.path.join(settings.MEDIA_ROOT, name))
+        temp_path = self.get_temp_path(path)
+        try:
+            content_hash = self.write_temp_file(temp_path, content)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+
+            name = self.get_final_name(name, content_hash)
+            path = self.path(name)
+            self.makedirs(os.path.dirname(path))
+            os.replace(temp_path, path)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(temp_path)
+            raise
+
+        return name.replace("\\", "/")
+
+
+class OverwriteStorage(AtomicFileSystemStorage):
+    """Storage which overwrites file with same path. This storage is used
+    to save images thumbnails, so thumbnail is always saved with provided
+    filename. Overwritten and deleted files are removed from thumbnails cache"""
+
+    cache = THUMBNAIL_CACHE
+
+    def _save(self, name: str, content: File) -> str:
+        name = super()._save(name, content)
+        self.cache.invalidate(self.path(name))
+        return name
+
+    def delete(self, name: str) -> None:
+        super().delete(name)
+        self.cache.invalidate(self.path(name))
+
+    def link(self, source: str, name: str) -> str:
+        """Save existing file under new name as hard link, so identical files
+        share disk blocks. File is copied if it can't be linked (e.g. other
+        filesystem)"""
+
+        path = self.path(name)
+        self.makedirs(os.path.dirname(path))
+
+        temp_path = self.get_temp_path(path)
+        try:
+            try:
+                os.link(self.path(source), temp_path)
+            except FileNotFoundError:
+                raise
+            except OSError:
+                shutil.copyfile(self.path(source), temp_path)
+
+            os.replace(temp_path, path)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(temp_path)
+            raise
+
+        self.cache.invalidate(path)
         return name
+
+
+class ContentAddressedStorage(AtomicFileSystemStorage):
+    """
+    Storage that names files by sha256 of their content. Files are laid out
+    in sharded directories ('<upload dir>/ab/cd/<hash>.<ext>') so none of
+    them grows too big. Identical files are stored once and name is never
+    reused for different content, so replacing existing file is harmless
+    """
+
+    hash_content = True
+    shard_depth = 2
+
+    def get_final_name(self, name: str, content_hash: Union[str, None]) -> str:
+        """Return name of file with given content in upload directory of 'name'"""
+
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        shards = [content_hash[i * 2 : i * 2 + 2] for i in range(self.shard_depth)]  # noqa
+        return os.path.join(directory, *shards, f"{content_hash}{extension}")
@@ -0,0 +1,85 @@
+from django.test import SimpleTestCase
+from core.filecache import FileCache, CachedFile, get_stat_key
+from unittest import mock
+import itertools
+import tempfile
+import os
+
+
+class TestFileCache(SimpleTestCase):
+    """Test FileCache"""
+
+    def setUp(self):
+        self.cache = FileCache(max_bytes=10, max_item_bytes=6, revalidate_after=60)
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def create_entry(self, name: str, body: bytes) -> tuple[str, CachedFile]:
+        path = os.path.join(self.dir.name, name)
+        with open(path, "wb") as f:
+            f.write(body)
+
+        stat_key = get_stat_key(os.stat(path))
+        return path, CachedFile(body, '"etag"', 0, "image/png", None, stat_key)
+
+    def test_get_set(self):
+        """Cached file should be returned and counted as hit"""
+
+        path, entry = self.create_entry("a.png", b"aaa")
+        self.assertIsNone(self.cache.get(path))
+        self.assertTrue(self.cache.set(path, entry))
+        self.assertEqual(self.cache.get(path), entry)
+        self.assertEqual(
+            self.cache.gauges(),
+            {
+                "bytes": 3,
+                "files": 1,
+                "hits": 1,
+                "misses": 1,
+                "hit_ratio": 0.5,
+                "evictions": 0,
+            },
+        )
+
+    def test_too_big_file(self):
+        """File bigger than max_item_bytes shouldn't be cached"""
+
+        path, entry = self.create_entry("a.png", b"a" * 7)
+        self.assertFalse(self.cache.set(path, entry))
+        self.assertIsNone(self.cache.get(path))
+
+    def test_byte_weighted_eviction(self):
+        """Least recently used files should be evicted to fit in max_bytes"""
+
+        a, b, c = [
+            self.create_entry(f"{name}.png", body)
+            for name, body in [("a", b"aaaa"), ("b", b"bbbb"), ("c", b"cccccc")]
+        ]
+        self.cache.set(*a)
+        self.cache.set(*b)
+        self.cache.get(a[0])
+        self.cache.set(*c)
+
+        self.assertIsNone(self.cache.get(b[0]))
+        self.assertEqual(self.cache.get(a[0]), a[1])
+        self.assertEqual(self.cache.gauges()["bytes"], 10)
+        self.assertEqual(self.cache.gauges()["evictions"], 1)
+
+    def test_invalidate(self):
+        path, entry = self.create_entry("a.png", b"aaa")
+        self.cache.set(path, entry)
+        self.cache.invalidate(path)
+        self.assertIsNone(self.cache.get(path))
+        self.assertEqual(self.cache.gauges()["bytes"], 0)
+
+    def test_revalidate(self):
+        """Entry of file that changed on disk should be dropped"""
+
+        path, entry = self.create_entry("a.png", b"aaa")
+        self.cache.set(path, entry)
+        now = itertools.count(10**9, 100)
+        with mock.patch("core.filecache.time.monotonic", side_effect=now):
+            self.assertEqual(self.cache.get(path), entry)
+
+            self.create_entry("a.png", b"changed")
+            self.assertIsNone(self.cache.get(path))
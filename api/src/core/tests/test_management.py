@@ -1,8 +1,15 @@
 from unittest.mock import patch
 from psycopg2 import OperationalError as Psycopg2OperationalError
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase
 from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from core.models import Image
+from pathlib import Path
+import tempfile
+import hashlib
+import io
 
 
 # mock wait_for_db command check method
@@ -42,3 +49,71 @@ class TestWaitForDatabaseCommand(SimpleTestCase):
         call_command("wait_for_db")
         self.assertEqual(patched_check.call_count, 3)
         patched_check.assert_called_with(databases=["default"])
+
+
+class TestBackfillImageMetadataCommand(TestCase):
+    """Test backfill_image_metadata command"""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = self.settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = get_user_model().objects.create_user(
+            username="user", password="pass"
+        )
+        self.content = (
+            Path(__file__).resolve().parents[2] / "images/tests/images/puffin.png"
+        ).read_bytes()
+
+    def create_image(self, **kwargs) -> Image:
+        return Image.objects.create(name="image", uploaded_by=self.user, **kwargs)
+
+    def test_backfill(self):
+        """Metadata of images with stored original should be filled in batches"""
+
+        images = [self.create_image() for _ in range(3)]
+        for image in images:
+            image.og_file.save("puffin.png", ContentFile(self.content))
+        missing = self.create_image(og_file="original_images/missing.png")
+        without_original = self.create_image()
+
+        out = io.StringIO()
+        # 2 batches (and last empty one) are selected, each one is updated
+        # with single query
+        with self.assertNumQueries(3 + 2):
+            call_command(
+                "backfill_image_metadata",
+                batch_size=2,
+                stdout=out,
+                stderr=io.StringIO(),
+            )
+
+        self.assertIn("Updated 3 images, skipped 1", out.getvalue())
+        for image in images:
+            image.refresh_from_db()
+            self.assertEqual(
+                (image.width, image.height, image.format, image.bytes),
+                (800, 800, "PNG", len(self.content)),
+            )
+            self.assertEqual(
+                image.content_hash, hashlib.sha256(self.content).hexdigest()
+            )
+
+        for image in [missing, without_original]:
+            image.refresh_from_db()
+            self.assertIsNone(image.width)
+            self.assertIsNone(image.content_hash)
+
+    def test_content_hash_not_recomputed(self):
+        """Content hash computed at upload shouldn't be changed"""
+
+        image = self.create_image(content_hash="hash")
+        image.og_file.save("puffin.png", ContentFile(self.content))
+
+        call_command("backfill_image_metadata", stdout=io.StringIO())
+        image.refresh_from_db()
+        self.assertEqual(image.content_hash, "hash")
+        self.assertEqual(image.format, "PNG")
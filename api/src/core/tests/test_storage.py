@@ -1,34 +1,204 @@
 from django.test import SimpleTestCase
 from unittest import mock
-from core.storage import OverwriteStorage
-from django.conf import settings
+from core.storage import OverwriteStorage, ContentAddressedStorage
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import TemporaryUploadedFile
+import tempfile
+import hashlib
 import os
 
 
 class TestOverwriteStorage(SimpleTestCase):
-    """Test if OverwriteStorage in get_available_name remove existing
+    """Test if OverwriteStorage atomically replaces existing
     file with provided name"""
 
     def setUp(self):
         self.filename = "image.jpg"
         self.storage = OverwriteStorage()
 
-    @mock.patch("core.storage.OverwriteStorage.exists", return_value=True)
-    @mock.patch("core.storage.os.remove")
-    def test_existing_file(self, mocked_os_remove, *mocks):
-        """Test if os.remove called"""
+    @mock.patch("core.storage.OverwriteStorage.exists")
+    def test_get_available_name(self, mocked_exists):
+        """Name shouldn't be checked, existing file is replaced on save"""
 
         filename = self.storage.get_available_name(self.filename)
-        mocked_os_remove.assert_called_once_with(
-            os.path.join(settings.MEDIA_ROOT, self.filename)
-        )
+        self.assertEqual(mocked_exists.call_count, 0)
         self.assertEqual(filename, self.filename)
 
-    @mock.patch("core.storage.os")
-    @mock.patch("core.storage.OverwriteStorage.exists", return_value=False)
-    def test_not_existing_file(self, mocked_os, *mocks):
-        """Test if os.remove called"""
+    @mock.patch.object(OverwriteStorage, "cache")
+    def test_overwrite(self, *mocks):
+        """Existing file should be replaced by new one, file opened
+        before it was replaced should still be readable"""
 
-        filename = self.storage.get_available_name(self.filename)
-        self.assertEqual(mocked_os.remove.call_count, 0)
-        self.assertEqual(filename, self.filename)
+        with tempfile.TemporaryDirectory() as location:
+            storage = OverwriteStorage(location=location)
+            storage.save(self.filename, ContentFile(b"old"))
+            with storage.open(self.filename) as old:
+                name = storage.save(self.filename, ContentFile(b"new"))
+                self.assertEqual(old.read(), b"old")
+
+            self.assertEqual(name, self.filename)
+            with storage.open(name) as f:
+                self.assertEqual(f.read(), b"new")
+            self.assertEqual(os.listdir(location), [self.filename])
+
+    @mock.patch.object(OverwriteStorage, "cache")
+    @mock.patch("core.storage.os.replace", side_effect=OSError)
+    def test_overwrite_error(self, *mocks):
+        """Existing file should be untouched if new one can't be saved"""
+
+        with tempfile.TemporaryDirectory() as location:
+            storage = OverwriteStorage(location=location)
+            with open(storage.path(self.filename), "wb") as f:
+                f.write(b"old")
+
+            with self.assertRaises(OSError):
+                storage.save(self.filename, ContentFile(b"new"))
+
+            self.assertEqual(os.listdir(location), [self.filename])
+            with storage.open(self.filename) as f:
+                self.assertEqual(f.read(), b"old")
+
+    @mock.patch.object(OverwriteStorage, "cache")
+    def test_cache_invalidated(self, mocked_cache):
+        """Saved and deleted files should be removed from the cache"""
+
+        with tempfile.TemporaryDirectory() as location:
+            storage = OverwriteStorage(location=location)
+            name = storage.save(self.filename, ContentFile(b"image"))
+            mocked_cache.invalidate.assert_called_once_with(storage.path(name))
+
+            mocked_cache.reset_mock()
+            storage.delete(name)
+            mocked_cache.invalidate.assert_called_once_with(storage.path(name))
+
+    @mock.patch.object(OverwriteStorage, "cache")
+    def test_link(self, mocked_cache):
+        """Linked file should share inode with source file"""
+
+        with tempfile.TemporaryDirectory() as location:
+            storage = OverwriteStorage(location=location)
+            source = storage.save("a/image.jpg", ContentFile(b"image"))
+            storage.save("b/image.jpg", ContentFile(b"other"))
+            name = storage.link(source, "b/image.jpg")
+
+            self.assertEqual(name, "b/image.jpg")
+            self.assertEqual(
+                os.stat(storage.path(source)).st_ino, os.stat(storage.path(name)).st_ino
+            )
+            mocked_cache.invalidate.assert_called_with(storage.path(name))
+
+    @mock.patch.object(OverwriteStorage, "cache")
+    @mock.patch("core.storage.os.link", side_effect=OSError)
+    def test_link_copy(self, *mocks):
+        """File should be copied if it can't be linked"""
+
+        with tempfile.TemporaryDirectory() as location:
+            storage = OverwriteStorage(location=location)
+            source = storage.save("a/image.jpg", ContentFile(b"image"))
+            name = storage.link(source, "b/image.jpg")
+
+            with storage.open(name) as f:
+                self.assertEqual(f.read(), b"image")
+
+    @mock.patch.object(OverwriteStorage, "cache")
+    def test_directory_permissions(self, *mocks):
+        """Created directories should have directory_permissions_mode"""
+
+        with tempfile.TemporaryDirectory() as location:
+            storage = OverwriteStorage(
+                location=location, directory_permissions_mode=0o750
+            )
+            storage.save(f"a/b/{self.filename}", ContentFile(b"image"))
+            for directory in ["a", "a/b"]:
+                mode = os.stat(storage.path(directory)).st_mode & 0o777
+                self.assertEqual(mode, 0o750)
+
+    @mock.patch.object(OverwriteStorage, "cache")
+    def test_temporary_file_moved(self, *mocks):
+        """Upload spilled to temporary file should be moved, not copied"""
+
+        with tempfile.TemporaryDirectory() as location:
+            storage = OverwriteStorage(location=location)
+            upload = TemporaryUploadedFile(self.filename, "image/jpeg", 5, None)
+            # moved file is closed the same way as by request
+            self.addCleanup(upload.close)
+            upload.write(b"image")
+            upload.flush()
+            temp_path = upload.temporary_file_path()
+
+            with mock.patch.object(upload, "chunks") as mocked_chunks:
+                name = storage.save(self.filename, upload)
+
+            self.assertEqual(mocked_chunks.call_count, 0)
+            self.assertFalse(os.path.exists(temp_path))
+            with storage.open(name) as f:
+                self.assertEqual(f.read(), b"image")
+
+
+class TestContentAddressedStorage(SimpleTestCase):
+    """Test ContentAddressedStorage"""
+
+    def setUp(self):
+        self.location = tempfile.TemporaryDirectory()
+        self.addCleanup(self.location.cleanup)
+        self.storage = ContentAddressedStorage(location=self.location.name)
+        self.content_hash = hashlib.sha256(b"image").hexdigest()
+
+    def test_save(self):
+        """File should be saved in sharded directory named by content hash
+        without checking if name exists"""
+
+        with mock.patch.object(ContentAddressedStorage, "exists") as mocked_exists:
+            name = self.storage.save("originals/Image.JPG", ContentFile(b"image"))
+
+        self.assertEqual(mocked_exists.call_count, 0)
+        self.assertEqual(
+            name,
+            f"originals/{self.content_hash[:2]}/{self.content_hash[2:4]}/"
+            f"{self.content_hash}.jpg",
+        )
+        with self.storage.open(name) as f:
+            self.assertEqual(f.read(), b"image")
+
+        # only saved file (without temporary ones) should be in upload directory
+        self.assertEqual(os.listdir(self.storage.path("originals")), [name[10:12]])
+
+    def test_save_identical_files(self):
+        """Identical files should be stored once"""
+
+        names = [
+            self.storage.save(f"originals/{filename}", ContentFile(b"image"))
+            for filename in ["a.jpg", "b.jpg"]
+        ]
+        self.assertEqual(names[0], names[1])
+
+        other = self.storage.save("originals/a.jpg", ContentFile(b"other"))
+        self.assertNotEqual(other, names[0])
+
+    def test_save_temporary_file(self):
+        """Moved temporary file should be named by hash computed by upload
+        handler or by hash of its content"""
+
+        for content_hash in [None, hashlib.sha256(b"image").hexdigest()]:
+            with self.subTest(content_hash=content_hash):
+                upload = TemporaryUploadedFile("a.jpg", "image/jpeg", 5, None)
+                self.addCleanup(upload.close)
+                upload.write(b"image")
+                upload.flush()
+                if content_hash:
+                    upload.content_hash = content_hash
+
+                name = self.storage.save("originals/a.jpg", upload)
+                self.assertEqual(
+                    os.path.basename(name), f"{self.content_hash}.jpg"
+                )
+
+    @mock.patch("core.storage.os.replace", side_effect=OSError)
+    def test_save_error(self, *mocks):
+        """Temporary file should be removed if file can't be saved"""
+
+        with self.assertRaises(OSError):
+            self.storage.save("originals/a.jpg", ContentFile(b"image"))
+
+        files = [f for _, _, files in os.walk(self.location.name) for f in files]
+        self.assertEqual(files, [])
@@ -0,0 +1,207 @@
+from django.test import TestCase
+from django.core.management import call_command
+from core.models import Tier, ThumbnailSize
+from core.tiers import TierCache, TierSnapshot, ThumbnailSpec, TIER_CACHE
+from unittest import mock
+import redis
+import json
+
+
+class TestTierSnapshot(TestCase):
+    """Test TierSnapshot"""
+
+    def setUp(self):
+        call_command("loaddata", "tiers")
+        self.tier = Tier.objects.get(name="Premium")
+
+    def test_from_tier(self):
+        """Snapshot should contain tier flags and distinct thumbnail sizes"""
+
+        ThumbnailSize.objects.create(tier=self.tier, height=200)
+        snapshot = TierSnapshot.from_tier(self.tier)
+
+        self.assertTrue(snapshot.has_og_image_access)
+        self.assertFalse(snapshot.can_generate_expire_link)
+        self.assertEqual(
+            snapshot.thumbnails,
+            (
+                ThumbnailSpec(None, 200, "thumbnail-autox200"),
+                ThumbnailSpec(None, 400, "thumbnail-autox400"),
+            ),
+        )
+
+    def test_from_tier_profiles(self):
+        """Snapshot should contain encoder profile of thumbnail size"""
+
+        ThumbnailSize.objects.create(tier=self.tier, height=100, profile="fast")
+        ThumbnailSize.objects.create(tier=self.tier, height=100, profile="smallest")
+        snapshot = TierSnapshot.from_tier(self.tier)
+
+        self.assertIn(
+            ThumbnailSpec(None, 100, "thumbnail-autox100", "fast"), snapshot.thumbnails
+        )
+        self.assertEqual(TierSnapshot.loads(snapshot.dumps()), snapshot)
+
+    def test_loads_without_profile(self):
+        """Snapshot cached before profiles were added should use default one"""
+
+        data = json.loads(TierSnapshot.from_tier(self.tier).dumps())
+        for thumbnail in data["thumbnails"]:
+            del thumbnail["profile"]
+
+        snapshot = TierSnapshot.loads(json.dumps(data))
+        self.assertEqual({t.profile for t in snapshot.thumbnails}, {"balanced"})
+
+    def test_dumps_loads(self):
+        """Snapshot should be the same after serialization"""
+
+        snapshot = TierSnapshot.from_tier(self.tier)
+        self.assertEqual(TierSnapshot.loads(snapshot.dumps()), snapshot)
+
+    def test_get_max_pixels(self):
+        """Tier pixel budget can't exceed global IMAGE_MAX_PIXELS limit"""
+
+        snapshot = TierSnapshot.from_tier(self.tier)
+        with self.settings(IMAGE_MAX_PIXELS=1000):
+            self.assertEqual(snapshot.get_max_pixels(), 1000)
+
+            self.tier.max_pixels = 100
+            self.assertEqual(TierSnapshot.from_tier(self.tier).get_max_pixels(), 100)
+
+            self.tier.max_pixels = 5000
+            self.assertEqual(TierSnapshot.from_tier(self.tier).get_max_pixels(), 1000)
+
+    def test_get_thumbnails_data(self):
+        """Should return new list of thumbnails data with filenames"""
+
+        snapshot = TierSnapshot.from_tier(self.tier)
+        data = snapshot.get_thumbnails_data(".png")
+
+        self.assertEqual(
+            data,
+            [
+                {
+                    "width": None,
+                    "height": 200,
+                    "file": "thumbnail-autox200.png",
+                    "profile": "balanced",
+                },
+                {
+                    "width": None,
+                    "height": 400,
+                    "file": "thumbnail-autox400.png",
+                    "profile": "balanced",
+                },
+            ],
+        )
+        data[0]["file"] = "changed"
+        self.assertEqual(
+            snapshot.get_thumbnails_data(".png")[0]["file"], "thumbnail-autox200.png"
+        )
+
+
+class TestTierCache(TestCase):
+    """Test TierCache"""
+
+    def setUp(self):
+        call_command("loaddata", "tiers")
+        self.tier = Tier.objects.get(name="Basic")
+        self.client = mock.MagicMock()
+        self.client.get.return_value = None
+        self.cache = TierCache(self.client, ttl=60, local_ttl=60)
+
+    def test_get_without_tier(self):
+        """Should return None without touching redis or database"""
+
+        with self.assertNumQueries(0):
+            self.assertIsNone(self.cache.get(None))
+
+        self.assertEqual(self.client.get.call_count, 0)
+
+    def test_get(self):
+        """Snapshot should be loaded from database and cached on both levels"""
+
+        with self.assertNumQueries(2):
+            snapshot = self.cache.get(self.tier.id)
+
+        self.assertEqual(snapshot, TierSnapshot.from_tier(self.tier))
+        self.client.set.assert_called_once_with(
+            f"tiers:snapshot:{self.tier.id}", snapshot.dumps(), ex=60
+        )
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.cache.get(self.tier.id), snapshot)
+
+        self.assertEqual(self.client.get.call_count, 1)
+
+    def test_get_from_redis(self):
+        """Snapshot cached in redis shouldn't be loaded from database"""
+
+        snapshot = TierSnapshot.from_tier(self.tier)
+        self.client.get.return_value = snapshot.dumps().encode()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.cache.get(self.tier.id), snapshot)
+
+    def test_get_with_redis_error(self):
+        """Snapshot should be loaded from database if redis isn't available"""
+
+        self.client.get.side_effect = redis.ConnectionError
+        self.client.set.side_effect = redis.ConnectionError
+
+        self.assertEqual(
+            self.cache.get(self.tier.id), TierSnapshot.from_tier(self.tier)
+        )
+        # redis shouldn't be called again until 'retry_after' passes
+        self.cache.invalidate(self.tier.id)
+        self.cache.get(self.tier.id)
+        self.assertEqual(self.client.get.call_count, 1)
+        self.assertEqual(self.client.delete.call_count, 0)
+
+    def test_local_ttl(self):
+        """Expired in-process snapshot should be read again from redis"""
+
+        self.cache.local_ttl = 0
+        self.cache.get(self.tier.id)
+        self.cache.get(self.tier.id)
+        self.assertEqual(self.client.get.call_count, 2)
+
+    def test_invalidate(self):
+        """Snapshot should be removed from both cache levels"""
+
+        self.cache.get(self.tier.id)
+        self.cache.invalidate(self.tier.id)
+
+        self.client.delete.assert_called_once_with(f"tiers:snapshot:{self.tier.id}")
+        with self.assertNumQueries(2):
+            self.cache.get(self.tier.id)
+
+
+class TestTierSignals(TestCase):
+    """Test if tier snapshot is invalidated when tier changes"""
+
+    def setUp(self):
+        call_command("loaddata", "tiers")
+        self.tier = Tier.objects.get(name="Basic")
+
+    @mock.patch.object(TIER_CACHE, "invalidate")
+    def test_tier_changed(self, mocked_invalidate):
+        self.tier.can_generate_expire_link = True
+        self.tier.save()
+        mocked_invalidate.assert_called_with(self.tier.id)
+
+    @mock.patch.object(TIER_CACHE, "invalidate")
+    def test_thumbnail_size_changed(self, mocked_invalidate):
+        size = ThumbnailSize.objects.create(tier=self.tier, height=100)
+        mocked_invalidate.assert_called_with(self.tier.id)
+
+        mocked_invalidate.reset_mock()
+        size.delete()
+        mocked_invalidate.assert_called_with(self.tier.id)
+
+    @mock.patch.object(TIER_CACHE, "invalidate")
+    def test_invalidated_on_commit(self, mocked_invalidate):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tier.save()
+
+        self.assertEqual(mocked_invalidate.call_count, 2)
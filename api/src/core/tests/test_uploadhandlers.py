@@ -0,0 +1,48 @@
+from django.test import SimpleTestCase, override_settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from core.uploadhandlers import (
+    HashingMemoryFileUploadHandler,
+    HashingTemporaryFileUploadHandler,
+)
+from django.http.multipartparser import MultiPartParser
+from django.test.client import encode_multipart, BOUNDARY, MULTIPART_CONTENT
+import hashlib
+import io
+
+
+class TestHashingUploadHandlers(SimpleTestCase):
+    """Test if sha256 of uploaded file is computed while it is streamed"""
+
+    def parse(self, content: bytes):
+        """Return file parsed from multipart request body"""
+
+        body = encode_multipart(
+            BOUNDARY, {"file": SimpleUploadedFile("image.jpg", content)}
+        )
+        parser = MultiPartParser(
+            {
+                "CONTENT_TYPE": MULTIPART_CONTENT,
+                "CONTENT_LENGTH": len(body),
+            },
+            io.BytesIO(body),
+            [
+                HashingMemoryFileUploadHandler(),
+                HashingTemporaryFileUploadHandler(),
+            ],
+        )
+        return parser.parse()[1]["file"]
+
+    def test_memory_file(self):
+        content = b"image" * 10
+        file = self.parse(content)
+        self.assertEqual(file.content_hash, hashlib.sha256(content).hexdigest())
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=10)
+    def test_temporary_file(self):
+        """File bigger than FILE_UPLOAD_MAX_MEMORY_SIZE is streamed
+        to temporary file and hashed in chunks"""
+
+        content = b"image" * 200_000
+        file = self.parse(content)
+        self.assertTrue(hasattr(file, "temporary_file_path"))
+        self.assertEqual(file.content_hash, hashlib.sha256(content).hexdigest())
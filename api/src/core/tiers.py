@@ -0,0 +1,191 @@
+from dataclasses import dataclass
+from django.conf import settings
+from core.models import Tier
+from core.profiles import DEFAULT_PROFILE
+from src import REDIS
+from typing import Union
+import threading
+import logging
+import redis
+import json
+import time
+
+
+@dataclass(frozen=True)
+class ThumbnailSpec:
+    """Thumbnail size allowed by tier, 'name' is filename without extension"""
+
+    width: Union[int, None]
+    height: Union[int, None]
+    name: str
+    profile: str = DEFAULT_PROFILE
+
+    @classmethod
+    def from_size(
+        cls,
+        width: Union[int, None],
+        height: Union[int, None],
+        profile: str = DEFAULT_PROFILE,
+    ):
+        return cls(
+            width, height, f"thumbnail-{width or 'auto'}x{height or 'auto'}", profile
+        )
+
+
+@dataclass(frozen=True)
+class TierSnapshot:
+    """Immutable snapshot of tier capabilities"""
+
+    id: int
+    has_og_image_access: bool
+    can_generate_expire_link: bool
+    thumbnails: tuple[ThumbnailSpec, ...]
+    max_pixels: Union[int, None] = None
+
+    @classmethod
+    def from_tier(cls, tier: Tier) -> "TierSnapshot":
+        """Create snapshot of given tier (with distinct thumbnail sizes,
+        the first profile of size is used)"""
+
+        sizes = {}
+        for width, height, profile in tier.sizes.order_by("id").values_list(
+            "width", "height", "profile"
+        ):
+            sizes.setdefault((width, height), profile)
+
+        return cls(
+            id=tier.id,
+            has_og_image_access=tier.has_og_image_access,
+            can_generate_expire_link=tier.can_generate_expire_link,
+            thumbnails=tuple(
+                ThumbnailSpec.from_size(width, height, profile)
+                for (width, height), profile in sizes.items()
+            ),
+            max_pixels=tier.max_pixels,
+        )
+
+    @classmethod
+    def loads(cls, data: Union[str, bytes]) -> "TierSnapshot":
+        data = json.loads(data)
+        data["thumbnails"] = tuple(ThumbnailSpec(**t) for t in data["thumbnails"])
+        return cls(**data)
+
+    def dumps(self) -> str:
+        return json.dumps(
+            {
+                "id": self.id,
+                "has_og_image_access": self.has_og_image_access,
+                "can_generate_expire_link": self.can_generate_expire_link,
+                "thumbnails": [t.__dict__ for t in self.thumbnails],
+                "max_pixels": self.max_pixels,
+            }
+        )
+
+    def get_max_pixels(self) -> int:
+        """Return max number of pixels of image uploaded by tier user"""
+
+        return min(
+            self.max_pixels or settings.IMAGE_MAX_PIXELS, settings.IMAGE_MAX_PIXELS
+        )
+
+    def get_thumbnails_data(self, extension: str) -> list[dict]:
+        """Return data of thumbnails (with filenames) that should be created
+        for image with given extension"""
+
+        return [
+            {
+                "width": t.width,
+                "height": t.height,
+                "file": f"{t.name}{extension}",
+                "profile": t.profile,
+            }
+            for t in self.thumbnails
+        ]
+
+
+class TierCache:
+    """
+    Two level (in-process and redis) cache of tier snapshots. Snapshots are
+    kept in-process for 'local_ttl' seconds and in redis for 'ttl' seconds.
+    Cache is invalidated when tier or its thumbnail sizes change, other
+    processes may see stale snapshot for at most 'local_ttl' seconds.
+    If redis is not available snapshots are loaded from database and redis
+    isn't used for next 'retry_after' seconds
+    """
+
+    key_prefix = "tiers:snapshot:"
+    retry_after = 30
+
+    def __init__(self, client: redis.Redis, ttl: int, local_ttl: int):
+        self.client = client
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self._local = {}  # tier id -> (expires_at, snapshot)
+        self._lock = threading.Lock()
+        self._unavailable_until = 0
+
+    def get_key(self, tier_id: int) -> str:
+        return f"{self.key_prefix}{tier_id}"
+
+    def get(self, tier_id: Union[int, None]) -> Union[TierSnapshot, None]:
+        """Return snapshot of tier with given id or None if there is no tier"""
+
+        if tier_id is None:
+            return None
+
+        expires_at, snapshot = self._local.get(tier_id, (0, None))
+        if expires_at > time.monotonic():
+            return snapshot
+
+        snapshot = self.get_shared(tier_id)
+        if snapshot is None:
+            snapshot = self.load(tier_id)
+
+        with self._lock:
+            self._local[tier_id] = (time.monotonic() + self.local_ttl, snapshot)
+
+        return snapshot
+
+    def call(self, command: str, *args, **kwargs) -> object:
+        """Execute redis command, return None if redis is not available"""
+
+        if self._unavailable_until > time.monotonic():
+            return None
+
+        try:
+            return getattr(self.client, command)(*args, **kwargs)
+        except redis.RedisError:
+            logging.warning("Tier cache is not available", exc_info=True)
+            self._unavailable_until = time.monotonic() + self.retry_after
+
+        return None
+
+    def get_shared(self, tier_id: int) -> Union[TierSnapshot, None]:
+        """Return snapshot cached in redis"""
+
+        data = self.call("get", self.get_key(tier_id))
+        return None if data is None else TierSnapshot.loads(data)
+
+    def load(self, tier_id: int) -> Union[TierSnapshot, None]:
+        """Load snapshot from database and cache it in redis"""
+
+        try:
+            snapshot = TierSnapshot.from_tier(Tier.objects.get(id=tier_id))
+        except Tier.DoesNotExist:
+            return None
+
+        self.call("set", self.get_key(tier_id), snapshot.dumps(), ex=self.ttl)
+        return snapshot
+
+    def invalidate(self, tier_id: int) -> None:
+        """Remove snapshot of tier with given id from both cache levels"""
+
+        with self._lock:
+            self._local.pop(tier_id, None)
+
+        self.call("delete", self.get_key(tier_id))
+
+
+TIER_CACHE = TierCache(
+    REDIS, ttl=settings.TIER_CACHE_TTL, local_ttl=settings.TIER_CACHE_LOCAL_TTL
+)
@@ -0,0 +1,42 @@
+from django.core.files.uploadhandler import (
+    MemoryFileUploadHandler,
+    TemporaryFileUploadHandler,
+)
+from django.core.files.uploadedfile import UploadedFile
+from typing import Union
+import hashlib
+
+
+class HashingUploadHandlerMixin:
+    """
+    Compute sha256 of uploaded file while request body is streamed, so file
+    doesn't have to be read again. Hex digest is set as 'content_hash'
+    attribute of the uploaded file
+    """
+
+    def new_file(self, *args, **kwargs) -> None:
+        # hasher is created first, handler may stop future handlers by raising
+        self.hasher = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data: bytes, start: int) -> Union[bytes, None]:
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size: int) -> Union[UploadedFile, None]:
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.content_hash = self.hasher.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(
+    HashingUploadHandlerMixin, MemoryFileUploadHandler
+):
+    """Memory upload handler that computes sha256 of uploaded file"""
+
+
+class HashingTemporaryFileUploadHandler(
+    HashingUploadHandlerMixin, TemporaryFileUploadHandler
+):
+    """Temporary file upload handler that computes sha256 of uploaded file"""
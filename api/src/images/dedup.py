@@ -0,0 +1,182 @@
+from django.conf import settings
+from core.models import Thumbnail
+from src import REDIS
+from typing import Iterable, Union
+import contextlib
+import logging
+import redis
+import os
+
+# become leader of identical uploads or join its followers
+JOIN_SCRIPT = """
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'EX', ARGV[2]) then
+    return 1
+end
+redis.call('RPUSH', KEYS[2], ARGV[1])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+return 0
+"""
+
+# finish leader render and return its followers
+COMPLETE_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return {}
+end
+local followers = redis.call('LRANGE', KEYS[2], 0, -1)
+redis.call('DEL', KEYS[1], KEYS[2])
+return followers
+"""
+
+
+def link_thumbnails(image_uuid: str, sources: Iterable[Thumbnail]) -> list[Thumbnail]:
+    """Return (not saved) thumbnails of image which files (and files of their
+    variants) are hard links to files of source thumbnails. If any source
+    thumbnail file can't be linked (e.g. it was deleted) already created
+    links are removed and OSError is raised"""
+
+    storage = Thumbnail.file.field.storage
+    objs, linked = [], []
+    try:
+        for source in sources:
+            name = Thumbnail.generate_upload_to(
+                image_uuid, os.path.basename(source.file.name)
+            )
+            linked.append(storage.link(source.file.name, name))
+            for extension in settings.THUMBNAIL_VARIANTS:
+                # variant is stored only if it is smaller than thumbnail
+                with contextlib.suppress(FileNotFoundError):
+                    linked.append(
+                        storage.link(
+                            Thumbnail.get_variant_name(source.file.name, extension),
+                            Thumbnail.get_variant_name(name, extension),
+                        )
+                    )
+            objs.append(
+                Thumbnail(
+                    image_id=image_uuid,
+                    height=source.height,
+                    width=source.width,
+                    file=name,
+                )
+            )
+    except OSError:
+        for name in linked:
+            storage.delete(name)
+        raise
+
+    return objs
+
+
+class UploadDeduplicator:
+    """
+    Deduplicate thumbnails rendering of identical uploads (same content hash
+    and thumbnails). Upload reuses thumbnails of previous identical upload if
+    they exist. Otherwise first upload (leader) renders thumbnails and
+    concurrent identical uploads (followers) wait in redis list, their
+    thumbnails are linked to leader thumbnails once they are rendered
+    """
+
+    key_prefix = "uploads:dedup:"
+    stats_key = "uploads:dedup:stats"
+    # max number of thumbnails checked when previous upload is looked up
+    lookup_limit = 100
+
+    def __init__(self, client: redis.Redis, ttl: int):
+        self.client = client
+        self.ttl = ttl
+        self._join = client.register_script(JOIN_SCRIPT)
+        self._complete = client.register_script(COMPLETE_SCRIPT)
+
+    def get_keys(self, content_hash: str, thumbnails_data: list[dict]) -> list[str]:
+        """Return leader and followers keys of identical uploads"""
+
+        files = ",".join(sorted(data["file"] for data in thumbnails_data))
+        key = f"{self.key_prefix}{content_hash}:{files}"
+        return [key, f"{key}:followers"]
+
+    def find_thumbnails(
+        self, content_hash: str, thumbnails_data: list[dict]
+    ) -> Union[list[Thumbnail], None]:
+        """Return thumbnails of previous identical upload
+        or None if there isn't any"""
+
+        files = {data["file"] for data in thumbnails_data}
+        thumbnails = (
+            Thumbnail.objects.filter(image__content_hash=content_hash)
+            .only("image_id", "height", "width", "file")
+            .order_by("-image__uploaded_at", "image_id")[: self.lookup_limit]
+        )
+
+        images = {}
+        for thumbnail in thumbnails:
+            images.setdefault(thumbnail.image_id, {})[
+                os.path.basename(thumbnail.file.name)
+            ] = thumbnail
+
+        for image_thumbnails in images.values():
+            if files <= image_thumbnails.keys():
+                return [image_thumbnails[file] for file in sorted(files)]
+
+        return None
+
+    def join(
+        self, content_hash: str, thumbnails_data: list[dict], image_uuid: str
+    ) -> bool:
+        """Return True if image is leader and should render thumbnails,
+        False if it joined followers of identical upload being rendered"""
+
+        try:
+            return bool(
+                self._join(
+                    keys=self.get_keys(content_hash, thumbnails_data),
+                    args=[image_uuid, self.ttl],
+                )
+            )
+        except redis.RedisError:
+            logging.warning("Can't deduplicate upload", exc_info=True)
+            return True
+
+    def complete(
+        self, content_hash: str, thumbnails_data: list[dict], image_uuid: str
+    ) -> list[str]:
+        """Return uuids of leader followers, following identical
+        uploads will render (or reuse) thumbnails by themselves"""
+
+        try:
+            followers = self._complete(
+                keys=self.get_keys(content_hash, thumbnails_data), args=[image_uuid]
+            )
+        except redis.RedisError:
+            logging.warning("Can't get followers of upload", exc_info=True)
+            return []
+
+        return [f.decode() if isinstance(f, bytes) else f for f in followers]
+
+    def record(self, outcome: str) -> None:
+        """Count upload with thumbnails that were 'rendered',
+        'reused' (from previous upload) or 'coalesced' (with concurrent one)"""
+
+        try:
+            self.client.hincrby(self.stats_key, outcome, 1)
+        except redis.RedisError:
+            pass
+
+    def gauges(self) -> dict[str, Union[int, float]]:
+        """Return uploads counters and ratio of uploads
+        that didn't have to render thumbnails"""
+
+        stats = {
+            key.decode(): int(value)
+            for key, value in self.client.hgetall(self.stats_key).items()
+        }
+        gauges = {
+            outcome: stats.get(outcome, 0)
+            for outcome in ("rendered", "reused", "coalesced")
+        }
+        uploads = sum(gauges.values())
+        deduplicated = gauges["reused"] + gauges["coalesced"]
+        gauges["dedup_ratio"] = deduplicated / uploads if uploads else 0.0
+        return gauges
+
+
+UPLOAD_DEDUP = UploadDeduplicator(REDIS, ttl=settings.UPLOAD_DEDUP_TTL)
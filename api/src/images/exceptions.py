@@ -0,0 +1,26 @@
+from rest_framework import exceptions, status
+
+
+class StagingUnavailable(exceptions.APIException):
+    """
+    Raised when uploaded image can't be staged for thumbnails creation
+    because staging budget is full
+    """
+
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many images are being processed, try again later."
+    default_code = "staging_unavailable"
+    # number of seconds sent in 'Retry-After' header
+    wait = 30
+
+
+class RenderUnavailable(exceptions.APIException):
+    """
+    Raised when thumbnail is being rendered by other request
+    for longer than THUMBNAIL_RENDER_WAIT seconds
+    """
+
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Thumbnail is being rendered, try again later."
+    default_code = "render_unavailable"
+    wait = 5
@@ -0,0 +1,98 @@
+from django.core.management import BaseCommand, CommandParser
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from rest_framework.test import APIRequestFactory, force_authenticate
+from core.models import Image, Thumbnail, Tier
+from images.views import ImageListView
+from django.urls import reverse
+from django.conf import settings
+import statistics
+import time
+
+
+class DRFImageListView(ImageListView):
+    """ImageListView that always renders images with ImageSerializer"""
+
+    def can_stream(self) -> bool:
+        return False
+
+
+class Command(BaseCommand):
+    """
+    Benchmark throughput (rows/sec) of images listing rendered by
+    ImageSerializer and by streaming ImageStreamSerializer. Benchmark data
+    is created in transaction that is rolled back at the end
+    """
+
+    help = "Compare rows/sec of DRF and streaming images listing"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--images", type=int, default=500)
+        parser.add_argument("--thumbnails", type=int, default=3)
+        parser.add_argument("--repeat", type=int, default=10)
+
+    def handle(self, *args, **options) -> None:
+        with transaction.atomic():
+            user = self.create_data(options["images"], options["thumbnails"])
+            url = f"{reverse('images:image_list')}?page_size={options['images']}"
+            factory = APIRequestFactory(SERVER_NAME=settings.ALLOWED_HOSTS[0])
+
+            for label, view in [
+                ("drf", DRFImageListView.as_view()),
+                ("stream", ImageListView.as_view()),
+            ]:
+                timings = []
+                for _ in range(options["repeat"]):
+                    request = factory.get(url, HTTP_ACCEPT="application/json")
+                    force_authenticate(request, user=user)
+                    start = time.perf_counter()
+                    self.consume(view(request))
+                    timings.append(time.perf_counter() - start)
+
+                self.report(label, options["images"], timings)
+
+            transaction.set_rollback(True)
+
+    def create_data(self, images: int, thumbnails: int) -> get_user_model():
+        """Create user with given number of images and thumbnails"""
+
+        user = get_user_model().objects.create_user(
+            username="bench-image-list", password="bench-image-list"
+        )
+        user.tier = Tier.objects.create(
+            name="bench-image-list", can_generate_expire_link=True
+        )
+        user.save()
+
+        objs = Image.objects.bulk_create(
+            Image(name=f"image{i}", uploaded_by=user, og_file=f"original/{i}.png")
+            for i in range(images)
+        )
+        Thumbnail.objects.bulk_create(
+            Thumbnail(
+                image=image,
+                height=100 * (i + 1),
+                file=f"thumbnails/{image.uuid}/thumbnail-autox{100 * (i + 1)}.png",
+            )
+            for image in objs
+            for i in range(thumbnails)
+        )
+
+        return user
+
+    def consume(self, response) -> int:
+        """Render response and return its size"""
+
+        if response.streaming:
+            return sum(len(chunk) for chunk in response.streaming_content)
+
+        return len(response.render().content)
+
+    def report(self, label: str, rows: int, timings: list[float]) -> None:
+        """Write throughput statistics"""
+
+        self.stdout.write(
+            f"{label:>8}: {rows / statistics.median(timings):10.0f} rows/sec "
+            f"(p50 {statistics.median(timings) * 1000:8.2f}ms, "
+            f"min {min(timings) * 1000:8.2f}ms)"
+        )
@@ -0,0 +1,78 @@
+from django.core.management import BaseCommand, CommandParser
+from images.pool import RESIZE_POOL, resize_job
+from images.sources import shared_source
+from pathlib import Path
+import concurrent.futures
+import statistics
+import time
+
+DEFAULT_IMAGE = Path(__file__).resolve().parents[2] / "tests/images/puffin.jpg"
+
+
+class Command(BaseCommand):
+    """
+    Benchmark per task thumbnails creation latency when new process
+    pool is created for every task and when persistent resize pool is used
+    """
+
+    help = "Compare per task latency with and without persistent resize pool"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--image", default=str(DEFAULT_IMAGE))
+        parser.add_argument("--tasks", type=int, default=20)
+
+    def handle(self, *args, **options) -> None:
+        extension = Path(options["image"]).suffix
+        thumbnails_data = [
+            {"height": 200, "width": None, "file": f"thumbnail-autox200{extension}"},
+            {"height": 400, "width": None, "file": f"thumbnail-autox400{extension}"},
+            {"height": None, "width": None, "file": f"thumbnail-autoxauto{extension}"},
+        ]
+
+        with open(options["image"], "rb") as f:
+            image_bytes = f.read()
+
+        with shared_source([image_bytes]) as source_path:
+            job_args = (options["tasks"], source_path, thumbnails_data)
+            try:
+                timings = self.measure(self.run_in_new_pool, *job_args)
+                self.report("new pool per task", timings)
+
+                # first submit starts workers, it is done once at worker boot
+                RESIZE_POOL.submit(resize_job, source_path, thumbnails_data).result()
+                timings = self.measure(self.run_in_persistent_pool, *job_args)
+                self.report("persistent pool", timings)
+            finally:
+                RESIZE_POOL.shutdown()
+
+    def run_in_new_pool(self, source_path: str, thumbnails_data: list) -> None:
+        """Resize image the way it was done before persistent pool"""
+
+        with concurrent.futures.ProcessPoolExecutor() as executor:
+            executor.submit(resize_job, source_path, thumbnails_data).result()
+
+    def run_in_persistent_pool(self, source_path: str, thumbnails_data: list) -> None:
+        """Resize image in persistent resize pool"""
+
+        RESIZE_POOL.submit(resize_job, source_path, thumbnails_data).result()
+
+    def measure(self, fn, tasks: int, *args) -> list[float]:
+        """Return list of fn execution times in ms"""
+
+        timings = []
+        for _ in range(tasks):
+            start = time.perf_counter()
+            fn(*args)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        return timings
+
+    def report(self, label: str, timings: list[float]) -> None:
+        """Write latency statistics"""
+
+        timings = sorted(timings)
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f"{label:>20}: mean {statistics.mean(timings):8.2f}ms "
+            f"p50 {statistics.median(timings):8.2f}ms p95 {p95:8.2f}ms"
+        )
@@ -0,0 +1,85 @@
+from django.core.management import BaseCommand, CommandParser
+from django.test import RequestFactory, override_settings
+from core.filecache import FileCache
+from images.serving import serve_file
+import tempfile
+import random
+import time
+import os
+
+
+class Command(BaseCommand):
+    """
+    Benchmark serving thumbnails from disk and from in-memory cache of
+    different sizes. Requests follow Zipfian popularity distribution
+    (k-th most popular thumbnail is requested with probability ~ 1/k^s)
+    """
+
+    help = "Replay Zipfian thumbnails request trace with and without cache"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--thumbnails", type=int, default=2000)
+        parser.add_argument("--thumbnail-size", type=int, default=32 * 1024)
+        parser.add_argument("--requests", type=int, default=20000)
+        parser.add_argument("--zipf-s", type=float, default=1.1)
+        parser.add_argument(
+            "--cache-sizes",
+            type=lambda v: [int(s) * 1024 * 1024 for s in v.split(",")],
+            default="4,16,64",
+            help="cache sizes in MiB (comma separated)",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    @override_settings(SENDFILE_BACKEND=None)
+    def handle(self, *args, **options) -> None:
+        rng = random.Random(options["seed"])
+        paths = [
+            f"thumbnails/{i}/thumbnail-autox200.png"
+            for i in range(options["thumbnails"])
+        ]
+        weights = [1 / k ** options["zipf_s"] for k in range(1, len(paths) + 1)]
+        trace = rng.choices(paths, weights=weights, k=options["requests"])
+
+        with tempfile.TemporaryDirectory() as root:
+            for path in paths:
+                os.makedirs(os.path.join(root, os.path.dirname(path)))
+                with open(os.path.join(root, path), "wb") as f:
+                    f.write(rng.randbytes(options["thumbnail_size"]))
+
+            self.report("no cache", len(trace), self.replay(trace, root))
+            for max_bytes in options["cache_sizes"]:
+                cache = FileCache(
+                    max_bytes=max_bytes,
+                    max_item_bytes=max_bytes,
+                    revalidate_after=5,
+                )
+                label = f"{max_bytes // (1024 * 1024)}MiB cache"
+                elapsed = self.replay(trace, root, cache)
+                self.report(label, len(trace), elapsed, cache)
+
+    def replay(self, trace: list[str], root: str, cache: FileCache = None) -> float:
+        """Serve all requests from trace and return elapsed time"""
+
+        request = RequestFactory().get("/")
+        start = time.perf_counter()
+        for path in trace:
+            response = serve_file(request, path, document_root=root, cache=cache)
+            for _ in response:
+                pass
+            response.close()
+
+        return time.perf_counter() - start
+
+    def report(
+        self, label: str, requests: int, elapsed: float, cache: FileCache = None
+    ) -> None:
+        """Write throughput and cache hit ratio"""
+
+        line = f"{label:>14}: {requests / elapsed:10.0f} req/sec"
+        if cache is not None:
+            gauges = cache.gauges()
+            line += (
+                f", hit ratio {gauges['hit_ratio']:6.2%}"
+                f", cached {gauges['bytes'] / (1024 * 1024):6.1f}MiB"
+            )
+        self.stdout.write(line)
@@ -0,0 +1,84 @@
+from django.core.management import BaseCommand, CommandParser
+from images.resizer import ImageResizer, get_supported_variants
+from core.profiles import ENCODER_PROFILES, DEFAULT_PROFILE
+from PIL import Image as PILImage
+from pathlib import Path
+import statistics
+import time
+
+IMAGES_DIR = Path(__file__).resolve().parents[2] / "tests/images"
+
+
+class Command(BaseCommand):
+    """
+    Benchmark size and encode time of thumbnails in original format
+    and in variant formats (WebP, AVIF) served to clients accepting them,
+    for every encoder profile
+    """
+
+    help = (
+        "Compare thumbnail bytes and encode time of original and variant formats "
+        "for every encoder profile"
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--image",
+            action="append",
+            help="source image (may be repeated), test images by default",
+        )
+        parser.add_argument("--height", type=int, action="append")
+        parser.add_argument(
+            "--profile", action="append", choices=list(ENCODER_PROFILES)
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options) -> None:
+        images = options["image"] or [
+            str(IMAGES_DIR / "puffin.jpg"),
+            str(IMAGES_DIR / "puffin.png"),
+        ]
+        heights = options["height"] or [200, 400]
+        profiles = options["profile"] or list(ENCODER_PROFILES)
+        variants = get_supported_variants([".webp", ".avif"])
+        self.stdout.write(f"supported variants: {', '.join(variants) or 'none'}")
+
+        for path in images:
+            extension = Path(path).suffix.lower()
+            with PILImage.open(path) as image:
+                image.load()
+
+            for height in heights:
+                size = (max(1, image.width * height // image.height), height)
+                thumbnail = image.resize(size, PILImage.LANCZOS)
+                self.stdout.write(f"\n{Path(path).name} {size[0]}x{size[1]}")
+                # sizes are compared with original format saved with default profile
+                original = None
+                for file_extension in [extension, *variants]:
+                    for profile in sorted(profiles, key=lambda p: p != DEFAULT_PROFILE):
+                        length, timings = self.measure(
+                            thumbnail,
+                            f"thumbnail{file_extension}",
+                            profile,
+                            options["repeat"],
+                        )
+                        original = original or length
+                        self.stdout.write(
+                            f"{file_extension:>8} {profile:<9}: {length:>9} bytes "
+                            f"({length / original:6.1%}) "
+                            f"encode {statistics.median(timings):8.2f}ms"
+                        )
+
+    def measure(
+        self, image: PILImage.Image, file: str, profile: str, repeat: int
+    ) -> tuple[int, list[float]]:
+        """Return encoded image size and list of encode times in ms"""
+
+        resizer = ImageResizer(source_path="", thumbnails_data=[])
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            encoded = resizer.encode_image(image, file, profile)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        return len(encoded), timings
@@ -0,0 +1,120 @@
+from rest_framework import pagination, exceptions
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from django.db.models import Q
+from django.db.models.query import QuerySet
+from typing import Union
+import datetime
+import binascii
+import base64
+import uuid
+
+
+class ImageKeysetPagination(pagination.BasePagination):
+    """
+    Keyset (cursor) pagination of images ordered by (-uploaded_at, uuid).
+    Next page is fetched with condition on last returned (uploaded_at, uuid)
+    pair instead of OFFSET, so it costs the same no matter how deep in
+    the collection client is. It is backed by composite index on
+    Image(uploaded_by, -uploaded_at, uuid)
+    """
+
+    page_size = 100
+    max_page_size = 500
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    ordering = ("-uploaded_at", "uuid")
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(
+        self, queryset: QuerySet, request: Request, view: object = None
+    ) -> list:
+        """Return single page of queryset"""
+
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        if position := self.decode_cursor(request):
+            uploaded_at, uid = position
+            queryset = queryset.filter(
+                Q(uploaded_at__lt=uploaded_at)
+                | Q(uploaded_at=uploaded_at, uuid__gt=uid)
+            )
+
+        # fetch one additional object to check if there is next page
+        page = list(queryset[: page_size + 1])
+        self.next_position = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_position = self.get_position(page[-1])
+
+        return page
+
+    def get_position(
+        self, obj: Union[object, dict]
+    ) -> tuple[datetime.datetime, uuid.UUID]:
+        """Return (uploaded_at, uuid) pair of given object (or .values() dict)"""
+
+        if isinstance(obj, dict):
+            return obj["uploaded_at"], obj["uuid"]
+
+        return obj.uploaded_at, obj.uuid
+
+    def get_paginated_response(self, data: list) -> Response:
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema: dict) -> dict:
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_page_size(self, request: Request) -> int:
+        """Return page size requested by client (limited to max_page_size)"""
+
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        return min(page_size, self.max_page_size) if page_size > 0 else self.page_size
+
+    def get_next_link(self) -> Union[str, None]:
+        """Return url of the next page or None if it is the last page"""
+
+        if self.next_position is None:
+            return None
+
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.next_position)
+        )
+
+    def encode_cursor(self, position: tuple[datetime.datetime, uuid.UUID]) -> str:
+        """Encode (uploaded_at, uuid) pair to url safe string"""
+
+        uploaded_at, uid = position
+        cursor = f"{uploaded_at.isoformat()}|{uid}"
+        return base64.urlsafe_b64encode(cursor.encode("utf-8")).decode("utf-8")
+
+    def decode_cursor(
+        self, request: Request
+    ) -> Union[tuple[datetime.datetime, uuid.UUID], None]:
+        """Return (uploaded_at, uuid) pair encoded in cursor query param"""
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor is None:
+            return None
+
+        try:
+            cursor = base64.urlsafe_b64decode(cursor.encode()).decode("utf-8")
+            uploaded_at, uid = cursor.split("|")
+            return datetime.datetime.fromisoformat(uploaded_at), uuid.UUID(uid)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise exceptions.NotFound(self.invalid_cursor_message)
@@ -0,0 +1,116 @@
+from django.conf import settings
+from images.resizer import ImageResizer
+from typing import Union, Callable
+import concurrent.futures
+import multiprocessing
+import threading
+import resource
+import os
+
+
+def resize_job(
+    source_path: str,
+    thumbnails_data: list[dict[str, Union[str, int, None]]],
+    variants: tuple[str, ...] = (),
+    max_pixels: Union[int, None] = None,
+) -> list[tuple[str, dict[str:int], bytes, dict[str:bytes]]]:
+    """Resize image in pool worker and return list of created thumbnails"""
+
+    resizer = ImageResizer(
+        source_path=source_path,
+        thumbnails_data=thumbnails_data,
+        variants=variants,
+        max_pixels=max_pixels,
+    )
+    return list(resizer.resize())
+
+
+def limit_memory(max_bytes: int) -> None:
+    """
+    Limit address space of pool worker process. Allocation above the limit
+    (e.g. decoding of decompression bomb) fails with MemoryError in the
+    worker instead of exhausting memory of the whole machine
+    """
+
+    if max_bytes:
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        resource.setrlimit(resource.RLIMIT_AS, (max_bytes, hard))
+
+
+class ResizePool:
+    """
+    Long-lived process pool used to create thumbnails. It is started once
+    when celery worker boots (see images.signals) and reused by every task
+    instead of forking new processes per task. Pool workers are recycled
+    after THUMBNAILS_POOL_MAX_TASKS_PER_CHILD jobs and their memory is limited
+    to THUMBNAILS_POOL_MEMORY_LIMIT bytes
+    """
+
+    def __init__(self):
+        self._executor = None
+        # pid of process that owns executor, forked celery workers
+        # can't reuse executor created by their parent
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def started(self) -> bool:
+        """Check if pool is started in current process"""
+
+        return self._executor is not None and self._pid == os.getpid()
+
+    def start(self) -> concurrent.futures.ProcessPoolExecutor:
+        """Start pool if it isn't running in current process yet and return
+        its executor (read under the lock, so it is never None)"""
+
+        with self._lock:
+            if not self.started:
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=settings.THUMBNAILS_POOL_SIZE,
+                    # max_tasks_per_child isn't compatible with 'fork' start method
+                    mp_context=multiprocessing.get_context("forkserver"),
+                    max_tasks_per_child=settings.THUMBNAILS_POOL_MAX_TASKS_PER_CHILD,
+                    initializer=limit_memory,
+                    initargs=(settings.THUMBNAILS_POOL_MEMORY_LIMIT,),
+                )
+                self._pid = os.getpid()
+
+            return self._executor
+
+    def restart(
+        self, executor: concurrent.futures.ProcessPoolExecutor
+    ) -> concurrent.futures.ProcessPoolExecutor:
+        """Replace broken executor with new one and return it. If other thread
+        already replaced it, the new executor is returned as it is"""
+
+        with self._lock:
+            if self._executor is executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+                self._pid = None
+
+        return self.start()
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop pool workers"""
+
+        with self._lock:
+            if self.started:
+                self._executor.shutdown(wait=wait, cancel_futures=not wait)
+            self._executor = None
+            self._pid = None
+
+    def submit(self, fn: Callable, *args, **kwargs) -> concurrent.futures.Future:
+        """Submit job to the pool. Pool is started lazily if worker boot signal
+        wasn't received (e.g. when task is executed eagerly)"""
+
+        executor = self.start()
+        try:
+            return executor.submit(fn, *args, **kwargs)
+        except concurrent.futures.process.BrokenProcessPool:
+            # one of the workers died abruptly (e.g. was OOM-killed),
+            # executor can't be used anymore so replace it with new one
+            return self.restart(executor).submit(fn, *args, **kwargs)
+
+
+RESIZE_POOL = ResizePool()
@@ -0,0 +1,109 @@
+from django.conf import settings
+from django.core.files.base import ContentFile
+from core.models import Image, Thumbnail
+from core import validators
+from core.profiles import DEFAULT_PROFILE
+from images.resizer import ImageResizer, get_supported_variants
+from images.exceptions import RenderUnavailable
+from django.http import Http404
+from redis.exceptions import LockError
+from src import REDIS
+from typing import Union
+import contextlib
+import os
+
+
+class ThumbnailRenderer:
+    """
+    Render thumbnails on demand from stored original image. Concurrent
+    requests for the same missing thumbnail share single render - the first
+    one renders it holding redis lock, the others wait for the lock and then
+    serve the thumbnail saved by the first one
+    """
+
+    lock_prefix = "thumbnails:render:"
+
+    def __init__(
+        self,
+        image: Image,
+        width: Union[int, None],
+        height: Union[int, None],
+        profile: str = DEFAULT_PROFILE,
+    ):
+        self.image = image
+        self.width = width
+        self.height = height
+        self.profile = profile
+        self.storage = Thumbnail.file.field.storage
+
+    def get_filename(self, extension: str) -> str:
+        """Return thumbnail filename (the same as for thumbnails created on upload)"""
+
+        return f"thumbnail-{self.width or 'auto'}x{self.height or 'auto'}{extension}"
+
+    def get_or_render(self, extension: str) -> str:
+        """Return storage name of thumbnail, render it if it doesn't exist yet"""
+
+        filename = self.get_filename(extension)
+        name = Thumbnail.generate_upload_to(str(self.image.uuid), filename)
+        if self.storage.exists(name):
+            return name
+
+        # thumbnail is rendered only from stored original image
+        # in the same format
+        if not self.image.og_file:
+            raise Http404("Original image isn't stored, thumbnail can't be rendered")
+
+        if os.path.splitext(self.image.og_file.name)[1].lower() != extension.lower():
+            raise Http404("Thumbnail can be rendered only in original image format")
+
+        lock = REDIS.lock(
+            f"{self.lock_prefix}{name}",
+            timeout=settings.THUMBNAIL_RENDER_LOCK_TIMEOUT,
+            blocking_timeout=settings.THUMBNAIL_RENDER_WAIT,
+        )
+        if not lock.acquire():
+            raise RenderUnavailable()
+
+        try:
+            # thumbnail could be rendered while waiting for the lock
+            if not self.storage.exists(name):
+                self.render(filename, name)
+        finally:
+            # lock could expire if rendering took longer than lock timeout
+            with contextlib.suppress(LockError):
+                lock.release()
+
+        return name
+
+    def render(self, filename: str, name: str) -> None:
+        """Resize original image, save thumbnail file and Thumbnail object"""
+
+        resizer = ImageResizer(
+            source_path=self.image.og_file.path,
+            thumbnails_data=[
+                {
+                    "width": self.width,
+                    "height": self.height,
+                    "file": filename,
+                    "profile": self.profile,
+                }
+            ],
+            variants=get_supported_variants(settings.THUMBNAIL_VARIANTS),
+            max_pixels=settings.IMAGE_MAX_PIXELS,
+        )
+        [(_, size, img_bytes, variants)] = resizer.resize()
+
+        file = ContentFile(img_bytes, name=filename)
+        validators.img_extension_validator(file)
+        # variants are saved first, thumbnail existence means it is rendered
+        for extension, variant_bytes in variants.items():
+            self.storage.save(
+                Thumbnail.get_variant_name(name, extension), ContentFile(variant_bytes)
+            )
+        name = self.storage.save(name, file)
+        Thumbnail.objects.update_or_create(
+            image=self.image,
+            file=name,
+            defaults={"height": size["height"], "width": size["width"]},
+        )
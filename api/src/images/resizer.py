@@ -1,11 +1,36 @@
 from dataclasses import dataclass
 from typing import Union, Iterator
-from src import REDIS
-from PIL import Image as PILImage
-import concurrent.futures
+from images.sources import open_source
+from core.profiles import DEFAULT_PROFILE, get_save_options
+from PIL import Image as PILImage, JpegImagePlugin, features
+import logging
 import io
 import os
 
+# image formats by file extension, '.webp' and '.avif' are used only
+# for thumbnail variants (uploaded images are validated to be jpg or png)
+FORMATS = {
+    ".jpg": "JPEG",
+    ".jpeg": "JPEG",
+    ".png": "PNG",
+    ".webp": "WEBP",
+    ".avif": "AVIF",
+}
+
+
+class ImageTooLarge(Exception):
+    """Raised when decoded image would exceed pixel limit"""
+
+
+def get_supported_variants(extensions: list[str]) -> tuple[str, ...]:
+    """Return variants extensions which formats are supported by Pillow build"""
+
+    return tuple(
+        extension
+        for extension in extensions
+        if extension in FORMATS and features.check(FORMATS[extension].lower())
+    )
+
 
 @dataclass
 class ImageResizer:
@@ -16,75 +41,164 @@ class ImageResizer:
         "file"[str]: filename # image name with extension (e.g. 'image.png')
         "height"[int]: new_height, # image height after resize
         "width"[int]: new_width, # image width after resize
+        "profile"[str]: profile, # encoder profile (optional, see core.profiles)
     },]
-    And image_uuid - key to image cached in redis that will be resized
+    And source_path - path to (memory-mapped) source image that will be resized.
+    Every thumbnail is also encoded in formats of given variants extensions
+    (e.g. ('.webp', '.avif')) which are served to clients that accept them.
+    Images which would be decoded to more than 'max_pixels' pixels aren't
+    resized (ImageTooLarge is raised before image is decoded)
     """
 
-    image_uuid: str
+    source_path: str
     thumbnails_data: list[dict[str : Union[str, tuple]]]  # noqa
+    variants: tuple[str, ...] = ()
+    max_pixels: Union[int, None] = None
 
-    def resize(self) -> Iterator[tuple[dict[str:int], str, bytes]]:
+    def resize(self) -> Iterator[tuple[str, dict[str:int], bytes, dict[str:bytes]]]:
         """
         Generate resized images and yield tuples in following format:
-        filename, {"height":new_height, "width":new_width}, img_bytes
+        filename, {"height":new_height, "width":new_width}, img_bytes, variants
+        where variants is dict of variant extension and its bytes
+
+        Source image is memory-mapped and decoded only once. Thumbnails
+        are created from the largest to the smallest one and each of them is
+        scaled down from the smallest already created thumbnail that is still
+        big enough (instead of the full size source image)
         """
 
-        with concurrent.futures.ProcessPoolExecutor() as executor:
-            results = []
-            for thumbnail in self.thumbnails_data:
-                results.append(
-                    executor.submit(
-                        self.resize_image, image_uuid=self.image_uuid, **thumbnail
-                    )
-                )
+        with open_source(self.source_path) as source:
+            image = PILImage.open(source)
+            plan = self.__get_plan(image.size)
+            self.draft_image(image, [size for _, size, _ in plan])
+            self.check_pixels(image)
+            image.load()
+
+        profiles = {
+            t["file"]: t.get("profile", DEFAULT_PROFILE) for t in self.thumbnails_data
+        }
+        # the smallest image (with aspect ratio of source image) created so far,
+        # it is used as a base for next (smaller) thumbnails
+        base = image
+        for file, size, keeps_ratio in plan:
+            if size == image.size:
+                thumbnail = image
+            else:
+                source = base if self.__fits_in(size, base.size) else image
+                thumbnail = source.resize(size, PILImage.LANCZOS)
+                if keeps_ratio:
+                    base = thumbnail
+
+            new_size = {"width": thumbnail.size[0], "height": thumbnail.size[1]}
+            img_bytes = self.encode_image(thumbnail, file, profiles[file])
+            yield file, new_size, img_bytes, self.encode_variants(
+                thumbnail, file, len(img_bytes), profiles[file]
+            )
 
-            # wait for functions to complete and yield their results
-            for f in concurrent.futures.as_completed(results):
-                yield f.result()
+    def check_pixels(self, image: PILImage.Image) -> None:
+        """Check number of pixels of image that will be decoded (read from
+        header, JPEG image can be decoded at reduced scale)"""
 
-    def resize_image(
-        self,
-        image_uuid: str,
-        file: str,  # image name with extension (e.g. 'image.png')
-        height: Union[str, None],
-        width: Union[str, None],
-    ) -> tuple[dict[str:int], bytes]:
+        pixels = image.size[0] * image.size[1]
+        if self.max_pixels is not None and pixels > self.max_pixels:
+            raise ImageTooLarge(
+                f"Image has {pixels} pixels, max number of pixels is {self.max_pixels}"
+            )
+
+    def draft_image(self, image: PILImage.Image, sizes: list[tuple[int]]) -> None:
         """
-        Return resized version of image cached in redis and returns it as bytes
-        ,it new sizes and filename
+        Configure JPEG decoder to decode image directly at the smallest
+        power-of-two scale (1/2, 1/4, 1/8) that is still larger than every
+        requested size. It has to be called before image is loaded,
+        thumbnails are then scaled to their exact size with high-quality filter
         """
 
-        image = REDIS.get(image_uuid)
-        image = PILImage.open(io.BytesIO(image))
+        # MPO (multi-picture JPEG from phone cameras) is JpegImageFile as well
+        if not isinstance(image, JpegImagePlugin.JpegImageFile) or not sizes:
+            return
 
-        if None not in [height, width]:
-            image = image.resize((width, height), PILImage.ANTIALIAS)
-        elif [height, width].count(None) == 1:
-            scale_ratio = self.__get_resize_ratio(image.size, height, width)
-            image = image.resize(
-                (int(s * scale_ratio) for s in image.size), PILImage.ANTIALIAS
-            )
-        else:
-            # image remain as it was
-            pass
+        image.draft(
+            image.mode, (max(s[0] for s in sizes), max(s[1] for s in sizes))
+        )
+
+    def encode_image(
+        self, image: PILImage.Image, file: str, profile: str = DEFAULT_PROFILE
+    ) -> bytes:
+        """Return image saved in format based on file extension as bytes,
+        save options are defined by encoder profile"""
 
         output = io.BytesIO()
         extension = os.path.splitext(file)[1]
+        image_format = self.__get_format(extension)
         image.save(
-            output, format=self.__get_format(extension), optimize=True, quality=80
+            output, format=image_format, **get_save_options(profile, image_format)
         )
-        new_size = {"width": image.size[0], "height": image.size[1]}
 
-        return file, new_size, output.getvalue()
+        return output.getvalue()
+
+    def encode_variants(
+        self,
+        image: PILImage.Image,
+        file: str,
+        size: int,
+        profile: str = DEFAULT_PROFILE,
+    ) -> dict[str, bytes]:
+        """
+        Return image encoded in variants formats. Variant is kept only if
+        it is smaller than image in original format (of given size) and all
+        previously kept variants, so the last kept variant is the smallest one.
+        Variant which can't be encoded (e.g. encoder runs out of memory) is
+        skipped, thumbnail is still served in original format
+        """
+
+        variants = {}
+        for extension in self.variants:
+            try:
+                variant = self.encode_image(image, f"{file}{extension}", profile)
+            except (OSError, ValueError, RuntimeError, MemoryError):
+                logging.warning(
+                    "Can't encode %s variant of %s", extension, file, exc_info=True
+                )
+                continue
+
+            if len(variant) < size:
+                variants[extension] = variant
+                size = len(variant)
+
+        return variants
+
+    def __get_plan(
+        self, basesize: tuple[int]  # (width, height)
+    ) -> list[tuple[str, tuple[int], bool]]:
+        """
+        Return list of (filename, (width, height), keeps_ratio) tuples
+        sorted from the largest to the smallest thumbnail
+        """
+
+        plan = []
+        for thumbnail in self.thumbnails_data:
+            height, width = thumbnail["height"], thumbnail["width"]
+            if None not in [height, width]:
+                plan.append((thumbnail["file"], (width, height), False))
+            elif [height, width].count(None) == 1:
+                scale_ratio = self.__get_resize_ratio(basesize, height, width)
+                size = tuple(max(1, int(s * scale_ratio)) for s in basesize)
+                plan.append((thumbnail["file"], size, True))
+            else:
+                # image remain as it was
+                plan.append((thumbnail["file"], basesize, True))
+
+        return sorted(plan, key=lambda p: p[1][0] * p[1][1], reverse=True)
+
+    def __fits_in(self, size: tuple[int], basesize: tuple[int]) -> bool:
+        """Check if image of given size can be scaled down from basesize"""
+
+        return size[0] <= basesize[0] and size[1] <= basesize[1]
 
     def __get_format(self, extension: str) -> str:
         """Used to get format used to save resized image to bytesIO"""
 
-        return {
-            ".jpg": "JPEG",
-            ".jpeg": "JPEG",
-            ".png": "PNG",
-        }.get(extension.lower())
+        return FORMATS.get(extension.lower())
 
     def __get_resize_ratio(
         self,
@@ -4,21 +4,70 @@ from django.contrib.auth import get_user_model
 from core import models, validators
 from images.tasks.registry import thumbnails_creator
 from images.tokens import expiring_image_token_generator
-from src import REDIS
+from images.exceptions import StagingUnavailable
+from images.dedup import UPLOAD_DEDUP, link_thumbnails
+from src import BLOB_STORE
+from src.blobstore import BlobStoreFull
+from core.tiers import TIER_CACHE
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from django.conf import settings
+from PIL import Image as PILImage
 from typing import Iterator, Union
 from django.urls import reverse
+import hashlib
+import logging
 import os
 
 
+class TierFlagField(serializers.BooleanField):
+    """
+    Read only field with capability flag of image owner tier. It is read
+    from cached tier snapshot (None if owner doesn't have any tier)
+    """
+
+    def __init__(self, flag: str, **kwargs):
+        self.flag = flag
+        kwargs.update({"read_only": True, "allow_null": True})
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance: models.Image) -> Union[bool, None]:
+        snapshot = TIER_CACHE.get(instance.uploaded_by.tier_id)
+        return None if snapshot is None else getattr(snapshot, self.flag)
+
+
+class HeaderImageField(serializers.ImageField):
+    """
+    ImageField which reads only image header (format and dimensions) with
+    lazy PIL.Image.open instead of verifying whole image. Uploaded file isn't
+    copied to memory, opened image (not loaded) is set as file 'image'
+    attribute. Image data is decoded later by thumbnails creator
+    """
+
+    # PIL formats of accepted images
+    formats = ("JPEG", "PNG")
+
+    def to_internal_value(self, data: UploadedFile) -> UploadedFile:
+        file = serializers.FileField.to_internal_value(self, data)
+        try:
+            image = PILImage.open(file, formats=self.formats)
+        except Exception:
+            self.fail("invalid_image")
+        finally:
+            file.seek(0)
+
+        file.image = image
+        file.content_type = PILImage.MIME.get(image.format)
+        return file
+
+
 class ImageSerializer(serializers.ModelSerializer):
     """
     Serializer used to serialize many images (with thumbnails)
     """
 
     thumbnails = ThumbnailSerializer(many=True, read_only=True)
-    can_fetch_expiring_image = serializers.BooleanField(
-        source="uploaded_by.tier.can_generate_expire_link"
-    )
+    can_fetch_expiring_image = TierFlagField("can_generate_expire_link")
 
     class Meta:
         model = models.Image
@@ -28,6 +77,10 @@ class ImageSerializer(serializers.ModelSerializer):
             "uploaded_at",
             "can_fetch_expiring_image",
             "og_file",
+            "width",
+            "height",
+            "format",
+            "bytes",
             "thumbnails",
         )
         read_only_fields = (
@@ -35,6 +88,10 @@ class ImageSerializer(serializers.ModelSerializer):
             "uploaded_at",
             "can_fetch_expiring_image",
             "og_file",
+            "width",
+            "height",
+            "format",
+            "bytes",
             "thumbnails",
         )
 
@@ -105,15 +162,13 @@ class ImageCreateSerializer(serializers.ModelSerializer):
     Serializer used to create images (with thumbnails)
     """
 
-    file = serializers.ImageField(
+    file = HeaderImageField(
         source="og_file",
         write_only=True,
         validators=[validators.img_extension_validator],
         required=True,
     )
-    can_fetch_expiring_image = serializers.BooleanField(
-        source="uploaded_by.tier.can_generate_expire_link"
-    )
+    can_fetch_expiring_image = TierFlagField("can_generate_expire_link")
     thumbnails = serializers.SerializerMethodField()
 
     class Meta:
@@ -134,6 +189,24 @@ class ImageCreateSerializer(serializers.ModelSerializer):
             "thumbnails",
         )
 
+    def validate_file(self, value: UploadedFile) -> UploadedFile:
+        """Check if number of image pixels (read from image header, image
+        isn't decoded) doesn't exceed limit of user tier"""
+
+        tier = TIER_CACHE.get(self.context["request"].user.tier_id)
+        max_pixels = (
+            settings.IMAGE_MAX_PIXELS if tier is None else tier.get_max_pixels()
+        )
+
+        width, height = value.image.size
+        if width * height > max_pixels:
+            raise serializers.ValidationError(
+                f"Image is too large ({width}x{height}), max number "
+                f"of pixels is {max_pixels}"
+            )
+
+        return value
+
     def get_thumbnails(self, obj: Union[models.Image, None]) -> Iterator:
         """Return serialized thumbnails data"""
 
@@ -147,38 +220,58 @@ class ImageCreateSerializer(serializers.ModelSerializer):
             return []
 
         for data in self.validated_data["thumbnails"]:
-            # update file to return url
-            data.update(
-                {
-                    "file": models.Thumbnail.generate_absolute_url(
-                        self.context["request"], str(obj.uuid), data["file"]
-                    )
-                }
-            )
-            yield data
+            # return file url (encoder profile isn't returned)
+            yield {
+                "width": data["width"],
+                "height": data["height"],
+                "file": models.Thumbnail.generate_absolute_url(
+                    self.context["request"], str(obj.uuid), data["file"]
+                ),
+            }
 
-    def get_thumbnails_data(
-        self, user: get_user_model(), extension: str
-    ) -> Iterator[dict]:
+    def get_thumbnails_data(self, user: get_user_model(), extension: str) -> list[dict]:
         """Return thumbnails data based on user tier. It will be then used
         to create thumbnails in celery task and to generate data returned in response"""
 
+        tier = TIER_CACHE.get(user.tier_id)
         # if user is not connected with any tier return empty list
         # to prevent creating any thumbnails
-        if user.tier is None:
+        if tier is None:
             return []
 
-        # get thumbnail sizes (without repeats)
-        thumbnail_sizes = user.tier.sizes.values("height", "width").distinct()
-        for size in thumbnail_sizes:
-            width = size["width"] or "auto"
-            height = size["height"] or "auto"
+        return tier.get_thumbnails_data(extension)
 
-            yield {
-                "width": size["width"],
-                "height": size["height"],
-                "file": f"thumbnail-{width}x{height}{extension}",
-            }
+    def stage_source(self, instance: models.Image, file: UploadedFile) -> dict:
+        """Return locator of source image used by thumbnails_creator task.
+        Image is cached in redis only if original image isn't persisted"""
+
+        if instance.og_file:
+            # original image is already persisted, celery task
+            # reads it directly from storage
+            return {"path": instance.og_file.name}
+
+        # cache image in redis for faster access in celery task, it is
+        # streamed in chunks (upload may be spilled to temporary file)
+        key = str(instance.uuid)
+        try:
+            BLOB_STORE.write(key, file.chunks(BLOB_STORE.chunk_size), size=file.size)
+        except BlobStoreFull:
+            raise StagingUnavailable()
+
+        return {"key": key}
+
+    def get_content_hash(self, file: UploadedFile) -> str:
+        """Return sha256 of uploaded file. It is computed by upload handler
+        while request is streamed, otherwise file is read once again"""
+
+        content_hash = getattr(file, "content_hash", None)
+        if isinstance(content_hash, str):
+            return content_hash
+
+        hasher = hashlib.sha256()
+        for chunk in file.chunks():
+            hasher.update(chunk)
+        return hasher.hexdigest()
 
     def create(self, validated_data: dict) -> models.Image:
         """
@@ -186,28 +279,97 @@ class ImageCreateSerializer(serializers.ModelSerializer):
         """
 
         user = self.context["request"].user
+        tier = TIER_CACHE.get(user.tier_id)
         extension = os.path.splitext(validated_data["og_file"].name)[1]
 
         file = validated_data["og_file"]
+        content_hash = validated_data["content_hash"] = self.get_content_hash(file)
+        # metadata was read from image header by HeaderImageField
+        image = getattr(file, "image", None)
+        if isinstance(image, PILImage.Image):
+            validated_data["width"], validated_data["height"] = image.size
+            validated_data["format"] = image.format
+            validated_data["bytes"] = file.size
         # if user doesn't have permission to access original image
         # delete it from validated_data in order to prevent saving it
-        if user.tier is None or not user.tier.has_og_image_access:
+        if tier is None or not tier.has_og_image_access:
             del validated_data["og_file"]
 
-        instance = super().create(validated_data)
+        thumbnails_data = self.get_thumbnails_data(user, extension)
+        # thumbnails of previous identical upload are reused
+        sources = (
+            UPLOAD_DEDUP.find_thumbnails(content_hash, thumbnails_data)
+            if thumbnails_data
+            else None
+        )
 
-        thumbnails_data = list(self.get_thumbnails_data(user, extension))
+        # image is not created if it can't be staged for thumbnails creation
+        with transaction.atomic():
+            instance = super().create(validated_data)
+            source = None
+            if thumbnails_data and not sources:
+                source = self.stage_source(instance, file)
 
-        if thumbnails_data:
-            # cache image in redis for faster access in celery task
-            REDIS.set(str(instance.uuid), file.file.getvalue())
+        # files are linked once image is committed, so rolled back
+        # image doesn't leave any links behind
+        if sources:
+            source = self.reuse_thumbnails(instance, sources, file)
 
-            # run celery task
-            thumbnails_creator.delay(
-                image_uuid=str(instance.uuid), thumbnails_data=thumbnails_data
-            )
+        if source:
+            self.create_thumbnails(instance, thumbnails_data, source, content_hash)
 
         # set thumbnails in validated_data
         self._validated_data["thumbnails"] = thumbnails_data
 
         return instance
+
+    def reuse_thumbnails(
+        self, instance: models.Image, sources: list, file: UploadedFile
+    ) -> Union[dict, None]:
+        """Link thumbnails of previous identical upload to image. If they
+        can't be linked (e.g. files were deleted) image is staged for
+        thumbnails creation and its source locator is returned"""
+
+        try:
+            models.Thumbnail.objects.bulk_create(
+                link_thumbnails(str(instance.uuid), sources)
+            )
+        except OSError:
+            logging.warning(
+                "Thumbnails of identical upload can't be linked", exc_info=True
+            )
+        else:
+            UPLOAD_DEDUP.record("reused")
+            return None
+
+        try:
+            return self.stage_source(instance, file)
+        except StagingUnavailable:
+            instance.delete()
+            raise
+
+    def create_thumbnails(
+        self,
+        instance: models.Image,
+        thumbnails_data: list[dict],
+        source: dict,
+        content_hash: str,
+    ) -> None:
+        """Run celery task creating thumbnails unless identical upload
+        is being processed, then thumbnails are linked once it's done"""
+
+        # image is joined after it is committed, so it is visible to task
+        if not UPLOAD_DEDUP.join(content_hash, thumbnails_data, str(instance.uuid)):
+            if "key" in source:
+                BLOB_STORE.delete(source["key"])
+            UPLOAD_DEDUP.record("coalesced")
+            return
+
+        # run celery task
+        thumbnails_creator.delay(
+            image_uuid=str(instance.uuid),
+            thumbnails_data=thumbnails_data,
+            source=source,
+            content_hash=content_hash,
+        )
+        UPLOAD_DEDUP.record("rendered")
@@ -0,0 +1,116 @@
+from rest_framework import serializers, renderers
+from rest_framework.compat import SHORT_SEPARATORS, LONG_SEPARATORS
+from django.http import HttpRequest
+from django.core.files.storage import Storage
+from core import models
+from core.tiers import TIER_CACHE
+from typing import Iterator, Union
+import collections
+
+
+class ImageStreamSerializer:
+    """
+    Fast read-only counterpart of ImageSerializer used to list images.
+    Rows are built straight from .values() dicts (without model instances and
+    nested serializers) and rendered to JSON one by one, so response can be
+    streamed. Output is byte compatible with paginated ImageSerializer data
+    rendered by JSONRenderer
+    """
+
+    # fields fetched with .values()
+    values_fields = (
+        "uuid",
+        "name",
+        "uploaded_at",
+        "og_file",
+        "width",
+        "height",
+        "format",
+        "bytes",
+        "uploaded_by__tier",
+    )
+    renderer_class = renderers.JSONRenderer
+
+    def __init__(self, images: list[dict], context: dict):
+        self.images = images
+        self.request = context["request"]
+        self.renderer = self.renderer_class()
+        self.datetime_field = serializers.DateTimeField()
+        self.image_storage = models.Image._meta.get_field("og_file").storage
+        self.thumbnail_storage = models.Thumbnail._meta.get_field("file").storage
+
+    def stream(self, next_link: Union[str, None]) -> Iterator[bytes]:
+        """Yield JSON encoded {"next": next_link, "results": [...]} in chunks"""
+
+        item_separator, key_separator = (
+            SHORT_SEPARATORS if self.renderer.compact else LONG_SEPARATORS
+        )
+        item_separator = item_separator.encode()
+        key_separator = key_separator.encode()
+
+        yield b'{"next"' + key_separator + self.render(next_link)
+        yield item_separator + b'"results"' + key_separator + b"["
+        for i, row in enumerate(self.get_rows()):
+            yield (item_separator if i else b"") + self.render(row)
+        yield b"]}"
+
+    def render(self, data: object) -> bytes:
+        """Render data to JSON the same way as JSONRenderer"""
+
+        # JSONRenderer returns empty body for None
+        return b"null" if data is None else self.renderer.render(data)
+
+    def get_rows(self) -> Iterator[dict]:
+        """Yield images data in the same format as ImageSerializer"""
+
+        thumbnails = self.get_thumbnails([image["uuid"] for image in self.images])
+        for image in self.images:
+            tier = TIER_CACHE.get(image["uploaded_by__tier"])
+            yield {
+                "name": image["name"],
+                "uuid": str(image["uuid"]),
+                "uploaded_at": self.datetime_field.to_representation(
+                    image["uploaded_at"]
+                ),
+                "can_fetch_expiring_image": None
+                if tier is None
+                else tier.can_generate_expire_link,
+                "og_file": self.get_file_url(self.image_storage, image["og_file"]),
+                "width": image["width"],
+                "height": image["height"],
+                "format": image["format"],
+                "bytes": image["bytes"],
+                "thumbnails": thumbnails[image["uuid"]],
+            }
+
+    def get_thumbnails(self, image_uuids: list) -> dict[object, list[dict]]:
+        """Return thumbnails data (in ThumbnailSerializer format) of given
+        images fetched in single query"""
+
+        thumbnails = collections.defaultdict(list)
+        queryset = (
+            models.Thumbnail.objects.filter(image_id__in=image_uuids)
+            .order_by("id")
+            .values_list("image_id", "height", "width", "file")
+        )
+        for image_uuid, height, width, file in queryset:
+            thumbnails[image_uuid].append(
+                {
+                    "height": height,
+                    "width": width,
+                    "file": self.get_file_url(self.thumbnail_storage, file),
+                }
+            )
+
+        return thumbnails
+
+    def get_file_url(
+        self, storage: Storage, name: Union[str, None]
+    ) -> Union[str, None]:
+        """Return absolute file url the same way as serializers.ImageField"""
+
+        if not name:
+            return None
+
+        request: HttpRequest = self.request
+        return request.build_absolute_uri(storage.url(name))
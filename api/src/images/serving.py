@@ -0,0 +1,422 @@
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpRequest,
+    HttpResponse,
+    HttpResponseBase,
+    StreamingHttpResponse,
+)
+from django.utils._os import safe_join
+from core.filecache import FileCache, CachedFile, get_stat_key
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+from urllib.parse import quote
+from asgiref.sync import sync_to_async
+from dataclasses import dataclass
+from typing import AsyncIterator, BinaryIO, Iterator, Union
+import mimetypes
+import asyncio
+import re
+import os
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# media types of thumbnail variants by extension
+VARIANT_TYPES = {".webp": "image/webp", ".avif": "image/avif"}
+for extension, media_type in VARIANT_TYPES.items():
+    mimetypes.add_type(media_type, extension)
+
+
+def get_etag(stat: os.stat_result) -> str:
+    """Return strong ETag of file based on its modification time and size
+    (files are never modified in place, they are replaced by new ones)"""
+
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def parse_range(
+    header: Union[str, None], size: int
+) -> Union[tuple[int, int], None, bool]:
+    """
+    Return (start, end) inclusive byte range requested in Range header, None
+    if whole file should be served (no header, invalid or multiple ranges)
+    and False if range can't be satisfied
+    """
+
+    if not header or not (match := RANGE_RE.match(header.strip())):
+        return None
+
+    start, end = match.groups()
+    if not start and not end:
+        return None
+
+    if not start:
+        # suffix range - last 'end' bytes
+        length = int(end)
+        return (max(0, size - length), size - 1) if length and size else False
+
+    start, end = int(start), int(end) if end else size - 1
+    if start >= size:
+        return False
+
+    if end < start:
+        # invalid range is ignored
+        return None
+
+    return start, min(end, size - 1)
+
+
+def if_range_matches(request: HttpRequest, etag: str, last_modified: int) -> bool:
+    """Check if If-Range precondition (if any) allows to serve partial content"""
+
+    if_range = request.headers.get("If-Range")
+    if if_range is None:
+        return True
+
+    if if_range.startswith('"'):
+        return if_range == etag
+
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def read_range(
+    file: BinaryIO, start: int, end: int, chunk_size: int
+) -> Iterator[bytes]:
+    """Yield file bytes from start to end (inclusive) and close the file"""
+
+    try:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0 and (chunk := file.read(min(chunk_size, remaining))):
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def get_content_type(fullpath: str) -> tuple[str, Union[str, None]]:
+    """Return content type and encoding of file"""
+
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    return content_type or "application/octet-stream", encoding
+
+
+def load_cached_file(fullpath: str, cache: FileCache) -> Union[CachedFile, None]:
+    """Read file into the cache, return None if file is too big to be cached"""
+
+    try:
+        with open(fullpath, "rb") as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_size > cache.max_item_bytes:
+                return None
+
+            body = f.read()
+    except OSError:
+        raise Http404("File does not exist")
+
+    entry = CachedFile(
+        body,
+        get_etag(stat),
+        int(stat.st_mtime),
+        *get_content_type(fullpath),
+        get_stat_key(stat),
+    )
+    cache.set(fullpath, entry)
+    return entry
+
+
+@dataclass
+class FileTransfer:
+    """Part of the file (start-end bytes, inclusive) that should be sent"""
+
+    fullpath: str
+    entry: Union[CachedFile, None]
+    start: int
+    end: int
+    status: int
+    content_type: str
+    headers: dict
+
+    def get_memory_response(self) -> HttpResponse:
+        """Return response with file body cached in memory"""
+
+        return HttpResponse(
+            self.entry.body[self.start : self.end + 1],  # noqa
+            status=self.status,
+            content_type=self.content_type,
+            headers=self.headers,
+        )
+
+    def get_streaming_response(
+        self, content: Union[Iterator[bytes], AsyncIterator[bytes]]
+    ) -> StreamingHttpResponse:
+        response = StreamingHttpResponse(
+            content,
+            status=self.status,
+            content_type=self.content_type,
+            headers=self.headers,
+        )
+        response["Content-Length"] = str(self.end - self.start + 1)
+        return response
+
+
+def prepare_file(
+    request: HttpRequest,
+    path: str,
+    document_root: Union[str, None] = None,
+    cache: Union[FileCache, None] = None,
+) -> Union[HttpResponseBase, FileTransfer]:
+    """
+    Check file and request preconditions. Return final response if file body
+    doesn't have to be sent by Django (304, 412, 416 or sendfile offload),
+    otherwise return FileTransfer describing what should be sent
+    """
+
+    try:
+        # path can't point outside document_root (e.g. '../original_images')
+        fullpath = safe_join(document_root or settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("File does not exist")
+
+    entry = None
+    if cache is not None and not settings.SENDFILE_BACKEND:
+        entry = cache.get(fullpath) or load_cached_file(fullpath, cache)
+
+    if entry is not None:
+        etag, last_modified, size = entry.etag, entry.last_modified, len(entry.body)
+        content_type, encoding = entry.content_type, entry.encoding
+    else:
+        try:
+            stat = os.stat(fullpath)
+        except OSError:
+            raise Http404("File does not exist")
+
+        if not os.path.isfile(fullpath):
+            raise Http404("File does not exist")
+
+        etag, last_modified, size = get_etag(stat), int(stat.st_mtime), stat.st_size
+        content_type, encoding = get_content_type(fullpath)
+
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(last_modified),
+        "Accept-Ranges": "bytes",
+    }
+    if response := get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    ):
+        # 304 Not Modified or 412 Precondition Failed
+        response["ETag"], response["Last-Modified"] = etag, headers["Last-Modified"]
+        return response
+
+    if encoding:
+        headers["Content-Encoding"] = encoding
+
+    if settings.SENDFILE_BACKEND == "x-accel-redirect":
+        # location is relative to MEDIA_ROOT (served by front-end server)
+        name = os.path.relpath(fullpath, os.path.abspath(settings.MEDIA_ROOT))
+        location = settings.SENDFILE_URL_PREFIX + quote(name.replace(os.sep, "/"))
+        return HttpResponse(
+            content_type=content_type,
+            headers={**headers, "X-Accel-Redirect": location},
+        )
+    elif settings.SENDFILE_BACKEND == "x-sendfile":
+        return HttpResponse(
+            content_type=content_type, headers={**headers, "X-Sendfile": fullpath}
+        )
+
+    byte_range = None
+    if if_range_matches(request, etag, last_modified):
+        byte_range = parse_range(request.headers.get("Range"), size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416, headers=headers)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    status = 200
+    start, end = 0, size - 1
+    if byte_range is not None:
+        status = 206
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    return FileTransfer(fullpath, entry, start, end, status, content_type, headers)
+
+
+def serve_file(
+    request: HttpRequest,
+    path: str,
+    document_root: Union[str, None] = None,
+    cache: Union[FileCache, None] = None,
+) -> HttpResponseBase:
+    """
+    Serve file from document_root (MEDIA_ROOT by default). Response has
+    strong ETag and Last-Modified headers, conditional requests are answered
+    with 304 and single byte ranges are supported. If SENDFILE_BACKEND is set
+    file transfer is handed over to front-end server (nginx X-Accel-Redirect
+    or apache X-Sendfile), which handles ranges by itself. Otherwise file
+    body is served from (and stored in) the cache if given
+    """
+
+    transfer = prepare_file(request, path, document_root, cache)
+    if isinstance(transfer, HttpResponseBase):
+        return transfer
+
+    if transfer.entry is not None:
+        return transfer.get_memory_response()
+
+    if transfer.status == 200:
+        return FileResponse(
+            open(transfer.fullpath, "rb"),
+            content_type=transfer.content_type,
+            headers=transfer.headers,
+        )
+
+    return transfer.get_streaming_response(
+        read_range(
+            open(transfer.fullpath, "rb"),
+            transfer.start,
+            transfer.end,
+            FileResponse.block_size,
+        )
+    )
+
+
+def get_accepted_types(request: HttpRequest) -> set[str]:
+    """Return media types explicitly listed in Accept header
+    (wildcards aren't expanded) with non-zero quality"""
+
+    accepted = set()
+    for item in request.headers.get("Accept", "").split(","):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    pass
+
+        if media_type and quality > 0:
+            accepted.add(media_type.lower())
+
+    return accepted
+
+
+def get_variant_paths(
+    request: HttpRequest, path: str, variants: list[str]
+) -> list[str]:
+    """
+    Return paths of thumbnail variants accepted by client from the most
+    preferred one, the last path is thumbnail in original format. Later
+    variants are preferred (they are stored only if they are smaller)
+    """
+
+    accepted = get_accepted_types(request)
+    return [
+        f"{path}{extension}"
+        for extension in reversed(variants)
+        if VARIANT_TYPES.get(extension) in accepted
+    ] + [path]
+
+
+def serve_variant(
+    request: HttpRequest,
+    path: str,
+    variants: list[str],
+    cache: Union[FileCache, None] = None,
+    document_root: Union[str, None] = None,
+) -> HttpResponseBase:
+    """Serve the most preferred thumbnail variant accepted by client,
+    variants which weren't stored are skipped"""
+
+    *paths, path = get_variant_paths(request, path, variants)
+    for variant_path in paths:
+        try:
+            response = serve_file(request, variant_path, document_root, cache)
+            break
+        except Http404:
+            continue
+    else:
+        response = serve_file(request, path, document_root, cache)
+
+    patch_vary_headers(response, ["Accept"])
+    return response
+
+
+async def aread_range(
+    fullpath: str, start: int, end: int, chunk_size: int
+) -> AsyncIterator[bytes]:
+    """Asynchronously yield file bytes from start to end (inclusive).
+    Blocking file reads are run in threads, so event loop isn't blocked"""
+
+    file = await asyncio.to_thread(open, fullpath, "rb")
+    try:
+        await asyncio.to_thread(file.seek, start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await asyncio.to_thread(file.read, min(chunk_size, remaining))
+            if not chunk:
+                break
+
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        await asyncio.to_thread(file.close)
+
+
+async def aserve_file(
+    request: HttpRequest,
+    path: str,
+    document_root: Union[str, None] = None,
+    cache: Union[FileCache, None] = None,
+) -> HttpResponseBase:
+    """
+    Async version of serve_file used by async views (under ASGI). File is
+    streamed with non-blocking I/O, so slow clients don't hold any thread
+    """
+
+    transfer = await sync_to_async(prepare_file, thread_sensitive=False)(
+        request, path, document_root, cache
+    )
+    if isinstance(transfer, HttpResponseBase):
+        return transfer
+
+    if transfer.entry is not None:
+        return transfer.get_memory_response()
+
+    return transfer.get_streaming_response(
+        aread_range(
+            transfer.fullpath,
+            transfer.start,
+            transfer.end,
+            settings.ASYNC_SERVING_CHUNK_SIZE,
+        )
+    )
+
+
+async def aserve_variant(
+    request: HttpRequest,
+    path: str,
+    variants: list[str],
+    cache: Union[FileCache, None] = None,
+    document_root: Union[str, None] = None,
+) -> HttpResponseBase:
+    """Async version of serve_variant"""
+
+    *paths, path = get_variant_paths(request, path, variants)
+    for variant_path in paths:
+        try:
+            response = await aserve_file(request, variant_path, document_root, cache)
+            break
+        except Http404:
+            continue
+    else:
+        response = await aserve_file(request, path, document_root, cache)
+
+    patch_vary_headers(response, ["Accept"])
+    return response
@@ -0,0 +1,33 @@
+from celery import signals
+from images.pool import RESIZE_POOL
+
+
+def is_prefork_worker(worker: object) -> bool:
+    """Check if celery worker uses prefork (multiprocessing) pool"""
+
+    pool_cls = getattr(worker, "pool_cls", "")
+    return "prefork" in getattr(pool_cls, "__module__", str(pool_cls))
+
+
+@signals.worker_init.connect
+def start_resize_pool(sender: object = None, **kwargs) -> None:
+    """Start resize pool when celery worker boots. Prefork worker processes
+    start their own pools in 'worker_process_init'"""
+
+    if not is_prefork_worker(sender):
+        RESIZE_POOL.start()
+
+
+@signals.worker_process_init.connect
+def start_worker_process_resize_pool(**kwargs) -> None:
+    """Start resize pool in forked celery worker process"""
+
+    RESIZE_POOL.start()
+
+
+@signals.worker_process_shutdown.connect
+@signals.worker_shutdown.connect
+def shutdown_resize_pool(**kwargs) -> None:
+    """Stop resize pool workers when celery worker stops"""
+
+    RESIZE_POOL.shutdown()
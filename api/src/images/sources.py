@@ -0,0 +1,55 @@
+from django.conf import settings
+from src import BLOB_STORE
+from typing import Iterable, Iterator, Union
+import contextlib
+import tempfile
+import mmap
+import os
+
+
+def get_source_dir() -> Union[str, None]:
+    """
+    Return THUMBNAILS_SOURCE_DIR if it can hold all images staged in blob
+    store at once, otherwise None (default temporary directory on disk is
+    used). Docker limits /dev/shm to 64MB unless 'shm_size' is set
+    """
+
+    directory = settings.THUMBNAILS_SOURCE_DIR
+    if directory is None:
+        return None
+
+    try:
+        stat = os.statvfs(directory)
+    except OSError:
+        return None
+
+    return directory if stat.f_blocks * stat.f_frsize >= BLOB_STORE.max_bytes else None
+
+
+@contextlib.contextmanager
+def shared_source(chunks: Iterable[bytes]) -> Iterator[str]:
+    """
+    Write image bytes to temp file located in shared memory (tmpfs) and
+    yield its path. Path can be passed to resize pool workers which map
+    the file instead of receiving pickled bytes. File is removed on exit
+    """
+
+    fd, path = tempfile.mkstemp(dir=get_source_dir())
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        yield path
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+
+
+@contextlib.contextmanager
+def open_source(path: str) -> Iterator[mmap.mmap]:
+    """Memory-map source file read-only, returned object can be read like
+    file without copying its content to process memory"""
+
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as source:
+            yield source
@@ -0,0 +1,22 @@
+from src import BLOB_STORE
+import logging
+import celery
+
+
+class BlobsSweeper(celery.Task):
+    """
+    This Task is periodically executed by celery beat to release
+    staging budget of blobs that were never deleted (e.g. because
+    celery worker died or task message was lost)
+    """
+
+    max_retries = 0
+
+    def run(self, **kwargs) -> int:
+        """This method should define body of the task executed by workers"""
+
+        swept = BLOB_STORE.sweep()
+        if swept:
+            logging.warning(f"Swept {swept} orphaned blobs")
+
+        return swept
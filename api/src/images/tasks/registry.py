@@ -1,5 +1,7 @@
 from src import CELERY_APP
 from .thumbnails_creator_task import ThumbnailsCreator
+from .blobs_sweeper_task import BlobsSweeper
 
 
 thumbnails_creator = CELERY_APP.register_task(ThumbnailsCreator())
+blobs_sweeper = CELERY_APP.register_task(BlobsSweeper())
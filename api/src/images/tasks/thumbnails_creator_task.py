@@ -1,8 +1,14 @@
+from django.conf import settings
 from django.core.files.base import ContentFile
-from images.resizer import ImageResizer
-from images.serializers.thumbnail import ThumbnailSerializer
-from src import REDIS
-from typing import Union
+from images.pool import RESIZE_POOL, resize_job
+from images.resizer import get_supported_variants
+from images.sources import shared_source
+from images.dedup import UPLOAD_DEDUP, link_thumbnails
+from core.models import Image, Thumbnail
+from core import validators
+from src import BLOB_STORE
+from typing import Iterable, Iterator, Union
+import contextlib
 import logging
 import celery
 
@@ -20,38 +26,113 @@ class ThumbnailsCreator(celery.Task):
         image_uuid: str,  # uuid to image model instance and to redis image data
         # in format [{"height":height, "width":width, "file":filename}]
         thumbnails_data: list[dict[str, Union[str, int, None]]],
+        # source image locator, either {"path": storage_path} if original
+        # image is persisted or {"key": redis_key} if it is cached in redis
+        source: Union[dict[str, str], None] = None,
+        # sha256 of source image, set if identical uploads wait for this render
+        content_hash: Union[str, None] = None,
         **kwargs,  # any additional kwargs
     ) -> None:
         """This method should define body of the task executed by workers"""
 
+        source = source or {"key": image_uuid}
+        thumbnails = None
         try:
-            image_resizer = ImageResizer(
-                image_uuid=image_uuid, thumbnails_data=thumbnails_data
-            )
-            for filename, size, img_bytes in image_resizer.resize():
-                self.save_image(image_uuid, filename, size, img_bytes)
+            with self.get_source_path(source) as source_path:
+                # resize image in long-lived worker pool
+                future = RESIZE_POOL.submit(
+                    resize_job,
+                    source_path=source_path,
+                    thumbnails_data=thumbnails_data,
+                    variants=get_supported_variants(settings.THUMBNAIL_VARIANTS),
+                    max_pixels=settings.IMAGE_MAX_PIXELS,
+                )
+                thumbnails = future.result()
         except Exception:
             logging.exception("message")
         finally:
             # make sure that cached image is deleted from redis
-            REDIS.delete(image_uuid)
+            if "key" in source:
+                BLOB_STORE.delete(source["key"])
+
+        # identical uploads which waited for this render, they are
+        # released even if render failed (it would fail for them too)
+        followers = []
+        if content_hash:
+            followers = UPLOAD_DEDUP.complete(content_hash, thumbnails_data, image_uuid)
+
+        if thumbnails is None:
+            return
+
+        try:
+            self.save_thumbnails(image_uuid, thumbnails, followers)
+        except Exception:
+            logging.exception("message")
+
+    @contextlib.contextmanager
+    def get_source_path(self, source: dict[str, str]) -> Iterator[str]:
+        """Yield path to source image file that can be read by pool worker"""
+
+        if "path" in source:
+            # original image is already persisted in storage
+            yield Image.og_file.field.storage.path(source["path"])
+            return
+
+        # image is streamed from redis once and handed off to pool
+        # worker through shared memory
+        with shared_source(BLOB_STORE.read(source["key"])) as source_path:
+            yield source_path
 
-    def save_image(
-        self, image_uuid: str, filename: str, size: dict[str:int], img_bytes: bytes
+    def save_thumbnails(
+        self,
+        image_uuid: str,
+        thumbnails: list[tuple[str, dict[str:int], bytes, dict[str:bytes]]],
+        followers: Iterable[str] = (),
     ) -> None:
-        """Create ContentFile and save Thumbnail"""
-
-        image = ContentFile(img_bytes, name=filename)
-        serializer = ThumbnailSerializer(
-            data={
-                "image": image_uuid,
-                "height": size["height"],
-                "width": size["width"],
-                "file": image,
-            }
-        )
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        """Write thumbnails files and then insert all Thumbnail objects at once.
+        Thumbnails of followers (identical uploads) are hard linked to them"""
+
+        # images could be deleted before task was executed, thumbnails
+        # are written for first existing one
+        image_uuids = [image_uuid, *followers]
+        existing = {
+            str(uuid)
+            for uuid in Image.objects.filter(uuid__in=image_uuids).values_list(
+                "uuid", flat=True
+            )
+        }
+        image_uuids = [uuid for uuid in image_uuids if uuid in existing]
+        if not image_uuids:
+            raise Image.DoesNotExist(f"Image with uuid '{image_uuid}' does not exist")
+
+        storage = Thumbnail.file.field.storage
+        objs = []
+        for filename, size, img_bytes, variants in thumbnails:
+            file = ContentFile(img_bytes, name=filename)
+            validators.img_extension_validator(file)
+            name = storage.save(
+                Thumbnail.generate_upload_to(image_uuids[0], filename), file
+            )
+            for extension, variant_bytes in variants.items():
+                storage.save(
+                    Thumbnail.get_variant_name(name, extension),
+                    ContentFile(variant_bytes),
+                )
+            objs.append(
+                Thumbnail(
+                    image_id=image_uuids[0],
+                    height=size["height"],
+                    width=size["width"],
+                    file=name,
+                )
+            )
+
+        sources = list(objs)
+        for uuid in image_uuids[1:]:
+            objs.extend(link_thumbnails(uuid, sources))
+
+        # bulk_create inserts all objects in single transaction
+        Thumbnail.objects.bulk_create(objs)
 
     def on_failure(self, exc, task_id, args, kwargs, einfo):
         """This method is called when task fails"""
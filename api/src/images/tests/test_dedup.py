@@ -0,0 +1,155 @@
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.conf import settings
+from core.models import Image, Thumbnail
+from images.dedup import UploadDeduplicator, link_thumbnails
+from unittest import mock
+import tempfile
+import shutil
+import redis
+import os
+
+
+class TestUploadDeduplicator(SimpleTestCase):
+    """Test UploadDeduplicator redis operations"""
+
+    def setUp(self):
+        self.client = mock.MagicMock()
+        self.dedup = UploadDeduplicator(self.client, ttl=60)
+        self.dedup._join = mock.MagicMock(return_value=1)
+        self.dedup._complete = mock.MagicMock(return_value=[b"follower"])
+        self.thumbnails_data = [
+            {"height": 400, "width": None, "file": "thumbnail-autox400.jpg"},
+            {"height": 200, "width": None, "file": "thumbnail-autox200.jpg"},
+        ]
+
+    def test_get_keys(self):
+        """Keys shouldn't depend on order of thumbnails"""
+
+        keys = self.dedup.get_keys("hash", self.thumbnails_data)
+        self.assertEqual(
+            keys,
+            [
+                "uploads:dedup:hash:thumbnail-autox200.jpg,thumbnail-autox400.jpg",
+                "uploads:dedup:hash:thumbnail-autox200.jpg,"
+                "thumbnail-autox400.jpg:followers",
+            ],
+        )
+        self.assertEqual(
+            self.dedup.get_keys("hash", self.thumbnails_data[::-1]), keys
+        )
+
+    def test_join(self):
+        self.assertTrue(self.dedup.join("hash", self.thumbnails_data, "uuid"))
+        self.dedup._join.assert_called_once_with(
+            keys=self.dedup.get_keys("hash", self.thumbnails_data), args=["uuid", 60]
+        )
+
+        self.dedup._join.return_value = 0
+        self.assertFalse(self.dedup.join("hash", self.thumbnails_data, "uuid"))
+
+    def test_join_with_redis_error(self):
+        """Image should render thumbnails by itself if redis isn't available"""
+
+        self.dedup._join.side_effect = redis.ConnectionError
+        self.assertTrue(self.dedup.join("hash", self.thumbnails_data, "uuid"))
+
+    def test_complete(self):
+        self.assertEqual(
+            self.dedup.complete("hash", self.thumbnails_data, "uuid"), ["follower"]
+        )
+        self.dedup._complete.side_effect = redis.ConnectionError
+        self.assertEqual(self.dedup.complete("hash", self.thumbnails_data, "uuid"), [])
+
+    def test_gauges(self):
+        self.client.hgetall.return_value = {b"rendered": b"3", b"reused": b"1"}
+        self.assertEqual(
+            self.dedup.gauges(),
+            {"rendered": 3, "reused": 1, "coalesced": 0, "dedup_ratio": 0.25},
+        )
+
+        self.client.hgetall.return_value = {}
+        self.assertEqual(self.dedup.gauges()["dedup_ratio"], 0.0)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class TestThumbnailsLookup(TestCase):
+    """Test looking up and linking thumbnails of identical uploads"""
+
+    def setUp(self):
+        self.dedup = UploadDeduplicator(mock.MagicMock(), ttl=60)
+        self.user = get_user_model().objects.create_user(
+            username="user", password="pass"
+        )
+        self.image = Image.objects.create(
+            name="image", uploaded_by=self.user, content_hash="hash"
+        )
+        for height in [200, 400]:
+            thumbnail = Thumbnail(image=self.image, height=height)
+            thumbnail.file.save(
+                f"thumbnail-autox{height}.jpg", ContentFile(b"image"), save=True
+            )
+        self.thumbnails_data = [
+            {"height": 200, "width": None, "file": "thumbnail-autox200.jpg"}
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    def test_find_thumbnails(self):
+        """Should return thumbnails of image with the same content hash"""
+
+        with self.assertNumQueries(1):
+            thumbnails = self.dedup.find_thumbnails("hash", self.thumbnails_data)
+
+        self.assertEqual(
+            [t.file.name for t in thumbnails],
+            [f"thumbnails/{self.image.uuid}/thumbnail-autox200.jpg"],
+        )
+
+    def test_find_thumbnails_not_found(self):
+        """Should return None if there isn't image with all required thumbnails"""
+
+        data = [{"height": 100, "width": None, "file": "thumbnail-autox100.jpg"}]
+        for content_hash, thumbnails_data in [
+            ("other", self.thumbnails_data),
+            ("hash", self.thumbnails_data + data),
+        ]:
+            with self.subTest(content_hash=content_hash):
+                self.assertIsNone(
+                    self.dedup.find_thumbnails(content_hash, thumbnails_data)
+                )
+
+    def test_link_thumbnails(self):
+        """Thumbnails should share files with source thumbnails"""
+
+        image = Image.objects.create(name="image", uploaded_by=self.user)
+        sources = self.dedup.find_thumbnails("hash", self.thumbnails_data)
+        with open(f"{sources[0].file.path}.webp", "wb") as f:
+            f.write(b"variant")
+        thumbnails = link_thumbnails(str(image.uuid), sources)
+
+        self.assertEqual(len(thumbnails), 1)
+        self.assertEqual(thumbnails[0].image_id, str(image.uuid))
+        self.assertEqual(thumbnails[0].height, 200)
+        self.assertEqual(
+            os.stat(thumbnails[0].file.path).st_ino,
+            os.stat(sources[0].file.path).st_ino,
+        )
+        # variants which were stored should be linked as well
+        self.assertTrue(os.path.exists(f"{thumbnails[0].file.path}.webp"))
+        self.assertFalse(os.path.exists(f"{thumbnails[0].file.path}.avif"))
+
+    def test_link_thumbnails_missing_file(self):
+        """Links should be removed if any source file doesn't exist"""
+
+        image = Image.objects.create(name="image", uploaded_by=self.user)
+        sources = list(self.image.thumbnails.order_by("height"))
+        os.remove(sources[1].file.path)
+
+        with self.assertRaises(FileNotFoundError):
+            link_thumbnails(str(image.uuid), sources)
+
+        directory = os.path.join(settings.MEDIA_ROOT, "thumbnails", str(image.uuid))
+        self.assertEqual(os.listdir(directory), [])
@@ -0,0 +1,95 @@
+from django.test import SimpleTestCase, override_settings
+from images.pool import ResizePool, limit_memory
+from images import signals
+from unittest import mock
+import concurrent.futures
+import os
+
+
+@override_settings(THUMBNAILS_POOL_SIZE=1, THUMBNAILS_POOL_MAX_TASKS_PER_CHILD=10)
+class TestResizePool(SimpleTestCase):
+    """Test ResizePool"""
+
+    def setUp(self):
+        self.pool = ResizePool()
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def test_start_is_idempotent(self):
+        """Executor should be created only once per process"""
+
+        self.pool.start()
+        executor = self.pool._executor
+        self.pool.start()
+        self.assertIs(self.pool._executor, executor)
+        self.assertTrue(self.pool.started)
+
+    def test_workers_are_reused(self):
+        """Jobs should be executed by the same long-lived worker process"""
+
+        pids = {self.pool.submit(os.getpid).result() for _ in range(3)}
+        self.assertEqual(len(pids), 1)
+        self.assertNotIn(os.getpid(), pids)
+
+    def test_not_started_in_forked_process(self):
+        """Pool created by parent process shouldn't be reused after fork"""
+
+        self.pool.start()
+        with mock.patch("images.pool.os.getpid", return_value=-1):
+            self.assertFalse(self.pool.started)
+
+    def test_shutdown(self):
+        """Pool shouldn't be started after shutdown"""
+
+        self.pool.start()
+        self.pool.shutdown()
+        self.assertFalse(self.pool.started)
+
+    def test_broken_pool_replaced_once(self):
+        """Broken executor should be replaced only by the first thread that
+        notices it, other threads submit to the new executor"""
+
+        broken = self.pool.start()
+        broken.submit = mock.MagicMock(
+            side_effect=concurrent.futures.process.BrokenProcessPool
+        )
+
+        # job is submitted to new executor
+        pid = self.pool.submit(os.getpid).result()
+        self.assertNotEqual(pid, os.getpid())
+        executor = self.pool.start()
+        self.assertIsNot(executor, broken)
+
+        # executor replaced by other thread shouldn't be replaced again
+        self.assertIs(self.pool.restart(broken), executor)
+
+    @mock.patch("images.pool.resource")
+    def test_limit_memory(self, mocked_resource):
+        """Address space of worker should be limited (0 means no limit)"""
+
+        mocked_resource.getrlimit.return_value = (-1, -1)
+        limit_memory(0)
+        self.assertEqual(mocked_resource.setrlimit.call_count, 0)
+
+        limit_memory(2**30)
+        mocked_resource.setrlimit.assert_called_once_with(
+            mocked_resource.RLIMIT_AS, (2**30, -1)
+        )
+
+
+class TestResizePoolSignals(SimpleTestCase):
+    """Test celery signals that start resize pool"""
+
+    @mock.patch("images.signals.RESIZE_POOL")
+    def test_start_on_worker_init(self, mocked_pool):
+        """Pool should be started in worker process that executes tasks"""
+
+        signals.start_resize_pool(sender=mock.MagicMock(pool_cls="threads"))
+        self.assertEqual(mocked_pool.start.call_count, 1)
+
+        # prefork worker processes start pool on worker_process_init
+        signals.start_resize_pool(sender=mock.MagicMock(pool_cls="prefork"))
+        self.assertEqual(mocked_pool.start.call_count, 1)
+        signals.start_worker_process_resize_pool()
+        self.assertEqual(mocked_pool.start.call_count, 2)
@@ -0,0 +1,82 @@
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.http import Http404
+from django.conf import settings
+from core.models import Image, Thumbnail
+from images.rendering import ThumbnailRenderer
+from images.exceptions import RenderUnavailable
+from unittest import mock
+from pathlib import Path
+import tempfile
+import shutil
+
+TEST_IMAGE = Path(__file__).resolve().parent / "images/puffin.jpg"
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+@mock.patch("images.rendering.REDIS")
+class TestThumbnailRenderer(TestCase):
+    """Test ThumbnailRenderer"""
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(username="user", password="pass")
+        self.image = Image.objects.create(name="image", uploaded_by=user)
+        self.image.og_file.save("puffin.jpg", ContentFile(TEST_IMAGE.read_bytes()))
+
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    def test_render(self, mocked_redis):
+        """Thumbnail should be rendered and saved under lock"""
+
+        name = ThumbnailRenderer(self.image, None, 100).get_or_render(".jpg")
+
+        self.assertEqual(
+            name, f"thumbnails/{self.image.uuid}/thumbnail-autox100.jpg"
+        )
+        lock = mocked_redis.lock.return_value
+        self.assertEqual(lock.acquire.call_count, 1)
+        self.assertEqual(lock.release.call_count, 1)
+        thumbnail = Thumbnail.objects.get(image=self.image)
+        self.assertEqual((thumbnail.file.name, thumbnail.height), (name, 100))
+        self.assertEqual(thumbnail.file.height, 100)
+
+    def test_existing_thumbnail(self, mocked_redis):
+        """Existing thumbnail shouldn't be rendered again"""
+
+        renderer = ThumbnailRenderer(self.image, None, 100)
+        name = renderer.get_or_render(".jpg")
+        with mock.patch.object(renderer, "render") as mocked_render:
+            self.assertEqual(renderer.get_or_render(".jpg"), name)
+            self.assertEqual(mocked_render.call_count, 0)
+
+        self.assertEqual(mocked_redis.lock.call_count, 1)
+
+    def test_rendered_while_waiting_for_lock(self, mocked_redis):
+        """Thumbnail rendered by other request shouldn't be rendered again"""
+
+        renderer = ThumbnailRenderer(self.image, None, 100)
+        with mock.patch.object(
+            renderer.storage, "exists", side_effect=[False, True]
+        ), mock.patch.object(renderer, "render") as mocked_render:
+            renderer.get_or_render(".jpg")
+
+        self.assertEqual(mocked_render.call_count, 0)
+
+    def test_lock_not_acquired(self, mocked_redis):
+        mocked_redis.lock.return_value.acquire.return_value = False
+        with self.assertRaises(RenderUnavailable):
+            ThumbnailRenderer(self.image, None, 100).get_or_render(".jpg")
+
+    def test_without_original(self, mocked_redis):
+        """Thumbnail can't be rendered without original image"""
+
+        self.image.og_file = None
+        for extension in [".jpg", ".png"]:
+            with self.subTest(extension=extension), self.assertRaises(Http404):
+                ThumbnailRenderer(self.image, None, 100).get_or_render(extension)
+
+    def test_different_format(self, mocked_redis):
+        with self.assertRaises(Http404):
+            ThumbnailRenderer(self.image, None, 100).get_or_render(".png")
@@ -1,8 +1,10 @@
 from django.test import SimpleTestCase
-from images.resizer import ImageResizer
+from images.resizer import ImageResizer, ImageTooLarge, get_supported_variants
+from core.profiles import get_save_options
+from images.sources import open_source
 from unittest import mock
 from pathlib import Path
-from PIL import Image as PILImage
+from PIL import Image as PILImage, ImageChops, ImageStat, JpegImagePlugin
 import io
 import os
 
@@ -19,13 +21,6 @@ class TestImageResizer(SimpleTestCase):
         TEST_DIR = Path(__file__).resolve().parent
         return os.path.join(TEST_DIR, f"images/{filename}")
 
-    def read_image_from_file(self, path: str) -> bytes:
-        """Helper function used to read image from file. It
-        will be used to mock geting image bytes from redis"""
-
-        with open(path, "rb") as f:
-            return f.read()
-
     def get_thumbnails_data(self, extension: str) -> tuple[list, dict]:
         """Returns list of thumbnails data and expected sizes of scaled images"""
 
@@ -45,42 +40,248 @@ class TestImageResizer(SimpleTestCase):
 
         return thumbnails_data, expected_sizes
 
-    def check_resize(self, extension: str):
+    def check_resize(self, filename: str):
         """Helper function used to check if files was resized correctly
         for given format"""
 
         thumbnails_data, expected_sizes = self.get_thumbnails_data(extension=".jpg")
-        resizer = self.resizer(image_uuid="uuid", thumbnails_data=thumbnails_data)
+        resizer = self.resizer(
+            source_path=self.get_file_path(filename), thumbnails_data=thumbnails_data
+        )
 
-        for file, new_size, img_bytes in resizer.resize():
+        for file, new_size, img_bytes, _ in resizer.resize():
             scaled_image = PILImage.open(io.BytesIO(img_bytes))
             self.assertEqual(scaled_image.size[0], new_size["width"])
             self.assertEqual(scaled_image.size[1], new_size["height"])
             self.assertEqual(scaled_image.size, expected_sizes[file])
 
-    @mock.patch("images.resizer.REDIS")
-    def test_resize_method_with_jpg(self, mocked_redis):
+    def test_resize_method_with_jpg(self):
         """Test resize_image method with jpg file"""
 
-        mocked_redis.get.return_value = self.read_image_from_file(
-            path=self.get_file_path("puffin.jpg")
-        )
-        self.check_resize(extension=".jpg")
+        self.check_resize(filename="puffin.jpg")
 
-    @mock.patch("images.resizer.REDIS")
-    def test_resize_method_with_jpeg(self, mocked_redis):
+    def test_resize_method_with_jpeg(self):
         """Test resize_image method with jpeg file"""
 
-        mocked_redis.get.return_value = self.read_image_from_file(
-            path=self.get_file_path("puffin.jpeg")
-        )
-        self.check_resize(extension=".jpeg")
+        self.check_resize(filename="puffin.jpeg")
 
-    @mock.patch("images.resizer.REDIS")
-    def test_resize_method_with_png(self, mocked_redis):
+    def test_resize_method_with_png(self):
         """Test resize_image method with png file"""
 
-        mocked_redis.get.return_value = self.read_image_from_file(
-            path=self.get_file_path("puffin.png")
+        self.check_resize(filename="puffin.png")
+
+    def test_variants(self):
+        """Variants should be encoded in their formats and kept
+        only if they are smaller than previously kept ones"""
+
+        thumbnails_data, _ = self.get_thumbnails_data(extension=".png")
+        resizer = self.resizer(
+            source_path=self.get_file_path("puffin.png"),
+            thumbnails_data=thumbnails_data,
+            variants=get_supported_variants([".webp", ".avif"]),
+        )
+
+        for file, _, img_bytes, variants in resizer.resize():
+            self.assertIn(".webp", variants)
+            size = len(img_bytes)
+            for extension, variant in variants.items():
+                image = PILImage.open(io.BytesIO(variant))
+                self.assertEqual(image.format, extension[1:].upper())
+                self.assertLess(len(variant), size)
+                size = len(variant)
+
+    def test_variant_bigger_than_original_not_kept(self):
+        """Variant shouldn't be kept if it is bigger than original format"""
+
+        thumbnails_data, _ = self.get_thumbnails_data(extension=".jpg")
+        resizer = self.resizer(
+            source_path=self.get_file_path("puffin.jpg"),
+            thumbnails_data=thumbnails_data,
+            variants=(".webp",),
+        )
+        image = PILImage.new("RGB", (10, 10))
+        self.assertEqual(resizer.encode_variants(image, "file.jpg", size=1), {})
+
+    def test_too_many_pixels(self):
+        """Image with more pixels than 'max_pixels' shouldn't be decoded"""
+
+        thumbnails_data, _ = self.get_thumbnails_data(extension=".png")
+        resizer = self.resizer(
+            source_path=self.get_file_path("puffin.png"),
+            thumbnails_data=thumbnails_data,
+            max_pixels=800 * 800 - 1,
+        )
+        with mock.patch.object(PILImage.Image, "load") as mocked_load:
+            with self.assertRaises(ImageTooLarge):
+                list(resizer.resize())
+
+        self.assertEqual(mocked_load.call_count, 0)
+
+        resizer.max_pixels = 800 * 800
+        self.assertEqual(len(list(resizer.resize())), 4)
+
+    def test_variant_encoding_error(self):
+        """Variant which can't be encoded should be skipped"""
+
+        resizer = self.resizer(
+            source_path=self.get_file_path("puffin.jpg"),
+            thumbnails_data=[],
+            variants=(".webp", ".avif"),
+        )
+        encode_image = resizer.encode_image
+
+        def encode(image, file, profile):
+            if file.endswith(".avif"):
+                raise RuntimeError("Failed to encode image")
+            return encode_image(image, file, profile)
+
+        image = PILImage.open(self.get_file_path("puffin.jpg"))
+        with mock.patch.object(resizer, "encode_image", side_effect=encode):
+            variants = resizer.encode_variants(image, "file.jpg", size=10**9)
+
+        self.assertEqual(list(variants), [".webp"])
+
+    def test_get_supported_variants(self):
+        with mock.patch("images.resizer.features.check", return_value=False):
+            self.assertEqual(get_supported_variants([".webp", ".avif"]), ())
+
+        self.assertEqual(get_supported_variants([".gif", ".webp"]), (".webp",))
+
+    def test_encoder_profiles(self):
+        """Thumbnails should be saved with options of their encoder profiles"""
+
+        thumbnails_data = [
+            {"file": "fast.jpg", "height": 200, "width": None, "profile": "fast"},
+            {"file": "balanced.jpg", "height": 200, "width": None},
+            {
+                "file": "smallest.png",
+                "height": 200,
+                "width": None,
+                "profile": "smallest",
+            },
+        ]
+        resizer = self.resizer(
+            source_path=self.get_file_path("puffin.jpg"),
+            thumbnails_data=thumbnails_data,
+        )
+        with mock.patch(
+            "images.resizer.get_save_options", wraps=get_save_options
+        ) as mocked_get_save_options:
+            thumbnails = {file: img_bytes for file, _, img_bytes, _ in resizer.resize()}
+
+        self.assertEqual(
+            sorted(c.args for c in mocked_get_save_options.call_args_list),
+            [("balanced", "JPEG"), ("fast", "JPEG"), ("smallest", "PNG")],
         )
-        self.check_resize(extension=".png")
+        # balanced profile saves progressive JPEG
+        balanced = PILImage.open(io.BytesIO(thumbnails["balanced.jpg"]))
+        fast = PILImage.open(io.BytesIO(thumbnails["fast.jpg"]))
+        self.assertTrue(balanced.info.get("progressive"))
+        self.assertFalse(fast.info.get("progressive"))
+
+    def test_get_save_options(self):
+        """Default profile should be used for unknown profile"""
+
+        self.assertEqual(
+            get_save_options("unknown", "PNG"), get_save_options("balanced", "PNG")
+        )
+        self.assertEqual(get_save_options("fast", "PNG"), {"compress_level": 1})
+
+    def test_source_opened_once(self):
+        """Source image should be mapped only once for all thumbnails"""
+
+        thumbnails_data, _ = self.get_thumbnails_data(extension=".jpg")
+        resizer = self.resizer(
+            source_path=self.get_file_path("puffin.jpg"),
+            thumbnails_data=thumbnails_data,
+        )
+        with mock.patch(
+            "images.resizer.open_source", wraps=open_source
+        ) as mocked_open_source:
+            list(resizer.resize())
+        mocked_open_source.assert_called_once_with(self.get_file_path("puffin.jpg"))
+
+    def test_thumbnails_created_from_largest_to_smallest(self):
+        """Thumbnails should be yielded from the largest to the smallest one"""
+
+        thumbnails_data, _ = self.get_thumbnails_data(extension=".jpg")
+        resizer = self.resizer(
+            source_path=self.get_file_path("puffin.jpg"),
+            thumbnails_data=thumbnails_data,
+        )
+        files = [file for file, *_ in resizer.resize()]
+        self.assertEqual(files, ["file4.jpg", "file3.jpg", "file2.jpg", "file1.jpg"])
+
+
+class TestImageResizerJpegDraft(SimpleTestCase):
+    """Test if jpeg images are decoded in draft mode (DCT scaling)"""
+
+    def setUp(self):
+        self.source_path = Path(__file__).resolve().parent / "images/puffin.jpg"
+        self.thumbnails_data = [{"file": "file.jpg", "height": 200, "width": None}]
+
+    def resize(self, draft: bool = True) -> bytes:
+        """Return bytes of resized image, optionally with draft mode disabled"""
+
+        resizer = ImageResizer(
+            source_path=self.source_path, thumbnails_data=self.thumbnails_data
+        )
+        if draft:
+            return next(resizer.resize())[2]
+
+        with mock.patch.object(ImageResizer, "draft_image"):
+            return next(resizer.resize())[2]
+
+    def test_draft_requested_with_largest_size(self):
+        """Decoder should be asked for scale big enough for every thumbnail"""
+
+        self.thumbnails_data.append({"file": "f.jpg", "height": 100, "width": 300})
+        with mock.patch.object(
+            JpegImagePlugin.JpegImageFile, "draft", autospec=True
+        ) as mocked_draft:
+            self.resize()
+
+        mocked_draft.assert_called_once_with(mock.ANY, "RGB", (300, 200))
+
+    def test_draft_not_used_for_png(self):
+        """Draft mode is only available for jpeg images"""
+
+        image = PILImage.open(Path(__file__).resolve().parent / "images/puffin.png")
+        with mock.patch.object(image, "draft") as mocked_draft:
+            ImageResizer("uuid", []).draft_image(image, [(200, 200)])
+
+        self.assertEqual(mocked_draft.call_count, 0)
+
+    def test_draft_quality(self):
+        """Thumbnail created from draft should look the same as the one
+        created from fully decoded image"""
+
+        drafted = PILImage.open(io.BytesIO(self.resize()))
+        full = PILImage.open(io.BytesIO(self.resize(draft=False)))
+
+        self.assertEqual(drafted.size, full.size)
+        diff = ImageStat.Stat(ImageChops.difference(drafted, full))
+        # mean difference of every channel should be lower than ~1%
+        for mean in diff.mean:
+            self.assertLess(mean, 2.5)
+
+    def test_draft_decoded_size(self):
+        """Image should be decoded at reduced scale"""
+
+        image = PILImage.open(self.source_path)
+        ImageResizer("uuid", []).draft_image(image, [(200, 200), (100, 300)])
+        image.load()
+        self.assertEqual(image.size, (400, 400))
+
+    def test_draft_used_for_mpo(self):
+        """Multi-picture JPEG (MPO) should be decoded in draft mode as well"""
+
+        output = io.BytesIO()
+        frame = PILImage.open(self.source_path)
+        frame.save(output, "MPO", save_all=True, append_images=[frame])
+        image = PILImage.open(output, formats=("JPEG", "PNG"))
+        self.assertEqual(image.format, "MPO")
+
+        ImageResizer("uuid", []).draft_image(image, [(200, 200)])
+        image.load()
+        self.assertEqual(image.size, (200, 200))
@@ -1,11 +1,24 @@
 from django.test import SimpleTestCase, TestCase
 from rest_framework.exceptions import ValidationError, NotFound
-from images.serializers.image import ExpiringImageSerializer, ImageCreateSerializer
+from images.serializers.image import (
+    ExpiringImageSerializer,
+    ImageCreateSerializer,
+    HeaderImageField,
+)
+from images.exceptions import StagingUnavailable
+from src.blobstore import BlobStoreFull
 from django.core.management import call_command
 from core.models import Tier, Image
+from core.tiers import TierSnapshot
 from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
 from unittest import mock
+from pathlib import Path
+from PIL import Image as PILImage
+import hashlib
 import base64
+import io
 
 
 class TestExpiringImageSerializer(SimpleTestCase):
@@ -91,6 +104,12 @@ class TestImageCreateSerializer(TestCase):
             "Premium": [[None, 200], [None, 400]],
             "Enterprise": [[None, 200], [None, 400]],
         }
+        # by default upload isn't identical to any previous one
+        patcher = mock.patch("images.serializers.image.UPLOAD_DEDUP")
+        self.mocked_dedup = patcher.start()
+        self.mocked_dedup.find_thumbnails.return_value = None
+        self.mocked_dedup.join.return_value = True
+        self.addCleanup(patcher.stop)
 
     @mock.patch("images.serializers.image.models.Thumbnail.generate_absolute_url")
     def test_get_thumbnails(self, mocked_abs_url_generator):
@@ -113,27 +132,65 @@ class TestImageCreateSerializer(TestCase):
             list(thumbnails), [{"height": 200, "width": 200, "file": "abs_url"}]
         )
 
+    def get_upload(self, filename: str) -> SimpleUploadedFile:
+        path = Path(__file__).resolve().parent / "images" / filename
+        return SimpleUploadedFile(filename, path.read_bytes())
+
+    def test_validate_file_max_pixels(self):
+        """Image with more pixels than tier budget (800x800) should be rejected"""
+
+        tier = Tier.objects.get(name="Premium")
+        request = mock.MagicMock()
+        request.user.tier_id = tier.id
+        for max_pixels, valid in [(800 * 800 - 1, False), (800 * 800, True)]:
+            tier.max_pixels = max_pixels
+            with mock.patch(
+                "images.serializers.image.TIER_CACHE.get",
+                return_value=TierSnapshot.from_tier(tier),
+            ):
+                serializer = self.serializer_class(
+                    data={"name": "puffin", "file": self.get_upload("puffin.png")},
+                    context={"request": request},
+                )
+                self.assertEqual(serializer.is_valid(), valid)
+                if not valid:
+                    self.assertIn("file", serializer.errors)
+
+    def test_validate_file_without_tier(self):
+        """IMAGE_MAX_PIXELS should be used if user doesn't have any tier"""
+
+        request = mock.MagicMock()
+        request.user.tier_id = None
+        with self.settings(IMAGE_MAX_PIXELS=1000):
+            serializer = self.serializer_class(
+                data={"name": "puffin", "file": self.get_upload("puffin.jpg")},
+                context={"request": request},
+            )
+            self.assertFalse(serializer.is_valid())
+
     def test_get_thumbnails_data(self):
         """Should return list of thumbnails data for specified user"""
         serializer = self.serializer_class()
         for tier in Tier.objects.all():
-            user = mock.MagicMock(tier=tier)
+            user = mock.MagicMock(tier_id=tier.id)
             for thumbnail in serializer.get_thumbnails_data(
                 user=user, extension=".jpeg"
             ):
                 size = [thumbnail["width"], thumbnail["height"]]
                 self.assertIn(size, self.tier_thumbnails_data[tier.name])
 
-    @mock.patch("images.serializers.image.REDIS")
+    @mock.patch("images.serializers.image.BLOB_STORE")
     @mock.patch("images.serializers.image.thumbnails_creator")
     @mock.patch("images.serializers.image.serializers.ModelSerializer.create")
-    def test_create(self, mocked_super_create, mocked_thumbnails_creator, mocked_redis):
+    def test_create(
+        self, mocked_super_create, mocked_thumbnails_creator, mocked_blob_store
+    ):
         """Should create Image object, cache image in redis, and delay
         thumbnails_creator celery task"""
 
-        mocked_instance = mock.MagicMock(spec=Image)
+        mocked_instance = mock.MagicMock(spec=Image, og_file=None)
         mocked_super_create.return_value = mocked_instance
-        user = mock.MagicMock(tier=Tier.objects.get(name="Basic"))
+        user = mock.MagicMock(tier_id=Tier.objects.get(name="Basic").id)
         serializer = self.serializer_class(
             context={"request": mock.MagicMock(user=user)}
         )
@@ -142,8 +199,237 @@ class TestImageCreateSerializer(TestCase):
             validated_data={"og_file": mock.MagicMock(name="somefile.jpg")}
         )
         # check if redis and celery called
-        self.assertEqual(mocked_redis.set.call_count, 1)
+        self.assertEqual(mocked_blob_store.write.call_count, 1)
         self.assertEqual(mocked_thumbnails_creator.delay.call_count, 1)
         # check instance and validated data
         self.assertEqual(instance, mocked_instance)
         self.assertNotEqual(serializer._validated_data.get("thumbnails"), None)
+
+    @mock.patch("images.serializers.image.BLOB_STORE")
+    @mock.patch("images.serializers.image.thumbnails_creator")
+    @mock.patch("images.serializers.image.serializers.ModelSerializer.create")
+    def test_create_with_persisted_original(
+        self, mocked_super_create, mocked_thumbnails_creator, mocked_blob_store
+    ):
+        """If original image is persisted it shouldn't be cached in redis,
+        celery task should read it from storage"""
+
+        mocked_instance = mock.MagicMock(spec=Image)
+        mocked_instance.og_file.name = "original_images/somefile.jpg"
+        mocked_super_create.return_value = mocked_instance
+        user = mock.MagicMock(tier_id=Tier.objects.get(name="Enterprise").id)
+        serializer = self.serializer_class(
+            context={"request": mock.MagicMock(user=user)}
+        )
+        serializer._validated_data = {}
+        serializer.create(validated_data={"og_file": mock.MagicMock(name="file.jpg")})
+
+        self.assertEqual(mocked_blob_store.write.call_count, 0)
+        self.assertEqual(
+            mocked_thumbnails_creator.delay.call_args.kwargs["source"],
+            {"path": "original_images/somefile.jpg"},
+        )
+
+    def create_image(self, tier_name: str = "Basic") -> Image:
+        """Create image of file with 'image' content"""
+
+        user = get_user_model().objects.create_user(
+            username="user", password="pass", tier=Tier.objects.get(name=tier_name)
+        )
+        serializer = self.serializer_class(
+            context={"request": mock.MagicMock(user=user)}
+        )
+        serializer._validated_data = {}
+        return serializer.create(
+            validated_data={
+                "name": "image",
+                "uploaded_by": user,
+                "og_file": SimpleUploadedFile("file.jpg", b"image"),
+            }
+        )
+
+    @mock.patch("images.serializers.image.BLOB_STORE")
+    @mock.patch("images.serializers.image.thumbnails_creator")
+    def test_create_metadata(self, mocked_thumbnails_creator, mocked_blob_store):
+        """Metadata read from image header should be saved"""
+
+        user = get_user_model().objects.create_user(
+            username="user", password="pass", tier=Tier.objects.get(name="Basic")
+        )
+        serializer = self.serializer_class(
+            data={"name": "puffin", "file": self.get_upload("puffin.jpg")},
+            context={"request": mock.MagicMock(user=user)},
+        )
+        self.assertTrue(serializer.is_valid())
+        image = serializer.save(uploaded_by=user)
+
+        image.refresh_from_db()
+        self.assertEqual(
+            (image.width, image.height, image.format, image.bytes),
+            (800, 800, "JPEG", len(self.get_upload("puffin.jpg").read())),
+        )
+
+    @mock.patch("images.serializers.image.BLOB_STORE")
+    @mock.patch("images.serializers.image.thumbnails_creator")
+    def test_create_content_hash(self, mocked_thumbnails_creator, mocked_blob_store):
+        """Content hash should be saved and passed to celery task"""
+
+        image = self.create_image()
+        content_hash = hashlib.sha256(b"image").hexdigest()
+
+        self.assertEqual(image.content_hash, content_hash)
+        self.mocked_dedup.join.assert_called_once_with(
+            content_hash, mock.ANY, str(image.uuid)
+        )
+        self.assertEqual(
+            mocked_thumbnails_creator.delay.call_args.kwargs["content_hash"],
+            content_hash,
+        )
+        self.mocked_dedup.record.assert_called_once_with("rendered")
+
+    @mock.patch("images.serializers.image.link_thumbnails")
+    @mock.patch("images.serializers.image.BLOB_STORE")
+    @mock.patch("images.serializers.image.thumbnails_creator")
+    def test_create_identical_upload(
+        self, mocked_thumbnails_creator, mocked_blob_store, mocked_link_thumbnails
+    ):
+        """Thumbnails of previous identical upload should be reused
+        without staging image and running celery task"""
+
+        sources = [mock.MagicMock()]
+        self.mocked_dedup.find_thumbnails.return_value = sources
+        mocked_link_thumbnails.return_value = []
+
+        image = self.create_image()
+
+        mocked_link_thumbnails.assert_called_once_with(str(image.uuid), sources)
+        self.assertEqual(mocked_blob_store.write.call_count, 0)
+        self.assertEqual(mocked_thumbnails_creator.delay.call_count, 0)
+        self.assertEqual(self.mocked_dedup.join.call_count, 0)
+        self.mocked_dedup.record.assert_called_once_with("reused")
+
+    @mock.patch("images.serializers.image.link_thumbnails")
+    @mock.patch("images.serializers.image.BLOB_STORE")
+    @mock.patch("images.serializers.image.thumbnails_creator")
+    def test_create_identical_upload_without_files(
+        self, mocked_thumbnails_creator, mocked_blob_store, mocked_link_thumbnails
+    ):
+        """If thumbnails of identical upload can't be linked image should be
+        staged and thumbnails should be created by celery task"""
+
+        self.mocked_dedup.find_thumbnails.return_value = [mock.MagicMock()]
+        mocked_link_thumbnails.side_effect = FileNotFoundError
+
+        image = self.create_image()
+
+        self.assertFalse(image.thumbnails.exists())
+        mocked_blob_store.write.assert_called_once()
+        self.assertEqual(mocked_thumbnails_creator.delay.call_count, 1)
+        self.mocked_dedup.record.assert_called_once_with("rendered")
+
+    @mock.patch("images.serializers.image.link_thumbnails")
+    @mock.patch("images.serializers.image.BLOB_STORE")
+    @mock.patch("images.serializers.image.thumbnails_creator")
+    def test_create_identical_upload_without_files_full_staging_budget(
+        self, mocked_thumbnails_creator, mocked_blob_store, mocked_link_thumbnails
+    ):
+        """Image shouldn't be created if it can't be staged after linking failed"""
+
+        self.mocked_dedup.find_thumbnails.return_value = [mock.MagicMock()]
+        mocked_link_thumbnails.side_effect = FileNotFoundError
+        mocked_blob_store.write.side_effect = BlobStoreFull
+
+        with self.assertRaises(StagingUnavailable):
+            self.create_image()
+
+        self.assertFalse(Image.objects.exists())
+        self.assertEqual(mocked_thumbnails_creator.delay.call_count, 0)
+
+    @mock.patch("images.serializers.image.BLOB_STORE")
+    @mock.patch("images.serializers.image.thumbnails_creator")
+    def test_create_concurrent_identical_upload(
+        self, mocked_thumbnails_creator, mocked_blob_store
+    ):
+        """If identical upload is being processed celery task shouldn't
+        be run and staged image should be deleted"""
+
+        self.mocked_dedup.join.return_value = False
+        image = self.create_image()
+
+        self.assertTrue(Image.objects.filter(uuid=image.uuid).exists())
+        mocked_blob_store.delete.assert_called_once_with(str(image.uuid))
+        self.assertEqual(mocked_thumbnails_creator.delay.call_count, 0)
+        self.mocked_dedup.record.assert_called_once_with("coalesced")
+
+    @mock.patch("images.serializers.image.BLOB_STORE")
+    @mock.patch("images.serializers.image.thumbnails_creator")
+    def test_create_with_full_staging_budget(
+        self, mocked_thumbnails_creator, mocked_blob_store
+    ):
+        """If image can't be staged StagingUnavailable should be raised,
+        image shouldn't be created and task shouldn't be delayed"""
+
+        user = get_user_model().objects.create_user(
+            username="user", password="pass", tier=Tier.objects.get(name="Basic")
+        )
+        mocked_blob_store.write.side_effect = BlobStoreFull
+        serializer = self.serializer_class(
+            context={"request": mock.MagicMock(user=user)}
+        )
+        serializer._validated_data = {}
+        with self.assertRaises(StagingUnavailable):
+            serializer.create(
+                validated_data={
+                    "name": "image",
+                    "uploaded_by": user,
+                    "og_file": mock.MagicMock(name="file.jpg"),
+                }
+            )
+
+        self.assertFalse(Image.objects.exists())
+        self.assertEqual(mocked_thumbnails_creator.delay.call_count, 0)
+
+
+class TestHeaderImageField(SimpleTestCase):
+    """Test HeaderImageField"""
+
+    def setUp(self):
+        self.field = HeaderImageField()
+        self.images_dir = Path(__file__).resolve().parent / "images"
+
+    def test_to_internal_value(self):
+        """Image format and size should be read without decoding image"""
+
+        for filename, content_type in [
+            ("puffin.png", "image/png"),
+            ("puffin.jpg", "image/jpeg"),
+        ]:
+            content = (self.images_dir / filename).read_bytes()
+            file = SimpleUploadedFile(filename, content)
+            with mock.patch.object(PILImage.Image, "verify") as mocked_verify:
+                value = self.field.to_internal_value(file)
+
+            self.assertEqual(mocked_verify.call_count, 0)
+            self.assertEqual(value.image.size, (800, 800))
+            self.assertEqual(value.content_type, content_type)
+            # file is read from the beginning later
+            self.assertEqual(value.tell(), 0)
+            self.assertEqual(value.read(), content)
+
+    def test_only_header_is_read(self):
+        """Image with valid header is accepted, data is decoded by celery task"""
+
+        content = (self.images_dir / "puffin.png").read_bytes()
+        # image data (IDAT chunks) is cut off
+        content = content[: content.index(b"IDAT") + 4]
+        value = self.field.to_internal_value(SimpleUploadedFile("puffin.png", content))
+        self.assertEqual(value.image.size, (800, 800))
+
+    def test_invalid_image(self):
+        """Files which aren't JPEG or PNG images should be rejected"""
+
+        gif = io.BytesIO()
+        PILImage.new("RGB", (10, 10)).save(gif, "GIF")
+        for content in [b"image", gif.getvalue()]:
+            with self.assertRaises(ValidationError):
+                self.field.to_internal_value(SimpleUploadedFile("file.png", content))
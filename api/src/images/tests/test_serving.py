@@ -0,0 +1,355 @@
+from django.test import (
+    SimpleTestCase,
+    RequestFactory,
+    AsyncRequestFactory,
+    override_settings,
+)
+from django.conf import settings
+from django.http import Http404
+from django.urls import reverse
+from unittest import mock
+from images.serving import (
+    serve_file,
+    aserve_file,
+    parse_range,
+    get_accepted_types,
+    serve_variant,
+    aserve_variant,
+)
+from images.views import AsyncExpiringImageView, AsyncThumbnailView
+from images.tokens import expiring_image_token_generator
+from core.filecache import FileCache, THUMBNAIL_CACHE
+import tempfile
+import shutil
+import os
+
+
+class TestParseRange(SimpleTestCase):
+    """Test parse_range"""
+
+    def test_parse_range(self):
+        for header, expected in [
+            (None, None),
+            ("bytes=0-3", (0, 3)),
+            ("bytes=2-", (2, 9)),
+            ("bytes=5-100", (5, 9)),
+            ("bytes=-4", (6, 9)),
+            ("bytes=-100", (0, 9)),
+            ("bytes=10-", False),
+            ("bytes=-0", False),
+            ("bytes=4-2", None),
+            ("bytes=0-1,4-5", None),
+            ("items=0-1", None),
+            ("bytes=-", None),
+        ]:
+            with self.subTest(header=header):
+                self.assertEqual(parse_range(header, 10), expected)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), SENDFILE_BACKEND=None)
+class TestServeFile(SimpleTestCase):
+    """Test serve_file"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.content = b"0123456789"
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, "thumbnails"), exist_ok=True)
+        self.path = "thumbnails/image.png"
+        with open(os.path.join(settings.MEDIA_ROOT, self.path), "wb") as f:
+            f.write(self.content)
+
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    def serve(self, **headers):
+        return serve_file(self.factory.get("/", headers=headers), self.path)
+
+    def test_serve(self):
+        """Whole file should be served with validators"""
+
+        r = self.serve()
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(b"".join(r.streaming_content), self.content)
+        self.assertEqual(r["Content-Type"], "image/png")
+        self.assertEqual(r["Accept-Ranges"], "bytes")
+        self.assertTrue(r["ETag"].startswith('"'))
+        self.assertIn("Last-Modified", r)
+
+    def test_not_existing_file(self):
+        """Should raise Http404 for missing files and paths outside of root"""
+
+        for path in ["thumbnails/missing.png", "thumbnails", "../etc/passwd"]:
+            with self.subTest(path=path), self.assertRaises(Http404):
+                serve_file(self.factory.get("/"), path)
+
+    def test_conditional_request(self):
+        """Should return 304 if client has up to date copy"""
+
+        r = self.serve()
+        for headers in [
+            {"If-None-Match": r["ETag"]},
+            {"If-Modified-Since": r["Last-Modified"]},
+        ]:
+            with self.subTest(headers=headers):
+                not_modified = self.serve(**headers)
+                self.assertEqual(not_modified.status_code, 304)
+                self.assertEqual(not_modified["ETag"], r["ETag"])
+
+        self.assertEqual(self.serve(**{"If-None-Match": '"other"'}).status_code, 200)
+
+    def test_range_request(self):
+        """Should return requested part of the file"""
+
+        r = self.serve(Range="bytes=2-5")
+        self.assertEqual(r.status_code, 206)
+        self.assertEqual(b"".join(r.streaming_content), b"2345")
+        self.assertEqual(r["Content-Range"], "bytes 2-5/10")
+        self.assertEqual(r["Content-Length"], "4")
+
+    def test_unsatisfiable_range(self):
+        """Should return 416"""
+
+        r = self.serve(Range="bytes=20-")
+        self.assertEqual(r.status_code, 416)
+        self.assertEqual(r["Content-Range"], "bytes */10")
+
+    def test_if_range(self):
+        """Range should be ignored if file changed"""
+
+        etag = self.serve()["ETag"]
+        r = self.serve(Range="bytes=2-5", **{"If-Range": etag})
+        self.assertEqual(r.status_code, 206)
+        r = self.serve(Range="bytes=2-5", **{"If-Range": '"old"'})
+        self.assertEqual(r.status_code, 200)
+
+    @override_settings(SENDFILE_BACKEND="x-accel-redirect")
+    def test_x_accel_redirect(self):
+        """Transfer should be handed over to nginx"""
+
+        r = self.serve()
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.content, b"")
+        self.assertEqual(
+            r["X-Accel-Redirect"], settings.SENDFILE_URL_PREFIX + self.path
+        )
+        self.assertEqual(r["Content-Type"], "image/png")
+
+    @override_settings(SENDFILE_BACKEND="x-sendfile")
+    def test_x_sendfile(self):
+        """Transfer should be handed over to front-end server"""
+
+        r = self.serve()
+        self.assertEqual(r.content, b"")
+        self.assertEqual(
+            r["X-Sendfile"], os.path.join(settings.MEDIA_ROOT, self.path)
+        )
+
+    def test_serve_from_cache(self):
+        """File should be read once and then served from the cache"""
+
+        cache = FileCache(max_bytes=100, max_item_bytes=100, revalidate_after=60)
+        request = self.factory.get("/")
+        r = serve_file(request, self.path, cache=cache)
+        self.assertEqual(r.content, self.content)
+
+        with mock.patch("builtins.open") as mocked_open:
+            r = serve_file(request, self.path, cache=cache)
+            self.assertEqual(mocked_open.call_count, 0)
+
+        self.assertEqual(r.content, self.content)
+        self.assertEqual(r["Content-Type"], "image/png")
+        self.assertEqual(cache.gauges()["hits"], 1)
+
+        request = self.factory.get("/", headers={"Range": "bytes=-3"})
+        r = serve_file(request, self.path, cache=cache)
+        self.assertEqual(r.status_code, 206)
+        self.assertEqual(r.content, b"789")
+        self.assertEqual(r["Content-Range"], "bytes 7-9/10")
+
+        request = self.factory.get("/", headers={"If-None-Match": r["ETag"]})
+        r = serve_file(request, self.path, cache=cache)
+        self.assertEqual(r.status_code, 304)
+
+    def test_serve_too_big_file_with_cache(self):
+        """Files bigger than max_item_bytes should be served from disk"""
+
+        cache = FileCache(max_bytes=100, max_item_bytes=5, revalidate_after=60)
+        r = serve_file(self.factory.get("/"), self.path, cache=cache)
+        self.assertEqual(b"".join(r.streaming_content), self.content)
+        self.assertEqual(cache.gauges()["files"], 0)
+
+    def test_thumbnail_view(self):
+        """Thumbnails should be served under media url"""
+
+        url = reverse("thumbnail", kwargs={"path": "image.png"})
+        self.assertEqual(url, f"{settings.MEDIA_URL}{self.path}")
+        r = self.client.get(url)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.getvalue(), self.content)
+
+    @override_settings(DEBUG=False)
+    def test_thumbnail_view_outside_thumbnails(self):
+        """Files outside thumbnails directory (e.g. originals) can't be served"""
+
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, "original_images"))
+        with open(os.path.join(settings.MEDIA_ROOT, "original_images/a.jpg"), "wb"):
+            pass
+
+        for url in [
+            f"{settings.MEDIA_URL}thumbnails/..%2foriginal_images/a.jpg",
+            f"{settings.MEDIA_URL}thumbnails/..%2F..%2F{self.path}",
+        ]:
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class TestGetAcceptedTypes(SimpleTestCase):
+    """Test get_accepted_types"""
+
+    def test_get_accepted_types(self):
+        factory = RequestFactory()
+        for header, expected in [
+            ("", set()),
+            ("*/*", {"*/*"}),
+            ("image/avif,image/webp,*/*;q=0.8", {"image/avif", "image/webp", "*/*"}),
+            ("image/webp;q=0, image/png", {"image/png"}),
+            ("IMAGE/WEBP;q=invalid", {"image/webp"}),
+        ]:
+            with self.subTest(header=header):
+                request = factory.get("/", headers={"Accept": header})
+                self.assertEqual(get_accepted_types(request), expected)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), SENDFILE_BACKEND=None)
+class TestServeVariant(SimpleTestCase):
+    """Test serving thumbnail variants based on Accept header"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, "thumbnails"), exist_ok=True)
+        self.path = "thumbnails/image.png"
+        for name, content in [(self.path, b"png"), (f"{self.path}.webp", b"webp")]:
+            with open(os.path.join(settings.MEDIA_ROOT, name), "wb") as f:
+                f.write(content)
+
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    def serve(self, accept: str):
+        request = self.factory.get("/", headers={"Accept": accept})
+        return serve_variant(request, self.path, variants=[".webp", ".avif"])
+
+    def test_serve_variant(self):
+        """The most preferred stored variant accepted by client should be
+        served, original format is served otherwise"""
+
+        for accept, content, content_type in [
+            ("image/avif,image/webp,*/*", b"webp", "image/webp"),
+            ("image/webp", b"webp", "image/webp"),
+            ("image/avif,*/*", b"png", "image/png"),
+            ("*/*", b"png", "image/png"),
+            ("", b"png", "image/png"),
+        ]:
+            with self.subTest(accept=accept):
+                r = self.serve(accept)
+                self.assertEqual(r.status_code, 200)
+                self.assertEqual(r.getvalue(), content)
+                self.assertEqual(r["Content-Type"], content_type)
+                self.assertEqual(r["Vary"], "Accept")
+
+    def test_serve_avif(self):
+        with open(os.path.join(settings.MEDIA_ROOT, f"{self.path}.avif"), "wb") as f:
+            f.write(b"avif")
+
+        r = self.serve("image/avif,image/webp")
+        self.assertEqual(r.getvalue(), b"avif")
+        self.assertEqual(r["Content-Type"], "image/avif")
+
+    def test_not_existing_thumbnail(self):
+        with self.assertRaises(Http404):
+            serve_variant(
+                self.factory.get("/", headers={"Accept": "image/webp"}),
+                "thumbnails/missing.png",
+                variants=[".webp"],
+            )
+
+    async def test_aserve_variant(self):
+        request = AsyncRequestFactory().get("/", headers={"Accept": "image/webp"})
+        r = await aserve_variant(request, self.path, variants=[".webp"])
+        self.assertEqual(
+            b"".join([chunk async for chunk in r.streaming_content]), b"webp"
+        )
+        self.assertEqual(r["Vary"], "Accept")
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), SENDFILE_BACKEND=None)
+class TestAsyncServing(SimpleTestCase):
+    """Test aserve_file and async serving views"""
+
+    def setUp(self):
+        self.factory = AsyncRequestFactory()
+        self.content = b"0123456789"
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, "thumbnails"), exist_ok=True)
+        self.path = "thumbnails/image.png"
+        with open(os.path.join(settings.MEDIA_ROOT, self.path), "wb") as f:
+            f.write(self.content)
+
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    async def read(self, response) -> bytes:
+        return b"".join([chunk async for chunk in response.streaming_content])
+
+    @override_settings(ASYNC_SERVING_CHUNK_SIZE=3)
+    async def test_aserve_file(self):
+        """File should be streamed in chunks"""
+
+        r = await aserve_file(self.factory.get("/"), self.path)
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r.is_async)
+        self.assertEqual(r["Content-Length"], "10")
+        self.assertEqual(await self.read(r), self.content)
+
+    async def test_aserve_file_range(self):
+        r = await aserve_file(
+            self.factory.get("/", headers={"Range": "bytes=2-5"}), self.path
+        )
+        self.assertEqual(r.status_code, 206)
+        self.assertEqual(r["Content-Range"], "bytes 2-5/10")
+        self.assertEqual(await self.read(r), b"2345")
+
+    async def test_aserve_not_existing_file(self):
+        with self.assertRaises(Http404):
+            await aserve_file(self.factory.get("/"), "thumbnails/missing.png")
+
+    async def test_async_expiring_image_view(self):
+        """File should be served only with valid token"""
+
+        view = AsyncExpiringImageView.as_view()
+        r = await view(self.factory.get("/"), token="invalid", path=self.path)
+        self.assertEqual(r.status_code, 403)
+
+        token = expiring_image_token_generator.make_token(self.path, 300)
+        r = await view(self.factory.get("/"), token=token, path=self.path)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(await self.read(r), self.content)
+
+    async def test_async_thumbnail_view(self):
+        """Thumbnail should be served from the cache"""
+
+        view = AsyncThumbnailView.as_view()
+        with mock.patch.object(THUMBNAIL_CACHE, "max_item_bytes", 100):
+            r = await view(self.factory.get("/"), path="image.png")
+
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.content, self.content)
+
+    async def test_async_thumbnail_view_outside_thumbnails(self):
+        """Files outside thumbnails directory can't be served"""
+
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, "original_images"))
+        with open(os.path.join(settings.MEDIA_ROOT, "original_images/a.jpg"), "wb"):
+            pass
+
+        view = AsyncThumbnailView.as_view()
+        with self.assertRaises(Http404):
+            await view(self.factory.get("/"), path="../original_images/a.jpg")
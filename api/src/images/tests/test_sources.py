@@ -0,0 +1,44 @@
+from django.test import SimpleTestCase, override_settings
+from images.sources import shared_source, open_source, get_source_dir
+from unittest import mock
+import tempfile
+import os
+
+
+class TestSharedSource(SimpleTestCase):
+    """Test handing off source image to resize pool workers"""
+
+    def test_shared_source(self):
+        """Chunks should be written to file that is removed on exit"""
+
+        with shared_source([b"some", b"image"]) as path:
+            with open_source(path) as source:
+                self.assertEqual(source.read(), b"someimage")
+                source.seek(4)
+                self.assertEqual(source.read(), b"image")
+
+        self.assertFalse(os.path.exists(path))
+
+    def test_shared_source_removed_on_error(self):
+        """File should be removed even if error occurs"""
+
+        with self.assertRaises(AssertionError):
+            with shared_source([b"image"]) as path:
+                raise AssertionError
+
+        self.assertFalse(os.path.exists(path))
+
+    @override_settings(THUMBNAILS_SOURCE_DIR=tempfile.gettempdir())
+    @mock.patch("images.sources.BLOB_STORE")
+    def test_get_source_dir(self, mocked_blob_store):
+        """Source dir should be used only if it can hold all staged images"""
+
+        stat = os.statvfs(tempfile.gettempdir())
+        mocked_blob_store.max_bytes = stat.f_blocks * stat.f_frsize
+        self.assertEqual(get_source_dir(), tempfile.gettempdir())
+
+        mocked_blob_store.max_bytes += 1
+        self.assertIsNone(get_source_dir())
+
+        with self.settings(THUMBNAILS_SOURCE_DIR="/does/not/exist"):
+            self.assertIsNone(get_source_dir())
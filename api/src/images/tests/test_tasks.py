@@ -1,7 +1,15 @@
-from django.test import SimpleTestCase
-from images.tasks.thumbnails_creator_task import ThumbnailsCreator
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.contrib.auth import get_user_model
+from core.models import Image, Thumbnail
+from images.tasks.thumbnails_creator_task import ThumbnailsCreator, resize_job
+from images.tasks.blobs_sweeper_task import BlobsSweeper
+from images.resizer import get_supported_variants
+from django.conf import settings
 from unittest import mock
+import tempfile
+import shutil
 import uuid
+import os
 
 
 class TestThumbnailsCreatorTask(SimpleTestCase):
@@ -12,46 +20,201 @@ class TestThumbnailsCreatorTask(SimpleTestCase):
         self.image_uuid = str(uuid.uuid4())
         self.thumbnails_data = [{"height": 200, "width": None, "file": "somefile.jpg"}]
 
-    @mock.patch("images.tasks.thumbnails_creator_task.ImageResizer")
-    @mock.patch("images.tasks.thumbnails_creator_task.ThumbnailsCreator.save_image")
-    @mock.patch("images.tasks.thumbnails_creator_task.REDIS")
-    def test_run(self, mocked_redis, mocked_save_image, mocked_resizer):
-        """Test if ImageResizer.resize is called, and save_image is called
-        with data returned by ImageResizer.resize"""
+    @mock.patch("images.tasks.thumbnails_creator_task.RESIZE_POOL")
+    @mock.patch.object(ThumbnailsCreator, "save_thumbnails")
+    @mock.patch("images.tasks.thumbnails_creator_task.BLOB_STORE")
+    def test_run(self, mocked_blob_store, mocked_save_thumbnails, mocked_pool):
+        """Test if resize job is submitted to resize pool, and save_thumbnails is called
+        with data returned by the job"""
 
-        resize_output = ("somefile.jpg", {"height": 200, "width": 300}, bytes())
-        mocked_resizer_instance = mock.MagicMock()
-        mocked_resizer_instance.resize.return_value = [resize_output]
-        mocked_resizer.return_value = mocked_resizer_instance
+        resize_output = ("somefile.jpg", {"height": 200, "width": 300}, bytes(), {})
+        mocked_pool.submit.return_value.result.return_value = [resize_output]
+        mocked_blob_store.read.return_value = [b"ima", b"ge"]
 
         self.task.run(image_uuid=self.image_uuid, thumbnails_data=self.thumbnails_data)
 
-        self.assertEqual(mocked_resizer_instance.resize.call_count, 1)
-        mocked_save_image.assert_called_once_with(self.image_uuid, *resize_output)
-        mocked_redis.delete.assert_called_once_with(self.image_uuid)
+        mocked_blob_store.read.assert_called_once_with(self.image_uuid)
+        mocked_pool.submit.assert_called_once_with(
+            resize_job,
+            source_path=mock.ANY,
+            thumbnails_data=self.thumbnails_data,
+            variants=get_supported_variants(settings.THUMBNAIL_VARIANTS),
+            max_pixels=settings.IMAGE_MAX_PIXELS,
+        )
+        mocked_save_thumbnails.assert_called_once_with(
+            self.image_uuid, [resize_output], []
+        )
+        mocked_blob_store.delete.assert_called_once_with(self.image_uuid)
 
-    @mock.patch("images.tasks.thumbnails_creator_task.ImageResizer")
-    @mock.patch("images.tasks.thumbnails_creator_task.REDIS")
-    def test_redis_delete_called_if_error_occure(self, mocked_redis, mocked_resizer):
-        """Test if redis.delete is called if error occurs in run method"""
+    @mock.patch("images.tasks.thumbnails_creator_task.RESIZE_POOL")
+    @mock.patch.object(ThumbnailsCreator, "save_thumbnails")
+    @mock.patch("images.tasks.thumbnails_creator_task.BLOB_STORE")
+    def test_run_with_persisted_source(
+        self, mocked_blob_store, mocked_save_thumbnails, mocked_pool
+    ):
+        """Test if persisted original image is read from storage
+        without touching redis"""
 
-        mocked_resizer.side_effect = [AssertionError]
+        mocked_pool.submit.return_value.result.return_value = []
+        self.task.run(
+            image_uuid=self.image_uuid,
+            thumbnails_data=self.thumbnails_data,
+            source={"path": "original_images/somefile.jpg"},
+        )
+
+        self.assertEqual(mocked_blob_store.read.call_count, 0)
+        self.assertEqual(mocked_blob_store.delete.call_count, 0)
+        mocked_pool.submit.assert_called_once_with(
+            resize_job,
+            source_path=os.path.join(
+                settings.MEDIA_ROOT, "original_images/somefile.jpg"
+            ),
+            thumbnails_data=self.thumbnails_data,
+            variants=get_supported_variants(settings.THUMBNAIL_VARIANTS),
+            max_pixels=settings.IMAGE_MAX_PIXELS,
+        )
+
+    @mock.patch("images.tasks.thumbnails_creator_task.UPLOAD_DEDUP")
+    @mock.patch("images.tasks.thumbnails_creator_task.RESIZE_POOL")
+    @mock.patch.object(ThumbnailsCreator, "save_thumbnails")
+    @mock.patch("images.tasks.thumbnails_creator_task.BLOB_STORE")
+    def test_run_with_followers(
+        self, mocked_blob_store, mocked_save_thumbnails, mocked_pool, mocked_dedup
+    ):
+        """Thumbnails should be saved for identical uploads waiting for render"""
+
+        mocked_pool.submit.return_value.result.return_value = []
+        mocked_dedup.complete.return_value = ["follower"]
+        self.task.run(
+            image_uuid=self.image_uuid,
+            thumbnails_data=self.thumbnails_data,
+            content_hash="hash",
+        )
+
+        mocked_dedup.complete.assert_called_once_with(
+            "hash", self.thumbnails_data, self.image_uuid
+        )
+        mocked_save_thumbnails.assert_called_once_with(
+            self.image_uuid, [], ["follower"]
+        )
+
+    @mock.patch("images.tasks.thumbnails_creator_task.UPLOAD_DEDUP")
+    @mock.patch("images.tasks.thumbnails_creator_task.RESIZE_POOL")
+    @mock.patch.object(ThumbnailsCreator, "save_thumbnails")
+    @mock.patch("images.tasks.thumbnails_creator_task.BLOB_STORE")
+    def test_followers_released_if_error_occure(
+        self, mocked_blob_store, mocked_save_thumbnails, mocked_pool, mocked_dedup
+    ):
+        """Identical uploads shouldn't wait for failed render"""
+
+        mocked_pool.submit.side_effect = [AssertionError]
+        self.task.run(
+            image_uuid=self.image_uuid,
+            thumbnails_data=self.thumbnails_data,
+            content_hash="hash",
+        )
+
+        self.assertEqual(mocked_dedup.complete.call_count, 1)
+        self.assertEqual(mocked_save_thumbnails.call_count, 0)
+
+    @mock.patch("images.tasks.thumbnails_creator_task.RESIZE_POOL")
+    @mock.patch("images.tasks.thumbnails_creator_task.BLOB_STORE")
+    def test_blob_delete_called_if_error_occure(self, mocked_blob_store, mocked_pool):
+        """Test if cached image is deleted if error occurs in run method"""
+
+        mocked_pool.submit.side_effect = [AssertionError]
         self.task.run(image_uuid=self.image_uuid, thumbnails_data=self.thumbnails_data)
-        mocked_redis.delete.assert_called_once_with(self.image_uuid)
-
-    @mock.patch("images.tasks.thumbnails_creator_task.ThumbnailSerializer")
-    def test_save_image(self, mocked_thumbanil_serialzier):
-        """Test if ThumbnailSerializer is validated and then saved"""
-        mocked_thumbanil_serialzier_instance = mock.MagicMock()
-        mocked_thumbanil_serialzier.return_value = mocked_thumbanil_serialzier_instance
-
-        data = {
-            "image_uuid": self.image_uuid,
-            "filename": "somefile.jpg",
-            "size": {"height": 200, "width": 200},
-            "img_bytes": bytes(),
-        }
-
-        self.task.save_image(**data)
-        self.assertEqual(mocked_thumbanil_serialzier_instance.is_valid.call_count, 1)
-        self.assertEqual(mocked_thumbanil_serialzier_instance.save.call_count, 1)
+        mocked_blob_store.delete.assert_called_once_with(self.image_uuid)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class TestSaveThumbnails(TestCase):
+    """Test saving thumbnails created by ThumbnailsCreator task"""
+
+    def setUp(self):
+        self.task = ThumbnailsCreator()
+        user = get_user_model().objects.create_user(username="user", password="pass")
+        self.image = Image.objects.create(name="image", uploaded_by=user)
+        self.thumbnails = [
+            (f"file{i}.jpg", {"height": 100 * i, "width": None}, b"image", {})
+            for i in range(1, 4)
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    def test_save_thumbnails(self):
+        """All thumbnails should be saved with constant number of queries"""
+
+        # one query checks if image exists and one inserts all thumbnails
+        with self.assertNumQueries(2):
+            self.task.save_thumbnails(str(self.image.uuid), self.thumbnails)
+
+        thumbnails = Thumbnail.objects.filter(image=self.image).order_by("height")
+        self.assertEqual(
+            [t.height for t in thumbnails],
+            [s["height"] for _, s, *_ in self.thumbnails],
+        )
+        for thumbnail, (filename, *_) in zip(thumbnails, self.thumbnails):
+            self.assertEqual(
+                thumbnail.file.name,
+                Thumbnail.generate_upload_to(str(self.image.uuid), filename),
+            )
+            self.assertTrue(os.path.exists(thumbnail.file.path))
+
+    def test_save_thumbnails_variants(self):
+        """Variants should be saved next to thumbnail files"""
+
+        self.task.save_thumbnails(
+            str(self.image.uuid),
+            [("file.jpg", {"height": 100, "width": None}, b"image", {".webp": b"v"})],
+        )
+
+        thumbnail = Thumbnail.objects.get(image=self.image)
+        with open(f"{thumbnail.file.path}.webp", "rb") as f:
+            self.assertEqual(f.read(), b"v")
+        self.assertFalse(os.path.exists(f"{thumbnail.file.path}.avif"))
+
+    def test_save_thumbnails_with_followers(self):
+        """Thumbnails of followers should be linked to saved thumbnails,
+        they are saved for follower if leader image was deleted"""
+
+        user = get_user_model().objects.create_user(username="other", password="pass")
+        followers = [
+            str(Image.objects.create(name="image", uploaded_by=user).uuid)
+            for _ in range(2)
+        ]
+        self.task.save_thumbnails(
+            str(uuid.uuid4()), self.thumbnails, [*followers, str(uuid.uuid4())]
+        )
+
+        first, second = [
+            Thumbnail.objects.filter(image_id=uuid).order_by("height")
+            for uuid in followers
+        ]
+        self.assertEqual(len(first), len(self.thumbnails))
+        for source, thumbnail in zip(first, second):
+            self.assertEqual(source.height, thumbnail.height)
+            self.assertEqual(
+                os.stat(source.file.path).st_ino, os.stat(thumbnail.file.path).st_ino
+            )
+
+    def test_save_thumbnails_for_not_existing_image(self):
+        """Thumbnails shouldn't be saved if image doesn't exist"""
+
+        with self.assertRaises(Image.DoesNotExist):
+            self.task.save_thumbnails(str(uuid.uuid4()), self.thumbnails)
+
+        self.assertFalse(Thumbnail.objects.exists())
+
+
+class TestBlobsSweeperTask(SimpleTestCase):
+    """Test BlobsSweeper celery task"""
+
+    @mock.patch("images.tasks.blobs_sweeper_task.BLOB_STORE")
+    def test_run(self, mocked_blob_store):
+        """Test if blob store is swept"""
+
+        mocked_blob_store.sweep.return_value = 2
+        self.assertEqual(BlobsSweeper().run(), 2)
+        self.assertEqual(mocked_blob_store.sweep.call_count, 1)
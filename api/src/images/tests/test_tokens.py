@@ -1,6 +1,11 @@
 from django.test import SimpleTestCase
 from unittest import mock
-from images.tokens import expiring_image_token_generator
+from images.tokens import (
+    expiring_image_token_generator,
+    ExpiringImageTokenGenerator,
+    TokenCache,
+)
+from django.test import override_settings
 import base64
 import datetime
 
@@ -49,3 +54,68 @@ class TestExpiringImageTokenGenerator(SimpleTestCase):
         self.assertFalse(
             self.token_generator.check_token(filename=kwargs["filename"], token=token)
         )
+
+    def test_check_token_cached(self):
+        """Valid token should be cached until it expires"""
+
+        token_generator = ExpiringImageTokenGenerator(cache_size=10)
+        token = token_generator.make_token("somefile.jpg", 400)
+
+        self.assertTrue(token_generator.check_token("somefile.jpg", token))
+        with mock.patch("images.tokens.salted_hmac") as mocked_hmac:
+            self.assertTrue(token_generator.check_token("somefile.jpg", token))
+            self.assertEqual(mocked_hmac.call_count, 0)
+
+        self.assertEqual(
+            token_generator.cache.gauges(), {"size": 1, "hits": 1, "misses": 1}
+        )
+
+        # token expired
+        now = datetime.datetime.now() + datetime.timedelta(seconds=500)
+        with mock.patch.object(token_generator, "_now", return_value=now):
+            self.assertFalse(token_generator.check_token("somefile.jpg", token))
+
+        self.assertEqual(token_generator.cache.gauges()["size"], 0)
+
+    def test_check_token_cache_cleared_on_secret_change(self):
+        """Cached tokens shouldn't be valid if secret changed"""
+
+        token_generator = ExpiringImageTokenGenerator(cache_size=10)
+        token = token_generator.make_token("somefile.jpg", 400)
+        self.assertTrue(token_generator.check_token("somefile.jpg", token))
+
+        with override_settings(SECRET_KEY="other-secret-key"):
+            self.assertFalse(token_generator.check_token("somefile.jpg", token))
+
+
+class TestTokenCache(SimpleTestCase):
+    """Test TokenCache class"""
+
+    def test_lru_eviction(self):
+        """Least recently used entry should be evicted"""
+
+        cache = TokenCache(maxsize=2)
+        cache.set(("a", "token"), 100)
+        cache.set(("b", "token"), 100)
+        cache.get(("a", "token"), now=0)
+        cache.set(("c", "token"), 100)
+
+        self.assertEqual(cache.get(("a", "token"), now=0), 100)
+        self.assertIsNone(cache.get(("b", "token"), now=0))
+        self.assertEqual(cache.get(("c", "token"), now=0), 100)
+
+    def test_expired_entry(self):
+        """Expired entry should be dropped"""
+
+        cache = TokenCache(maxsize=2)
+        cache.set(("a", "token"), 100)
+        self.assertEqual(cache.get(("a", "token"), now=100), 100)
+        self.assertIsNone(cache.get(("a", "token"), now=101))
+        self.assertEqual(cache.gauges(), {"size": 0, "hits": 1, "misses": 1})
+
+    def test_disabled(self):
+        """Nothing should be cached if maxsize is 0"""
+
+        cache = TokenCache(maxsize=0)
+        cache.set(("a", "token"), 100)
+        self.assertIsNone(cache.get(("a", "token"), now=0))
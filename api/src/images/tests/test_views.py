@@ -1,13 +1,16 @@
 from django.test import TestCase
 from rest_framework.test import APIClient
-from rest_framework import response, status
+from rest_framework import response, status, renderers
 from rest_framework_simplejwt.tokens import AccessToken
-from core.models import Image
+from core.models import Image, Thumbnail, Tier
+from images.serializers.image import ImageSerializer
+from django.core.management import call_command
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from unittest import mock
 import uuid
 import base64
+import json
 
 
 class ViewTestMixin:
@@ -24,13 +27,139 @@ class ViewTestMixin:
 class TestImageListView(ViewTestMixin, TestCase):
     """Test ImageListView"""
 
+    def get_content(self, r: response.Response) -> bytes:
+        """Return content of (possibly streamed) response"""
+
+        if r.streaming:
+            return b"".join(r.streaming_content)
+
+        return r.content
+
     def test_list_response(self):
         """Test if returned response contain expected data"""
 
         self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token}")
         r = self.client.get(reverse("images:image_list"))
         self.assertEqual(r.status_code, 200)
-        self.assertEqual(r.data, [])
+        self.assertEqual(r["Content-Type"], "application/json")
+        self.assertEqual(
+            json.loads(self.get_content(r)), {"next": None, "results": []}
+        )
+
+    def test_list_streamed_response_compatible(self):
+        """Streamed response should be byte-for-byte the same as
+        ImageSerializer data rendered by JSONRenderer"""
+
+        call_command("loaddata", "tiers")
+        self.user.tier = Tier.objects.get(name="Enterprise")
+        self.user.save()
+        for i in range(3):
+            image = Image.objects.create(
+                name=f"image\u2028\"ó{i}",
+                uploaded_by=self.user,
+                og_file=f"original_images/{i}.png" if i else None,
+                # images uploaded before metadata was stored don't have it
+                width=800 if i else None,
+                height=600 if i else None,
+                format="PNG" if i else None,
+                bytes=1234 if i else None,
+            )
+            for height in [400, 200]:
+                Thumbnail.objects.create(
+                    image=image, height=height, file=f"thumbnails/{i}/{height}.png"
+                )
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token}")
+        r = self.client.get(reverse("images:image_list") + "?page_size=2")
+        self.assertTrue(r.streaming)
+        content = self.get_content(r)
+
+        images = Image.objects.order_by("-uploaded_at", "uuid")[:2]
+        serializer = ImageSerializer(
+            images, many=True, context={"request": r.wsgi_request}
+        )
+        next_link = json.loads(content)["next"]
+        self.assertIsNotNone(next_link)
+        self.assertEqual(
+            content,
+            renderers.JSONRenderer().render(
+                {"next": next_link, "results": serializer.data}
+            ),
+        )
+
+    def test_list_indented_response_not_streamed(self):
+        """Indented JSON should be rendered by ImageSerializer"""
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token}")
+        r = self.client.get(
+            reverse("images:image_list"), HTTP_ACCEPT="application/json; indent=4"
+        )
+        self.assertFalse(r.streaming)
+        self.assertEqual(r.data, {"next": None, "results": []})
+
+    def test_list_number_of_queries(self):
+        """Number of queries shouldn't depend on number of listed images"""
+
+        call_command("loaddata", "tiers")
+        self.user.tier = Tier.objects.get(name="Enterprise")
+        self.user.save()
+        for i in range(5):
+            image = Image.objects.create(name=f"image{i}", uploaded_by=self.user)
+            for height in [200, 400]:
+                Thumbnail.objects.create(
+                    image=image, height=height, file=f"thumbnails/{height}.jpg"
+                )
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token}")
+        # load user tier snapshot to the cache
+        self.get_content(self.client.get(reverse("images:image_list")))
+        # authenticated user, images (with owner) and thumbnails
+        with self.assertNumQueries(3):
+            r = self.client.get(reverse("images:image_list"))
+            data = json.loads(self.get_content(r))
+
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(len(data["results"]), 5)
+        self.assertTrue(all(len(image["thumbnails"]) == 2 for image in data["results"]))
+
+    def test_list_pagination(self):
+        """Client should be able to walk whole collection with cursor, even if
+        some images were uploaded at the same time"""
+
+        call_command("loaddata", "tiers")
+        self.user.tier = Tier.objects.get(name="Basic")
+        self.user.save()
+        images = [
+            Image.objects.create(name=f"image{i}", uploaded_by=self.user)
+            for i in range(7)
+        ]
+        Image.objects.filter(uuid__in=[i.uuid for i in images[2:5]]).update(
+            uploaded_at=images[2].uploaded_at
+        )
+        expected = list(
+            Image.objects.order_by("-uploaded_at", "uuid").values_list(
+                "uuid", flat=True
+            )
+        )
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token}")
+        url, uuids = reverse("images:image_list") + "?page_size=2", []
+        while url:
+            r = self.client.get(url)
+            self.assertEqual(r.status_code, 200)
+            data = json.loads(self.get_content(r))
+            self.assertLessEqual(len(data["results"]), 2)
+            uuids += [uuid.UUID(image["uuid"]) for image in data["results"]]
+            url = data["next"]
+
+        self.assertEqual(uuids, expected)
+
+    def test_list_invalid_cursor(self):
+        """Should return 404"""
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token}")
+        r = self.client.get(reverse("images:image_list") + "?cursor=invalid")
+        self.assertEqual(r.status_code, 404)
 
 
 class TestImageUploadView(ViewTestMixin, TestCase):
@@ -131,7 +260,7 @@ class TestExpiringImageView(ViewTestMixin, TestCase):
         self.assertEqual(r.status_code, 403)
         self.assertEqual(mocked_token_has_permission.call_count, 1)
 
-    @mock.patch("images.views.image.serve")
+    @mock.patch("images.views.image.serve_file")
     @mock.patch("images.views.image.IsExpiringImageTokenValid.has_permission")
     def test_if_serve_called(self, mocked_token_has_permission, mocked_serve):
         """Test if serve called if client has valid permissions"""
@@ -148,3 +277,107 @@ class TestExpiringImageView(ViewTestMixin, TestCase):
         )
         self.assertEqual(r.status_code, 200)
         self.assertEqual(mocked_serve.call_count, 1)
+
+
+class TestThumbnailRenderView(ViewTestMixin, TestCase):
+    """Test ThumbnailRenderView"""
+
+    def setUp(self):
+        super().setUp()
+        call_command("loaddata", "tiers")
+        self.user.tier = Tier.objects.get(name="Basic")
+        self.user.save()
+        self.image = Image.objects.create(
+            name="image", uploaded_by=self.user, og_file="original_images/image.jpg"
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token}")
+
+    def get_url(self, size: str, image: Image = None) -> str:
+        width, height = size.split("x")
+        return reverse(
+            "images:thumbnail_render",
+            kwargs={
+                "uuid": (image or self.image).uuid,
+                "width": width,
+                "height": height,
+                "extension": "jpg",
+            },
+        )
+
+    @mock.patch("images.views.thumbnails.serve_variant")
+    @mock.patch("images.views.thumbnails.ThumbnailRenderer")
+    def test_allowed_size(self, mocked_renderer, mocked_serve_file):
+        """Thumbnail should be rendered (if needed) and served"""
+
+        mocked_renderer.return_value.get_or_render.return_value = "thumbnail.jpg"
+        mocked_serve_file.return_value = response.Response(status=200)
+
+        r = self.client.get(self.get_url("autox200"))
+        self.assertEqual(r.status_code, 200)
+        mocked_renderer.assert_called_once_with(
+            self.image, None, 200, profile="balanced"
+        )
+        mocked_renderer.return_value.get_or_render.assert_called_once_with(".jpg")
+        self.assertEqual(mocked_serve_file.call_args.args[1], "thumbnail.jpg")
+
+    @mock.patch("images.views.thumbnails.ThumbnailRenderer")
+    def test_not_allowed_size(self, mocked_renderer):
+        """Sizes not allowed by user tier shouldn't be rendered"""
+
+        for size in ["autox400", "200x200"]:
+            with self.subTest(size=size):
+                r = self.client.get(self.get_url(size))
+                self.assertEqual(r.status_code, 403)
+
+        self.user.tier = None
+        self.user.save()
+        self.assertEqual(self.client.get(self.get_url("autox200")).status_code, 403)
+        self.assertEqual(mocked_renderer.call_count, 0)
+
+    def test_invalid_uuid(self):
+        """Should return 404 for strings which aren't UUIDs"""
+
+        for value in ["-" * 36, "0" * 36, "g" * 8 + str(self.image.uuid)[8:]]:
+            with self.subTest(uuid=value):
+                r = self.client.get(f"/api/thumbnails/{value}/autox200.jpg")
+                self.assertEqual(r.status_code, 404)
+
+    def test_not_owner(self):
+        """Should return 404 for images of other users"""
+
+        other_user = get_user_model().objects.create_user(
+            username="other", password="testpassword"
+        )
+        image = Image.objects.create(name="image", uploaded_by=other_user)
+        r = self.client.get(self.get_url("autox200", image=image))
+        self.assertEqual(r.status_code, 404)
+
+
+class TestMetricsView(ViewTestMixin, TestCase):
+    """Test MetricsView"""
+
+    def test_not_admin(self):
+        """Should return permission denied"""
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token}")
+        r = self.client.get(reverse("images:metrics"))
+        self.assertEqual(r.status_code, 403)
+
+    @mock.patch("images.views.metrics.BLOB_STORE")
+    @mock.patch("images.views.metrics.UPLOAD_DEDUP")
+    def test_admin(self, mocked_dedup, mocked_blob_store):
+        """Should return blob store gauges"""
+
+        gauges = {"staged_bytes": 10, "blob_count": 1}
+        mocked_blob_store.gauges.return_value = gauges
+        mocked_dedup.gauges.return_value = {"dedup_ratio": 0.5}
+        self.user.is_staff = True
+        self.user.save()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token}")
+        r = self.client.get(reverse("images:metrics"))
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.data["blob_store"], gauges)
+        self.assertEqual(r.data["upload_dedup"], {"dedup_ratio": 0.5})
+        self.assertEqual(
+            set(r.data["expiring_token_cache"]), {"size", "hits", "misses"}
+        )
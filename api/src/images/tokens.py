@@ -1,17 +1,81 @@
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
 from django.utils.crypto import constant_time_compare, salted_hmac
 from django.utils.http import base36_to_int, int_to_base36
+from django.conf import settings
+from collections import OrderedDict
+from typing import Union
+import threading
 import datetime
 import base64
 import binascii
 
 
+class TokenCache:
+    """
+    Bounded LRU cache of validated tokens. It maps (filename, token)
+    to token expiration timestamp, entry is dropped once token expires.
+    Least recently used entries are evicted if cache exceeds 'maxsize'
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple[str, str], now: int) -> Union[int, None]:
+        """Return expiration timestamp of cached not expired token"""
+
+        with self._lock:
+            expires_at = self._entries.get(key)
+            if expires_at is None:
+                self.misses += 1
+                return None
+
+            if now > expires_at:
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return expires_at
+
+    def set(self, key: tuple[str, str], expires_at: int) -> None:
+        """Cache validated token"""
+
+        if self.maxsize <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = expires_at
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def gauges(self) -> dict[str, int]:
+        """Return cache size and hit/miss counters"""
+
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
 class ExpiringImageTokenGenerator(PasswordResetTokenGenerator):
     """
     Class used to generate token that gives access to specified image
-    for specified amount of time
+    for specified amount of time. Validated tokens are cached until they
+    expire, so repeated checks of the same link don't recompute HMAC
     """
 
+    def __init__(self, cache_size: int = 0):
+        super().__init__()
+        self.cache = TokenCache(cache_size)
+        self._cache_secrets = None
+
     def make_token(self, filename: str, expire_time: int) -> str:
         """
         Return a token that can be used multiple time until it expire
@@ -35,6 +99,12 @@ class ExpiringImageTokenGenerator(PasswordResetTokenGenerator):
         if not (filename and token):
             return False
 
+        now = self._num_seconds(self._now())
+        cache_key = (filename, token)
+        self.check_cache_secrets()
+        if self.cache.get(cache_key, now) is not None:
+            return True
+
         # Parse the token
         try:
             token = base64.urlsafe_b64decode(token.encode()).decode("utf-8")
@@ -58,11 +128,21 @@ class ExpiringImageTokenGenerator(PasswordResetTokenGenerator):
             return False
 
         # Check if token is not expired
-        if (self._num_seconds(self._now()) - ts) > 0:
+        if (now - ts) > 0:
             return False
 
+        self.cache.set(cache_key, ts)
         return True
 
+    def check_cache_secrets(self) -> None:
+        """Clear cached tokens if secret or secret fallbacks changed
+        (tokens signed with removed secret are no longer valid)"""
+
+        secrets = (self.secret, tuple(self.secret_fallbacks))
+        if secrets != self._cache_secrets:
+            self.cache.clear()
+            self._cache_secrets = secrets
+
     def _make_token_with_timestamp(
         self, filename: str, timestamp: int, secret: str
     ) -> str:
@@ -95,4 +175,6 @@ class ExpiringImageTokenGenerator(PasswordResetTokenGenerator):
         return self._now() + datetime.timedelta(seconds=expire_time)
 
 
-expiring_image_token_generator = ExpiringImageTokenGenerator()
+expiring_image_token_generator = ExpiringImageTokenGenerator(
+    cache_size=settings.EXPIRING_TOKEN_CACHE_SIZE
+)
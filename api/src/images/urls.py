@@ -1,4 +1,5 @@
 from django.urls import path, re_path
+from django.conf import settings
 from images import views as img_views
 
 app_name = "images"
@@ -15,7 +16,17 @@ urlpatterns = [
     ),
     re_path(
         r"^image/expiring/(?P<token>(?:[a-zA-Z0-9_-]{4})*(?:[a-zA-Z0-9_-]{2}==|[a-zA-Z0-9_-]{3}=|[a-zA-Z0-9_-]{4}))/(?P<path>.*)$",  # noqa
-        img_views.ExpiringImageView.as_view(),
+        img_views.AsyncExpiringImageView.as_view()
+        if settings.ASYNC_SERVING
+        else img_views.ExpiringImageView.as_view(),
         name="image_expiring",
     ),
+    # thumbnails rendered on demand
+    re_path(
+        r"^thumbnails/(?P<uuid>[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})/(?P<width>[0-9]+|auto)x(?P<height>[0-9]+|auto)\.(?P<extension>[a-zA-Z]+)$",  # noqa
+        img_views.ThumbnailRenderView.as_view(),
+        name="thumbnail_render",
+    ),
+    # images processing metrics endpoint
+    path("metrics/", img_views.MetricsView.as_view(), name="metrics"),
 ]
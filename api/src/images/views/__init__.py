@@ -1,2 +1,10 @@
-from .image import ImageUploadView, GenerateExpiringImageView, ExpiringImageView  # noqa
+from .image import (  # noqa
+    ImageUploadView,
+    GenerateExpiringImageView,
+    ExpiringImageView,
+    ThumbnailView,
+)
 from .images import ImageListView  # noqa
+from .metrics import MetricsView  # noqa
+from .serving import AsyncExpiringImageView, AsyncThumbnailView  # noqa
+from .thumbnails import ThumbnailRenderView  # noqa
@@ -2,11 +2,14 @@ from rest_framework import generics, permissions, status, exceptions
 from rest_framework.response import Response
 from images.serializers.image import ImageCreateSerializer, ExpiringImageSerializer
 from images.permissions import IsImageOwner, IsExpiringImageTokenValid
-from django.views.static import serve
+from images.serving import serve_file, serve_variant
 from django.conf import settings
-from django.http import Http404
+from core.filecache import THUMBNAIL_CACHE
+from django.http import Http404, HttpRequest, HttpResponseBase
+from django.views import View
 from core.models import Image
 from typing import Union
+import os
 
 
 class ImageUploadView(generics.CreateAPIView):
@@ -81,6 +84,29 @@ class ExpiringImageView(generics.RetrieveAPIView):
     permission_classes = (permissions.AllowAny, IsExpiringImageTokenValid)
 
     def retrieve(self, request, token, path, *args, **kwargs):
-        """Serve image using FileResponse"""
+        """Serve image (or hand it over to front-end server)"""
 
-        return serve(request, path=path, document_root=settings.MEDIA_ROOT)
+        return serve_file(request, path=path)
+
+
+class ThumbnailView(View):
+    """
+    View used to serve thumbnails (public media files) with
+    ETag, conditional and range requests support. Popular thumbnails
+    are served from in-memory cache. Thumbnail variant (WebP/AVIF) is
+    served instead of original format if client accepts it
+    """
+
+    http_method_names = ["get", "head"]
+    directory = "thumbnails"
+
+    def get(self, request: HttpRequest, path: str) -> HttpResponseBase:
+        # path is resolved inside thumbnails directory only, other media
+        # files (e.g. original images) aren't public
+        return serve_variant(
+            request,
+            path=path,
+            variants=settings.THUMBNAIL_VARIANTS,
+            cache=THUMBNAIL_CACHE,
+            document_root=os.path.join(settings.MEDIA_ROOT, self.directory),
+        )
@@ -1,19 +1,71 @@
 from rest_framework import generics, permissions
+from rest_framework.request import Request
 from images.serializers.image import ImageSerializer
-from core.models import Image
+from images.serializers.stream import ImageStreamSerializer
+from images.pagination import ImageKeysetPagination
+from core.models import Image, Thumbnail
+from django.db.models import Prefetch
 from django.db.models.query import QuerySet
+from django.http import StreamingHttpResponse, HttpResponse
 
 
 class ImageListView(generics.ListAPIView):
     """View used to get list of images created by authenticated user"""
 
     serializer_class = ImageSerializer
+    stream_serializer_class = ImageStreamSerializer
     queryset = Image.objects.all()
     permission_classes = (permissions.IsAuthenticated,)
+    pagination_class = ImageKeysetPagination
 
     def get_queryset(self) -> QuerySet:
         """Return a queryset of Images created by authenticated user"""
 
-        return self.queryset.filter(
-            uploaded_by=self.request.user,
-        ).order_by("-uploaded_at")
+        return (
+            self.queryset.filter(
+                uploaded_by=self.request.user,
+            )
+            # fetch data used by ImageSerializer in constant number of queries,
+            # owner tier is read from tier snapshots cache
+            .select_related("uploaded_by")
+            .prefetch_related(
+                Prefetch("thumbnails", queryset=Thumbnail.objects.order_by("id"))
+            )
+            .order_by(*self.pagination_class.ordering)
+        )
+
+    def can_stream(self) -> bool:
+        """Check if response can be rendered by stream serializer, it renders
+        only compact JSON (browsable API and indented JSON use ImageSerializer)"""
+
+        renderer = self.request.accepted_renderer
+        return (
+            type(renderer) is self.stream_serializer_class.renderer_class
+            and renderer.get_indent(self.request.accepted_media_type, {}) is None
+        )
+
+    def list(self, request: Request, *args, **kwargs) -> HttpResponse:
+        """
+        Stream images as JSON built directly from .values() rows.
+        It skips creating model instances and running nested serializers
+        which dominate response time of large pages
+        """
+
+        if not self.can_stream():
+            return super().list(request, *args, **kwargs)
+
+        queryset = (
+            self.filter_queryset(self.get_queryset())
+            .select_related(None)
+            .prefetch_related(None)
+            .values(*self.stream_serializer_class.values_fields)
+        )
+        images = self.paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.stream_serializer_class(
+            images, context=self.get_serializer_context()
+        )
+
+        return StreamingHttpResponse(
+            serializer.stream(self.paginator.get_next_link()),
+            content_type=request.accepted_renderer.media_type,
+        )
@@ -0,0 +1,23 @@
+from rest_framework import views, permissions
+from rest_framework.response import Response
+from images.tokens import expiring_image_token_generator
+from core.filecache import THUMBNAIL_CACHE
+from images.dedup import UPLOAD_DEDUP
+from src import BLOB_STORE
+
+
+class MetricsView(views.APIView):
+    """View used by admins to get gauges of images processing pipeline"""
+
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request, *args, **kwargs):
+        return Response(
+            {
+                "blob_store": BLOB_STORE.gauges(),
+                "upload_dedup": UPLOAD_DEDUP.gauges(),
+                # counters of the process that handled the request
+                "expiring_token_cache": expiring_image_token_generator.cache.gauges(),
+                "thumbnail_cache": THUMBNAIL_CACHE.gauges(),
+            }
+        )
@@ -0,0 +1,43 @@
+from django.http import HttpRequest, HttpResponseBase, JsonResponse
+from django.views import View
+from images.permissions import IsExpiringImageTokenValid
+from images.tokens import expiring_image_token_generator
+from images.serving import aserve_file, aserve_variant
+from django.conf import settings
+from core.filecache import THUMBNAIL_CACHE
+import os
+
+
+class AsyncExpiringImageView(View):
+    """
+    Async version of ExpiringImageView (used under ASGI). Image is streamed
+    with non-blocking I/O, so single process can serve many slow clients
+    """
+
+    http_method_names = ["get", "head"]
+
+    async def get(
+        self, request: HttpRequest, token: str, path: str
+    ) -> HttpResponseBase:
+        if not expiring_image_token_generator.check_token(path, token):
+            return JsonResponse(
+                {"detail": IsExpiringImageTokenValid.message}, status=403
+            )
+
+        return await aserve_file(request, path=path)
+
+
+class AsyncThumbnailView(View):
+    """Async version of ThumbnailView (used under ASGI)"""
+
+    http_method_names = ["get", "head"]
+    directory = "thumbnails"
+
+    async def get(self, request: HttpRequest, path: str) -> HttpResponseBase:
+        return await aserve_variant(
+            request,
+            path=path,
+            variants=settings.THUMBNAIL_VARIANTS,
+            cache=THUMBNAIL_CACHE,
+            document_root=os.path.join(settings.MEDIA_ROOT, self.directory),
+        )
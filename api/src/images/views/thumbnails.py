@@ -0,0 +1,48 @@
+from rest_framework import generics, permissions, exceptions
+from rest_framework.request import Request
+from django.http import HttpResponseBase
+from django.shortcuts import get_object_or_404
+from images.rendering import ThumbnailRenderer
+from images.serving import serve_variant
+from django.conf import settings
+from core.filecache import THUMBNAIL_CACHE
+from core.tiers import TIER_CACHE
+from core.models import Image
+from typing import Union
+
+
+class ThumbnailRenderView(generics.GenericAPIView):
+    """
+    View used to get thumbnail of given size (limited to sizes allowed by
+    user tier). Missing thumbnail is rendered from stored original image
+    on first request and saved, so next requests are served from storage
+    """
+
+    permission_classes = (permissions.IsAuthenticated,)
+    queryset = Image.objects.only("uuid", "og_file", "uploaded_by")
+
+    def parse_size(self, value: str) -> Union[int, None]:
+        return None if value == "auto" else int(value)
+
+    def get(
+        self, request: Request, uuid: str, width: str, height: str, extension: str
+    ) -> HttpResponseBase:
+        image = get_object_or_404(
+            self.get_queryset(), uuid=uuid, uploaded_by=request.user
+        )
+        width, height = self.parse_size(width), self.parse_size(height)
+
+        tier = TIER_CACHE.get(request.user.tier_id)
+        specs = {(t.width, t.height): t for t in tier.thumbnails} if tier else {}
+        if (width, height) not in specs:
+            raise exceptions.PermissionDenied(
+                "Thumbnail size isn't allowed by your tier"
+            )
+
+        renderer = ThumbnailRenderer(
+            image, width, height, profile=specs[(width, height)].profile
+        )
+        name = renderer.get_or_render(f".{extension}")
+        return serve_variant(
+            request, name, variants=settings.THUMBNAIL_VARIANTS, cache=THUMBNAIL_CACHE
+        )
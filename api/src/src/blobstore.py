@@ -0,0 +1,136 @@
+from typing import Iterable, Iterator, Union
+import redis
+import time
+
+# reserve space for new blob if it fits in the staging budget
+RESERVE_SCRIPT = """
+local used = tonumber(redis.call('GET', KEYS[1]) or '0')
+if used + tonumber(ARGV[1]) > tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('INCRBY', KEYS[1], ARGV[1])
+redis.call('HSET', KEYS[2], ARGV[4], ARGV[1])
+redis.call('ZADD', KEYS[3], ARGV[3], ARGV[4])
+return 1
+"""
+
+# remove blob and release its reserved space
+DELETE_SCRIPT = """
+local size = redis.call('HGET', KEYS[2], ARGV[1])
+if size then
+    redis.call('DECRBY', KEYS[1], size)
+    redis.call('HDEL', KEYS[2], ARGV[1])
+end
+redis.call('ZREM', KEYS[3], ARGV[1])
+return redis.call('DEL', ARGV[1], ARGV[1] .. ':partial')
+"""
+
+
+class BlobStoreFull(Exception):
+    """Raised when blob doesn't fit in the staging budget"""
+
+
+class BlobStore:
+    """
+    Store binary blobs (e.g. uploaded images waiting for celery task) in redis.
+    Blobs are written and read in chunks so neither producer nor consumer
+    have to hold whole blob in memory. Every blob expires after 'ttl' seconds
+    and total size of stored blobs is limited to 'max_bytes'
+    """
+
+    chunk_size = 256 * 1024
+
+    # bookkeeping keys
+    bytes_key = "blobs:bytes"  # number of reserved bytes
+    sizes_key = "blobs:sizes"  # hash of blob key -> size
+    index_key = "blobs:index"  # sorted set of blob keys scored by expire time
+
+    def __init__(self, client: redis.Redis, ttl: int, max_bytes: int):
+        self.client = client
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._reserve = client.register_script(RESERVE_SCRIPT)
+        self._delete = client.register_script(DELETE_SCRIPT)
+
+    @property
+    def bookkeeping_keys(self) -> list[str]:
+        """Return keys used to track staged blobs"""
+
+        return [self.bytes_key, self.sizes_key, self.index_key]
+
+    def write(self, key: str, chunks: Iterable[bytes], size: int) -> int:
+        """
+        Reserve 'size' bytes of staging budget, append chunks to temporary
+        key and rename it to 'key' once all of them are written, so readers
+        never see partially written blob. Raises BlobStoreFull if there is
+        not enough space. Returns number of written bytes
+        """
+
+        expires_at = time.time() + self.ttl
+        if not self._reserve(
+            keys=self.bookkeeping_keys,
+            args=[size, self.max_bytes, expires_at, key],
+        ):
+            raise BlobStoreFull(f"Can't stage {size} bytes, staging budget is full")
+
+        partial_key = f"{key}:partial"
+        written = 0
+        try:
+            self.client.delete(partial_key)
+            for i, chunk in enumerate(chunks):
+                written = self.client.append(partial_key, chunk)
+                if i == 0:
+                    # make sure abandoned partial blob expires as well
+                    self.client.expire(partial_key, self.ttl)
+
+            if not written:
+                self.delete(key)
+                return written
+
+            pipe = self.client.pipeline()
+            pipe.rename(partial_key, key)
+            pipe.expire(key, self.ttl)
+            pipe.execute()
+        except Exception:
+            self.delete(key)
+            raise
+
+        return written
+
+    def read(self, key: str) -> Iterator[bytes]:
+        """Yield blob content in chunks of 'chunk_size' bytes"""
+
+        size = self.client.strlen(key)
+        if not size:
+            raise KeyError(key)
+
+        for start in range(0, size, self.chunk_size):
+            yield self.client.getrange(key, start, start + self.chunk_size - 1)
+
+    def delete(self, key: str) -> None:
+        """Remove blob and release its part of staging budget"""
+
+        self._delete(keys=self.bookkeeping_keys, args=[key])
+
+    def sweep(self, now: Union[float, None] = None) -> int:
+        """
+        Release budget of blobs that expired without being deleted (e.g. celery
+        worker died or task message was lost). Returns number of swept blobs
+        """
+
+        now = time.time() if now is None else now
+        expired = self.client.zrangebyscore(self.index_key, "-inf", now)
+        for key in expired:
+            self.delete(key.decode() if isinstance(key, bytes) else key)
+
+        return len(expired)
+
+    def gauges(self) -> dict[str, int]:
+        """Return number of staged bytes and blobs"""
+
+        pipe = self.client.pipeline(transaction=False)
+        pipe.get(self.bytes_key)
+        pipe.zcard(self.index_key)
+        staged_bytes, blob_count = pipe.execute()
+
+        return {"staged_bytes": int(staged_bytes or 0), "blob_count": blob_count}
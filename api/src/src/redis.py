@@ -1,3 +1,4 @@
+from .blobstore import BlobStore
 import redis
 import os
 
@@ -6,3 +7,11 @@ REDIS = redis.Redis(
     port=os.environ.get("REDIS_PORT"),
     password=os.environ.get("REDIS_PASS"),
 )
+
+BLOB_STORE = BlobStore(
+    REDIS,
+    # seconds after which not deleted blobs expire
+    ttl=int(os.environ.get("BLOB_STORE_TTL", 60 * 60)),
+    # max number of bytes that can be staged at once
+    max_bytes=int(os.environ.get("BLOB_STORE_MAX_BYTES", 256 * 1024 * 1024)),
+)
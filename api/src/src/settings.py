@@ -155,3 +155,98 @@ SIMPLE_JWT = {
 CELERY_BROKER_URL = os.environ.get("CELERY_BROKER_URL")
 CELERY_RESULT_BACKEND = os.environ.get("CELERY_RESULT_BACKEND")
 CELERY_ACCEPT_CONTENT = ["application/json"]
+CELERY_BEAT_SCHEDULE = {
+    "sweep-orphaned-blobs": {
+        "task": "images.tasks.blobs_sweeper_task.BlobsSweeper",
+        "schedule": timedelta(minutes=5),
+    },
+}
+
+# Thumbnails resize pool (started once per celery worker process)
+THUMBNAILS_POOL_SIZE = int(os.environ.get("THUMBNAILS_POOL_SIZE", os.cpu_count()))
+THUMBNAILS_POOL_MAX_TASKS_PER_CHILD = int(
+    os.environ.get("THUMBNAILS_POOL_MAX_TASKS_PER_CHILD", 100)
+)
+# Directory where source images are handed off to resize pool workers,
+# it should be memory-backed (tmpfs) to avoid disk I/O. It has to be able to
+# hold all staged images (BLOB_STORE_MAX_BYTES), otherwise default temporary
+# directory (on disk) is used (in docker set 'shm_size' of celery worker)
+THUMBNAILS_SOURCE_DIR = os.environ.get(
+    "THUMBNAILS_SOURCE_DIR", "/dev/shm" if os.path.isdir("/dev/shm") else None
+)
+
+# Uploads bigger than this are streamed to temporary file instead of memory
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(
+    os.environ.get("FILE_UPLOAD_MAX_MEMORY_SIZE", 512 * 1024)
+)
+# Uploaded files are hashed while they are streamed (used to deduplicate uploads)
+FILE_UPLOAD_HANDLERS = [
+    "core.uploadhandlers.HashingMemoryFileUploadHandler",
+    "core.uploadhandlers.HashingTemporaryFileUploadHandler",
+]
+
+# Tier snapshots cache, snapshots are invalidated when tier changes but
+# other processes may use stale in-process snapshot for TIER_CACHE_LOCAL_TTL
+# (and redis snapshot for TIER_CACHE_TTL if redis was down during change)
+TIER_CACHE_TTL = int(os.environ.get("TIER_CACHE_TTL", 60 * 60))
+TIER_CACHE_LOCAL_TTL = int(os.environ.get("TIER_CACHE_LOCAL_TTL", 60))
+
+# Hand over media files transfer to front-end server, one of None,
+# "x-accel-redirect" (nginx) or "x-sendfile" (apache/lighttpd)
+SENDFILE_BACKEND = os.environ.get("SENDFILE_BACKEND") or None
+# nginx internal location that maps to MEDIA_ROOT (used by x-accel-redirect)
+SENDFILE_URL_PREFIX = os.environ.get("SENDFILE_URL_PREFIX", "/protected-media/")
+
+# Max number of validated expiring image tokens cached per process
+EXPIRING_TOKEN_CACHE_SIZE = int(os.environ.get("EXPIRING_TOKEN_CACHE_SIZE", 10000))
+
+# In-memory (per process) cache of thumbnails served by ThumbnailView
+THUMBNAIL_CACHE_MAX_BYTES = int(
+    os.environ.get("THUMBNAIL_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+)
+THUMBNAIL_CACHE_MAX_ITEM_BYTES = int(
+    os.environ.get("THUMBNAIL_CACHE_MAX_ITEM_BYTES", 1024 * 1024)
+)
+# seconds after which cached thumbnail is checked against file on disk
+# (thumbnails may be overwritten by celery workers)
+THUMBNAIL_CACHE_REVALIDATE_AFTER = float(
+    os.environ.get("THUMBNAIL_CACHE_REVALIDATE_AFTER", 5)
+)
+
+# Serve expiring images and thumbnails with async views,
+# it should be enabled only when project is run under ASGI server
+ASYNC_SERVING = os.environ.get("ASYNC_SERVING", "0").lower() in ("1", "true")
+ASYNC_SERVING_CHUNK_SIZE = int(os.environ.get("ASYNC_SERVING_CHUNK_SIZE", 64 * 1024))
+
+# On-demand thumbnails rendering, max number of seconds render lock is held
+# and max number of seconds request waits for thumbnail rendered by other one
+THUMBNAIL_RENDER_LOCK_TIMEOUT = int(os.environ.get("THUMBNAIL_RENDER_LOCK_TIMEOUT", 60))
+THUMBNAIL_RENDER_WAIT = int(os.environ.get("THUMBNAIL_RENDER_WAIT", 30))
+
+# Identical uploads (same content and thumbnail sizes) reuse thumbnails of
+# previous upload, concurrent ones wait for single render. Max number of
+# seconds upload waits for render of identical upload (then it's dropped)
+UPLOAD_DEDUP_TTL = int(os.environ.get("UPLOAD_DEDUP_TTL", 10 * 60))
+
+# Thumbnails are also stored in these formats (if supported by Pillow and
+# smaller than original format) and served to clients which accept them.
+# Later variants are preferred, they are stored only if they are smaller
+THUMBNAIL_VARIANTS = [
+    extension
+    for extension in os.environ.get("THUMBNAIL_VARIANTS", ".webp,.avif").split(",")
+    if extension
+]
+
+# Max number of pixels (width x height) of uploaded image (tiers can have
+# lower limit), images are rejected based on dimensions read from header
+IMAGE_MAX_PIXELS = int(os.environ.get("IMAGE_MAX_PIXELS", 50_000_000))
+# Max address space (bytes) of resize pool worker, allocation above it
+# fails with MemoryError instead of OOM-killing celery worker (0 disables).
+# Default is derived from IMAGE_MAX_PIXELS - full size thumbnail of image
+# with max number of pixels (decoded image and AVIF/WebP encoder buffers)
+# needs about 40 bytes per pixel, 256MB is left for interpreter itself
+THUMBNAILS_POOL_MEMORY_LIMIT = int(
+    os.environ.get(
+        "THUMBNAILS_POOL_MEMORY_LIMIT", 256 * 1024 * 1024 + IMAGE_MAX_PIXELS * 40
+    )
+)
@@ -0,0 +1,104 @@
+from django.test import SimpleTestCase
+from src.blobstore import BlobStore, BlobStoreFull
+from unittest import mock
+
+
+class TestBlobStore(SimpleTestCase):
+    """Test BlobStore"""
+
+    def setUp(self):
+        self.client = mock.MagicMock()
+        self.store = BlobStore(self.client, ttl=60, max_bytes=100)
+        self.store._reserve = mock.MagicMock(return_value=1)
+        self.store._delete = mock.MagicMock()
+
+    def test_write(self):
+        """Chunks should be appended to partial key that is then renamed"""
+
+        self.client.append.side_effect = [4, 9]
+        size = self.store.write("key", [b"some", b"image"], size=9)
+
+        self.assertEqual(size, 9)
+        self.assertEqual(self.store._reserve.call_args.kwargs["args"][:2], [9, 100])
+        self.client.delete.assert_called_once_with("key:partial")
+        self.client.append.assert_has_calls(
+            [mock.call("key:partial", b"some"), mock.call("key:partial", b"image")]
+        )
+        self.client.expire.assert_called_once_with("key:partial", 60)
+        pipe = self.client.pipeline.return_value
+        pipe.rename.assert_called_once_with("key:partial", "key")
+        pipe.expire.assert_called_once_with("key", 60)
+
+    def test_write_over_budget(self):
+        """BlobStoreFull should be raised and nothing written"""
+
+        self.store._reserve.return_value = 0
+        with self.assertRaises(BlobStoreFull):
+            self.store.write("key", [b"image"], size=200)
+
+        self.assertEqual(self.client.append.call_count, 0)
+
+    def test_write_error_releases_budget(self):
+        """Reserved budget should be released if write fails"""
+
+        self.client.append.side_effect = ConnectionError
+        with self.assertRaises(ConnectionError):
+            self.store.write("key", [b"image"], size=5)
+
+        self.store._delete.assert_called_once_with(
+            keys=self.store.bookkeeping_keys, args=["key"]
+        )
+
+    def test_write_empty(self):
+        """Empty blob shouldn't be stored"""
+
+        self.assertEqual(self.store.write("key", [], size=0), 0)
+        self.assertEqual(self.client.pipeline.call_count, 0)
+        self.assertEqual(self.store._delete.call_count, 1)
+
+    def test_read(self):
+        """Blob should be read in chunks"""
+
+        self.store.chunk_size = 4
+        self.client.strlen.return_value = 9
+        list(self.store.read("key"))
+
+        self.client.getrange.assert_has_calls(
+            [
+                mock.call("key", 0, 3),
+                mock.call("key", 4, 7),
+                mock.call("key", 8, 11),
+            ]
+        )
+
+    def test_read_not_existing(self):
+        """KeyError should be raised if blob doesn't exist"""
+
+        self.client.strlen.return_value = 0
+        with self.assertRaises(KeyError):
+            list(self.store.read("key"))
+
+    def test_sweep(self):
+        """Expired blobs should be deleted"""
+
+        self.client.zrangebyscore.return_value = [b"key1", b"key2"]
+        self.assertEqual(self.store.sweep(now=100), 2)
+
+        self.client.zrangebyscore.assert_called_once_with(
+            self.store.index_key, "-inf", 100
+        )
+        self.store._delete.assert_has_calls(
+            [
+                mock.call(keys=self.store.bookkeeping_keys, args=["key1"]),
+                mock.call(keys=self.store.bookkeeping_keys, args=["key2"]),
+            ]
+        )
+
+    def test_gauges(self):
+        """Should return number of staged bytes and blobs"""
+
+        pipe = self.client.pipeline.return_value
+        pipe.execute.return_value = [b"1024", 3]
+        self.assertEqual(
+            self.store.gauges(), {"staged_bytes": 1024, "blob_count": 3}
+        )
@@ -19,6 +19,7 @@ from django.conf.urls.static import static
 from django.urls import path, include
 from drf_spectacular.views import SpectacularSwaggerView, SpectacularAPIView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from images.views import ThumbnailView, AsyncThumbnailView
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -34,6 +35,14 @@ urlpatterns = [
     path("api/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     # images endpoints
     path("api/", include("images.urls")),
+    # thumbnails (public media files)
+    path(
+        f"{settings.MEDIA_URL.strip('/')}/thumbnails/<path:path>",
+        AsyncThumbnailView.as_view()
+        if settings.ASYNC_SERVING
+        else ThumbnailView.as_view(),
+        name="thumbnail",
+    ),
 ]
 
 if settings.DEBUG:
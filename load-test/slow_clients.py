@@ -0,0 +1,114 @@
+"""
+Slow clients load test of media serving endpoints (expiring images and
+thumbnails). It opens many concurrent connections that download file
+with limited speed and reports how many of them were served concurrently.
+
+Compare WSGI (sync views, one thread per download) and ASGI (async views):
+
+    # WSGI
+    gunicorn src.wsgi -b 0.0.0.0:8000 -w 2 --threads 8
+    # ASGI
+    ASYNC_SERVING=1 uvicorn src.asgi:application --host 0.0.0.0 --port 8000
+
+    python load-test/slow_clients.py --url http://0.0.0.0:8000/media/thumbnails/<uuid>/<file> \\
+        --connections 1000 --rate 65536
+"""
+from urllib.parse import urlsplit
+import statistics
+import argparse
+import asyncio
+import time
+
+
+class Stats:
+    """Counters shared by all clients"""
+
+    def __init__(self):
+        self.ttfb = []  # time to first byte of each response
+        self.completed = 0
+        self.failed = 0
+        self.in_flight = 0  # responses that are being downloaded now
+        self.max_in_flight = 0
+
+
+async def client(url: str, rate: int, chunk_size: int, timeout: float, stats: Stats):
+    """Download file reading at most 'rate' bytes per second"""
+
+    parts = urlsplit(url)
+    start = time.perf_counter()
+    receiving = False
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(parts.hostname, parts.port or 80), timeout
+        )
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+        writer.write(
+            f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+            "Connection: close\r\n\r\n".encode()
+        )
+        await writer.drain()
+
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        if b" 200 " not in status_line and b" 206 " not in status_line:
+            raise ValueError(status_line)
+
+        stats.ttfb.append(time.perf_counter() - start)
+        receiving = True
+        stats.in_flight += 1
+        stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+
+        while chunk := await asyncio.wait_for(reader.read(chunk_size), timeout):
+            await asyncio.sleep(len(chunk) / rate)
+
+        writer.close()
+        stats.completed += 1
+    except (OSError, asyncio.TimeoutError, ValueError):
+        stats.failed += 1
+    finally:
+        if receiving:
+            stats.in_flight -= 1
+
+
+async def run(args: argparse.Namespace) -> Stats:
+    stats = Stats()
+    clients = []
+    for _ in range(args.connections):
+        clients.append(
+            asyncio.create_task(
+                client(args.url, args.rate, args.chunk_size, args.timeout, stats)
+            )
+        )
+        await asyncio.sleep(args.ramp_up / args.connections)
+
+    await asyncio.gather(*clients)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", required=True)
+    parser.add_argument("--connections", type=int, default=500)
+    parser.add_argument("--rate", type=int, default=64 * 1024, help="bytes/sec")
+    parser.add_argument("--chunk-size", type=int, default=16 * 1024)
+    parser.add_argument("--ramp-up", type=float, default=5, help="seconds")
+    parser.add_argument("--timeout", type=float, default=30, help="seconds")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    stats = asyncio.run(run(args))
+    elapsed = time.perf_counter() - start
+
+    ttfb = sorted(stats.ttfb) or [float("nan")]
+    p95 = ttfb[min(len(ttfb) - 1, int(len(ttfb) * 0.95))]
+    print(f"connections:          {args.connections}")
+    print(f"completed / failed:   {stats.completed} / {stats.failed}")
+    print(f"max concurrent:       {stats.max_in_flight}")
+    print(
+        f"ttfb p50 / p95 / max: {statistics.median(ttfb):.3f}s / {p95:.3f}s / "
+        f"{ttfb[-1]:.3f}s"
+    )
+    print(f"elapsed:              {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()